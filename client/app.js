@@ -11,8 +11,21 @@ let hdCanvas = null;
 let hdCtx = null;
 let isMonitoring = false;
 let frameInterval = null;
+let frameRate = null; // 当前发送帧率，由服务器的帧率提示调整
 let shotCount = 0;
 
+// 帧协议状态（服务器应答 hello 后启用）
+let detectCanvas = null;
+let detectCtx = null;
+let protocolVersion = 0; // 0 表示旧协议：无帧头 JPEG + 中文状态文本
+let detectFormat = 'jpeg'; // 检测帧像素格式
+let frameSeq = 0; // 帧序号
+let lastDetectSeq = -1; // 最近发送的检测帧序号
+let lastAckSeq = -1; // 服务器最近确认的检测帧序号
+let latencyMs = null; // 平滑后的端到端延迟
+let hdStreamEnabled = false; // 服务器是否接收高清帧推流
+let hdInterval = null; // 高清帧推流定时器
+
 // 常量
 // 动态获取当前主机地址，支持localhost和IP访问
 const getServerUrl = () => {
@@ -22,10 +35,20 @@ const getServerUrl = () => {
     return `${protocol}://${hostname}:8000/ws`;
 };
 const SERVER_URL = getServerUrl();
-const FRAME_RATE = 10; // 每秒帧数
+const FRAME_RATE = 10; // 默认每秒帧数（连接后由服务器调整）
 const LOW_QUALITY = 0.6; // 低质量JPEG压缩率
 const HIGH_QUALITY = 0.9; // 高质量JPEG压缩率
 
+// 帧协议（与 server/ws_protocol.py 保持一致）
+const PROTOCOL_VERSION = 1;
+const FRAME_HEADER_SIZE = 22;
+const MSG_DETECT = 1;
+const MSG_HD = 2;
+const PIXEL_FORMATS = { jpeg: 0, gray8: 1, i420: 2 };
+const PREFERRED_FORMATS = ['i420', 'jpeg']; // 优先发送原始 I420，省去 JPEG 编解码
+const DETECT_SIZE = 320; // 检测帧长边像素数（服务器在 hello 应答中按检测器配置档给出）
+const MAX_IN_FLIGHT = 2; // 未确认的检测帧达到该数量时跳过发送
+
 // DOM 元素
 document.addEventListener('DOMContentLoaded', () => {
     // 初始化标签页
@@ -164,6 +187,10 @@ function initMonitorPage() {
     hdCanvas = document.createElement('canvas');
     hdCtx = hdCanvas.getContext('2d');
     
+    // 创建检测帧画布（帧协议下使用，不在DOM中显示）
+    detectCanvas = document.createElement('canvas');
+    detectCtx = detectCanvas.getContext('2d', { willReadFrequently: true });
+    
     const startBtn = document.getElementById('startBtn');
     const stopBtn = document.getElementById('stopBtn');
     const statusElem = document.getElementById('status');
@@ -197,6 +224,9 @@ function initMonitorPage() {
             hdCanvas.width = video.videoWidth;
             hdCanvas.height = video.videoHeight;
             
+            // 检测帧画布按比例缩小
+            resizeDetectCanvas(DETECT_SIZE);
+            
             // 连接 WebSocket
             connectWebSocket();
             
@@ -681,19 +711,39 @@ function connectWebSocket() {
     
     // 创建新连接
     socket = new WebSocket(SERVER_URL);
+    protocolVersion = 0;
+    detectFormat = 'jpeg';
+    lastDetectSeq = -1;
+    lastAckSeq = -1;
+    hdStreamEnabled = false;
+    setHdStreamRate(0);
     
     // 连接成功
     socket.onopen = () => {
         console.log('WebSocket 连接成功');
         document.getElementById('status').textContent = '已连接';
+        
+        // 协商帧协议，服务器应答前按旧协议发送
+        socket.send(JSON.stringify({
+            type: 'hello',
+            version: PROTOCOL_VERSION,
+            formats: PREFERRED_FORMATS
+        }));
     };
     
     // 接收消息
     socket.onmessage = (event) => {
         const message = event.data;
+        
+        // JSON 控制消息
+        if (message.startsWith('{')) {
+            handleControlMessage(JSON.parse(message));
+            return;
+        }
+        
         console.log('接收消息:', message);
         
-        // 处理消息
+        // 处理消息（旧协议）
         if (message.includes('截图成功')) {
             shotCount++;
             document.getElementById('shotCount').textContent = shotCount.toString();
@@ -717,6 +767,159 @@ function connectWebSocket() {
     };
 }
 
+/**
+ * 处理服务器的 JSON 控制消息
+ */
+function handleControlMessage(control) {
+    switch (control.type) {
+        case 'ack':
+            // 检测帧确认：更新在途帧数和端到端延迟
+            lastAckSeq = Math.max(lastAckSeq, control.seq);
+            if (control.timestamp) {
+                const latency = Date.now() - control.timestamp;
+                latencyMs = latencyMs === null ? latency : latencyMs * 0.9 + latency * 0.1;
+            }
+            return;
+        case 'hello':
+            protocolVersion = control.version;
+            detectFormat = control.formats.find(name => PREFERRED_FORMATS.includes(name)) || 'jpeg';
+            hdStreamEnabled = !!control.hd_stream;
+            if (control.detect_size > 0) {
+                resizeDetectCanvas(control.detect_size);
+            }
+            console.log(`帧协议 v${protocolVersion}，检测帧格式：${detectFormat}`);
+            return;
+        case 'rate':
+            // 帧率提示：等待手部时降低帧率，手在画面中时恢复
+            if (control.fps > 0) {
+                setFrameRate(control.fps);
+            }
+            // 手在画面中时推送高清帧，截图时服务器直接从缓冲区取帧
+            setHdStreamRate(hdStreamEnabled ? control.hd_fps || 0 : 0);
+            return;
+        case 'capture_request':
+            sendHighQualityFrame();
+            break;
+        case 'shot':
+            shotCount++;
+            document.getElementById('shotCount').textContent = shotCount.toString();
+            break;
+    }
+    console.log('接收消息:', control);
+}
+
+/**
+ * 按长边像素数设置检测帧画布尺寸（不超过摄像头分辨率，I420 要求宽高为偶数）
+ */
+function resizeDetectCanvas(longEdge) {
+    const scale = Math.min(1, longEdge / Math.max(video.videoWidth, video.videoHeight));
+    detectCanvas.width = Math.round(video.videoWidth * scale / 2) * 2;
+    detectCanvas.height = Math.round(video.videoHeight * scale / 2) * 2;
+}
+
+/**
+ * 打包带帧头的二进制消息
+ */
+function packFrame(msgType, pixelFormat, width, height, payload, capturedAt) {
+    const buffer = new ArrayBuffer(FRAME_HEADER_SIZE + payload.byteLength);
+    const view = new DataView(buffer);
+    view.setUint8(0, 0x41); // 'A'
+    view.setUint8(1, 0x43); // 'C'
+    view.setUint8(2, PROTOCOL_VERSION);
+    view.setUint8(3, msgType);
+    view.setUint8(4, pixelFormat);
+    view.setUint32(6, frameSeq, true);
+    view.setFloat64(10, capturedAt, true);
+    view.setUint16(18, width, true);
+    view.setUint16(20, height, true);
+    new Uint8Array(buffer, FRAME_HEADER_SIZE).set(new Uint8Array(payload));
+    return buffer;
+}
+
+/**
+ * RGBA 像素转换为 I420（BT.601）
+ */
+function rgbaToI420(rgba, width, height) {
+    const ySize = width * height;
+    const out = new Uint8Array(ySize * 3 / 2);
+    const uOffset = ySize;
+    const vOffset = ySize + ySize / 4;
+    
+    for (let i = 0, p = 0; i < ySize; i++, p += 4) {
+        out[i] = (66 * rgba[p] + 129 * rgba[p + 1] + 25 * rgba[p + 2] + 4224) >> 8;
+    }
+    // 色度取每个 2x2 块左上角的像素
+    for (let y = 0, c = 0; y < height; y += 2) {
+        for (let x = 0; x < width; x += 2, c++) {
+            const p = (y * width + x) * 4;
+            const r = rgba[p], g = rgba[p + 1], b = rgba[p + 2];
+            out[uOffset + c] = (-38 * r - 74 * g + 112 * b + 32896) >> 8;
+            out[vOffset + c] = (112 * r - 94 * g - 18 * b + 32896) >> 8;
+        }
+    }
+    return out.buffer;
+}
+
+/**
+ * 按帧协议发送一帧检测帧
+ */
+function sendFramedDetectFrame() {
+    // 未确认的帧过多时跳过，服务器处理不过来时不再堆积
+    if (lastDetectSeq - lastAckSeq >= MAX_IN_FLIGHT) {
+        return;
+    }
+    
+    const width = detectCanvas.width;
+    const height = detectCanvas.height;
+    const capturedAt = Date.now();
+    detectCtx.drawImage(video, 0, 0, width, height);
+    
+    if (detectFormat === 'i420') {
+        const rgba = detectCtx.getImageData(0, 0, width, height).data;
+        frameSeq++;
+        lastDetectSeq = frameSeq;
+        socket.send(packFrame(MSG_DETECT, PIXEL_FORMATS.i420, width, height, rgbaToI420(rgba, width, height), capturedAt));
+        return;
+    }
+    
+    frameSeq++;
+    lastDetectSeq = frameSeq;
+    detectCanvas.toBlob(async blob => {
+        if (blob && socket && socket.readyState === WebSocket.OPEN) {
+            socket.send(packFrame(MSG_DETECT, PIXEL_FORMATS.jpeg, 0, 0, await blob.arrayBuffer(), capturedAt));
+        }
+    }, 'image/jpeg', LOW_QUALITY);
+}
+
+/**
+ * 调整发送帧率
+ */
+function setFrameRate(fps) {
+    if (fps === frameRate) {
+        return;
+    }
+    frameRate = fps;
+    
+    // 正在监控时按新帧率重启定时器
+    if (isMonitoring && frameInterval) {
+        clearInterval(frameInterval);
+        frameInterval = setInterval(sendFrame, 1000 / frameRate);
+    }
+}
+
+/**
+ * 调整高清帧推流帧率，0 表示停止推流
+ */
+function setHdStreamRate(fps) {
+    if (hdInterval) {
+        clearInterval(hdInterval);
+        hdInterval = null;
+    }
+    if (fps > 0) {
+        hdInterval = setInterval(sendHighQualityFrame, 1000 / fps);
+    }
+}
+
 /**
  * 发送高清帧
  */
@@ -726,11 +929,18 @@ function sendHighQualityFrame() {
     }
     
     // 绘制视频帧到高清画布
+    const capturedAt = Date.now();
     hdCtx.drawImage(video, 0, 0, hdCanvas.width, hdCanvas.height);
     
     // 将高清画布内容转换为高质量 JPEG
-    hdCanvas.toBlob(blob => {
-        if (blob && socket && socket.readyState === WebSocket.OPEN) {
+    hdCanvas.toBlob(async blob => {
+        if (!blob || !socket || socket.readyState !== WebSocket.OPEN) {
+            return;
+        }
+        if (protocolVersion > 0) {
+            // 高清帧不占用检测帧序号
+            socket.send(packFrame(MSG_HD, PIXEL_FORMATS.jpeg, 0, 0, await blob.arrayBuffer(), capturedAt));
+        } else {
             socket.send(blob);
         }
     }, 'image/jpeg', HIGH_QUALITY); // 设置质量为 0.9
@@ -741,23 +951,39 @@ function sendHighQualityFrame() {
  */
 function startMonitoring() {
     isMonitoring = true;
+    frameRate = FRAME_RATE;
     
     // 定时发送视频帧
-    frameInterval = setInterval(() => {
-        if (!isMonitoring || !socket || socket.readyState !== WebSocket.OPEN) {
-            return;
+    frameInterval = setInterval(sendFrame, 1000 / frameRate);
+}
+
+/**
+ * 发送一帧低质量视频帧
+ */
+function sendFrame() {
+    if (!isMonitoring || !socket || socket.readyState !== WebSocket.OPEN) {
+        return;
+    }
+    
+    // 上一帧还没发出去时跳过本帧，避免在发送缓冲区里堆积旧帧
+    if (socket.bufferedAmount > 0) {
+        return;
+    }
+    
+    if (protocolVersion > 0) {
+        sendFramedDetectFrame();
+        return;
+    }
+    
+    // 绘制视频帧到画布
+    ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
+    
+    // 将画布内容转换为低质量 JPEG
+    canvas.toBlob(blob => {
+        if (blob && socket && socket.readyState === WebSocket.OPEN) {
+            socket.send(blob);
         }
-        
-        // 绘制视频帧到画布
-        ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
-        
-        // 将画布内容转换为低质量 JPEG
-        canvas.toBlob(blob => {
-            if (blob && socket && socket.readyState === WebSocket.OPEN) {
-                socket.send(blob);
-            }
-        }, 'image/jpeg', LOW_QUALITY); // 设置质量为 0.6
-    }, 1000 / FRAME_RATE);
+    }, 'image/jpeg', LOW_QUALITY); // 设置质量为 0.6
 }
 
 /**
@@ -771,6 +997,7 @@ function stopMonitoring() {
         clearInterval(frameInterval);
         frameInterval = null;
     }
+    setHdStreamRate(0);
     
     // 关闭摄像头
     if (video && video.srcObject) {
@@ -2,6 +2,10 @@
 // 使用代理，前端直接访问同源路径
 const API_BASE = '/api/images';
 const IMAGE_BASE = '/shots';
+// 列表中显示缩略图（服务器按 ETag 返回 304，无需时间戳防缓存）
+const THUMB_BASE = '/api/thumbnails/thumb';
+// 最近一次获取的列表版本，批量操作时提交，列表已变化时服务器返回 409
+let imagesVersion = null;
 
 async function fetchImages() {
     // 添加时间戳防止缓存
@@ -11,6 +15,7 @@ async function fetchImages() {
             console.error('API 请求失败:', res.status);
             return []; // 出错时返回空数组
         }
+        imagesVersion = res.headers.get('X-Images-Version');
         const data = await res.json();
         return Array.isArray(data) ? data : []; // 确保返回数组
     } catch (error) {
@@ -52,18 +57,32 @@ async function replaceImage(page, file) {
     await fetch(`${API_BASE}/replace/${page}`, { method: 'POST', body: formData });
 }
 
-async function insertImage(page, file) {
+// 批量操作：operations 中的页码都指 imagesVersion 对应的列表，file 为 files 中的序号
+async function batchImages(operations, files = []) {
     const formData = new FormData();
-    formData.append('file', file);
-    await fetch(`${API_BASE}/insert/${page}`, { method: 'POST', body: formData });
+    formData.append('version', imagesVersion || '');
+    formData.append('operations', JSON.stringify(operations));
+    files.forEach(file => formData.append('files', file));
+    const response = await fetch(`${API_BASE}/batch`, { method: 'POST', body: formData });
+    if (!response.ok) {
+        const error = await response.json();
+        alert(`操作失败：${error.detail}`);
+    }
+}
+
+// 在第 page 页之后按顺序插入多张图片（一次请求）
+async function insertImages(page, files) {
+    const operations = files.map((file, index) => ({ op: 'insert', after: page, file: index }));
+    // 同一位置的插入按提交顺序依次排在前面，倒序提交使结果保持选择顺序
+    await batchImages(operations.reverse(), files);
 }
 
 // 添加新图片：在最后插入
-async function addImage(file) {
+async function addImages(files) {
     // 获取当前图片列表长度，用作插入位置
     const images = await fetchImages();
     const page = images.length;  // 在末尾插入
-    await insertImage(page, file);
+    await insertImages(page, files);
 }
 
 function renderImageManager(container) {
@@ -73,13 +92,13 @@ function renderImageManager(container) {
             const div = document.createElement('div');
             div.className = 'image-item';
             div.innerHTML = `
-                <div class="img-thumb"><img src="${IMAGE_BASE}/${img}?t=${Date.now()}" alt="截图${idx+1}" style="width: 20vw; max-width: 90%; height: auto; display: block; margin: 0 auto; border-radius: 8px; box-shadow: 0 2px 8px rgba(0,0,0,0.08);" /></div>
+                <div class="img-thumb"><img src="${THUMB_BASE}/${encodeURIComponent(img)}" loading="lazy" alt="截图${idx+1}" style="width: 20vw; max-width: 90%; height: auto; display: block; margin: 0 auto; border-radius: 8px; box-shadow: 0 2px 8px rgba(0,0,0,0.08);" /></div>
                 <div class="img-actions" style="display: flex; flex-direction: row; justify-content: center; align-items: center; gap: 8px; margin-top: 8px; flex-wrap: wrap;">
                     <span style="font-size: 14px; min-width: 60px; text-align: center;">页码：${idx+1}</span>
                     <button class="delete-btn" style="font-size: 15px; padding: 6px 14px; border-radius: 6px; background:#ff4d4f;color:#fff;border:none;">删除</button>
                     <input type="file" class="replace-input" style="display:none" />
                     <button class="replace-btn" style="font-size: 15px; padding: 6px 14px; border-radius: 6px; background:#1890ff;color:#fff;border:none;">替换</button>
-                    <input type="file" class="insert-input" style="display:none" />
+                    <input type="file" class="insert-input" style="display:none" multiple />
                     <button class="insert-btn" style="font-size: 15px; padding: 6px 14px; border-radius: 6px; background:#52c41a;color:#fff;border:none;">在后插入</button>
                     <button class="view-btn" style="font-size: 15px; padding: 6px 14px; border-radius: 6px; background:#faad14;color:#fff;border:none;">查看原图</button>
                 </div>
@@ -105,7 +124,7 @@ function renderImageManager(container) {
             };
             div.querySelector('.insert-input').onchange = async (e) => {
                 if (e.target.files.length) {
-                    await insertImage(idx+1, e.target.files[0]);
+                    await insertImages(idx+1, Array.from(e.target.files));
                     renderImageManager(container);
                 }
             };
@@ -141,7 +160,7 @@ document.addEventListener('DOMContentLoaded', () => {
         addBtn.addEventListener('click', () => addInput.click());
         addInput.addEventListener('change', async (e) => {
             if (e.target.files.length) {
-                await addImage(e.target.files[0]);
+                await addImages(Array.from(e.target.files));
                 renderImageManager(container);
                 addInput.value = '';
             }
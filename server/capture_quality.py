@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+截图质量评估模块
+对多张高清候选帧计算清晰度（拉普拉斯方差）和曝光（过暗/过曝像素占比），
+只保存得分最高的一张
+"""
+import os
+from typing import List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from image_header import read_image_header
+
+# 每次截图最多评估的候选帧数量
+CAPTURE_CANDIDATES = int(os.getenv("CAPTURE_CANDIDATES", "3"))
+
+# 评估图像长边的目标像素数，候选帧按该尺寸缩小解码
+_SCORE_SIZE = 960
+# 灰度不高于 / 不低于该值的像素视为过暗 / 过曝
+_CLIP_LOW = 4
+_CLIP_HIGH = 251
+
+# 缩小解码的倍率与对应的灰度 imdecode 标志（由大到小）
+_REDUCED_GRAY_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+
+class FrameQuality(NamedTuple):
+    # 拉普拉斯方差，越大越清晰
+    sharpness: float
+    # 过暗或过曝像素占比
+    clipped_ratio: float
+    # 综合得分：清晰度按曝光正常的像素比例折算
+    score: float
+
+    def to_dict(self) -> dict:
+        return {
+            "sharpness": round(self.sharpness, 2),
+            "clipped_ratio": round(self.clipped_ratio, 4),
+            "score": round(self.score, 2),
+        }
+
+
+def _decode_gray(data) -> Optional[np.ndarray]:
+    """按评估尺寸缩小解码为灰度图"""
+    flag = cv2.IMREAD_GRAYSCALE
+    header = read_image_header(data)
+    if header is not None:
+        long_edge = max(header.width, header.height)
+        for factor, reduced_flag in _REDUCED_GRAY_FLAGS:
+            if long_edge // factor >= _SCORE_SIZE:
+                flag = reduced_flag
+                break
+    return cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+
+
+def measure_quality(data) -> Optional[FrameQuality]:
+    """
+    评估一张高清帧的质量
+
+    参数:
+        data: 图像字节（JPEG/PNG/WebP）
+
+    返回:
+        FrameQuality，无法解码时返回 None
+    """
+    gray = _decode_gray(data)
+    if gray is None:
+        return None
+    return measure_gray_quality(gray)
+
+
+def measure_gray_quality(gray: np.ndarray) -> FrameQuality:
+    """评估一张已解码的灰度图的质量"""
+    laplacian = cv2.Laplacian(gray, cv2.CV_32F)
+    _, stddev = cv2.meanStdDev(laplacian)
+    sharpness = float(stddev[0, 0]) ** 2
+
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    clipped_ratio = float(hist[:_CLIP_LOW + 1].sum() + hist[_CLIP_HIGH:].sum()) / gray.size
+
+    return FrameQuality(sharpness, clipped_ratio, sharpness * (1.0 - clipped_ratio))
+
+
+def select_best_frame(candidates: List[bytes]) -> Tuple[int, List[Optional[FrameQuality]]]:
+    """
+    从候选帧中选出得分最高的一张
+
+    返回:
+        (最佳候选的下标, 各候选的质量)；全部无法解码时下标为 -1
+    """
+    qualities = [measure_quality(data) for data in candidates]
+    best, best_score = -1, -1.0
+    for index, quality in enumerate(qualities):
+        if quality is not None and quality.score > best_score:
+            best, best_score = index, quality.score
+    return best, qualities
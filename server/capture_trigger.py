@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+截图触发模块
+根据逐帧的手部检测结果和画面帧差决定何时截图，不阻塞事件循环
+"""
+import os
+import time
+from typing import Optional
+
+# 连续多少帧未检测到手才认为手已离开（迟滞窗口）
+CAPTURE_HYSTERESIS_FRAMES = int(os.getenv("CAPTURE_HYSTERESIS_FRAMES", "3"))
+# 帧差低于该值视为画面静止（缩略灰度图平均绝对差，0-255）
+CAPTURE_STABLE_THRESHOLD = float(os.getenv("CAPTURE_STABLE_THRESHOLD", "2.0"))
+# 连续多少帧静止即可截图
+CAPTURE_STABLE_FRAMES = int(os.getenv("CAPTURE_STABLE_FRAMES", "2"))
+# 手离开后最长等待时间（秒），超时后无论画面是否静止都截图
+CAPTURE_TIMEOUT = float(os.getenv("CAPTURE_TIMEOUT", "2.0"))
+
+# 触发器事件
+EVENT_HAND_DETECTED = "hand_detected"
+EVENT_HAND_LEFT = "hand_left"
+EVENT_CAPTURE = "capture"
+
+
+class CaptureTrigger:
+    """
+    截图触发状态机
+
+    WAIT_HAND -> HAND_ON: 检测到手
+    HAND_ON -> SETTLING: 连续 hysteresis_frames 帧未检测到手
+    SETTLING -> WAIT_HAND: 连续 stable_frames 帧静止，或等待超过 timeout 秒，此时触发截图
+    SETTLING -> HAND_ON: 等待期间手再次出现
+
+    状态机由到达的帧驱动，超时也在处理帧时判断，因此无需 sleep。
+    """
+    WAIT_HAND = 0
+    HAND_ON = 1
+    SETTLING = 2
+
+    def __init__(self,
+                 hysteresis_frames: int = CAPTURE_HYSTERESIS_FRAMES,
+                 stable_threshold: float = CAPTURE_STABLE_THRESHOLD,
+                 stable_frames: int = CAPTURE_STABLE_FRAMES,
+                 timeout: float = CAPTURE_TIMEOUT):
+        self.hysteresis_frames = hysteresis_frames
+        self.stable_threshold = stable_threshold
+        self.stable_frames = stable_frames
+        self.timeout = timeout
+
+        self.state = self.WAIT_HAND
+        self.missing_frames = 0
+        self.stable_count = 0
+        self.left_at = 0.0
+
+    def update(self, has_hand: bool, motion: Optional[float], now: Optional[float] = None) -> Optional[str]:
+        """
+        输入一帧的检测结果
+
+        参数:
+            has_hand: 是否检测到手
+            motion: 与上一帧的帧差，None 表示无法计算
+            now: 当前时间（秒），默认使用 time.monotonic()
+
+        返回:
+            触发的事件名，没有事件时返回 None
+        """
+        if now is None:
+            now = time.monotonic()
+
+        if self.state == self.WAIT_HAND:
+            if has_hand:
+                self.state = self.HAND_ON
+                self.missing_frames = 0
+                return EVENT_HAND_DETECTED
+            return None
+
+        if self.state == self.HAND_ON:
+            if has_hand:
+                self.missing_frames = 0
+                return None
+            self.missing_frames += 1
+            if self.missing_frames >= self.hysteresis_frames:
+                self.state = self.SETTLING
+                self.stable_count = 0
+                self.left_at = now
+                return EVENT_HAND_LEFT
+            return None
+
+        # SETTLING
+        if has_hand:
+            self.state = self.HAND_ON
+            self.missing_frames = 0
+            return None
+
+        if motion is not None and motion < self.stable_threshold:
+            self.stable_count += 1
+        else:
+            self.stable_count = 0
+
+        if self.stable_count >= self.stable_frames or now - self.left_at >= self.timeout:
+            self.state = self.WAIT_HAND
+            return EVENT_CAPTURE
+        return None
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+检测执行器模块
+在线程池中运行图像解码与手部检测，避免阻塞 asyncio 事件循环；
+每个 WebSocket 连接独占一个 HandDetector 实例，跟踪状态互不干扰
+"""
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+from hand_detection import HandDetector, HybridHandDetector, FramePreprocessor, DetectorProfile, DEFAULT_PROFILE
+from hand_roi import RoiLearner, HAND_ROI
+
+logger = logging.getLogger(__name__)
+
+# 检测线程数，0 表示与 CPU 核数一致
+DETECTOR_THREADS = int(os.getenv("DETECTOR_THREADS", "0")) or (os.cpu_count() or 1)
+# 断开连接后最多保留的空闲检测器数量，超出部分直接释放
+DETECTOR_IDLE_MAX = int(os.getenv("DETECTOR_IDLE_MAX", "4"))
+# 帧差计算使用的缩略图尺寸 (宽, 高)
+MOTION_SIZE = (64, 48)
+# 运动门控：缩略图像素变化超过该灰度值才算"变化像素"
+GATE_PIXEL_DELTA = int(os.getenv("GATE_PIXEL_DELTA", "15"))
+# 运动门控：变化像素占比低于该值时跳过 MediaPipe，复用上一次检测结果
+GATE_CHANGED_RATIO = float(os.getenv("GATE_CHANGED_RATIO", "0.005"))
+# 检测 + 跟踪混合模式：检测到手后用光流跟踪代替逐帧 MediaPipe
+HAND_TRACKING = os.getenv("HAND_TRACKING", "1") == "1"
+# 混合模式下两次完整检测之间最多跟踪的帧数
+TRACK_REDETECT_FRAMES = int(os.getenv("TRACK_REDETECT_FRAMES", "5"))
+# 运动门控：默认最多连续跳过多少帧后强制重新检测（通常由检测器配置档决定），0 表示关闭门控
+GATE_REFRESH_FRAMES = 10
+
+
+class FrameResult(NamedTuple):
+    """单帧处理结果"""
+    has_hand: bool
+    # 与上一帧缩略灰度图的平均绝对差（0-255），首帧为 None
+    motion: Optional[float]
+    # 是否被运动门控拦截（复用了上一次的检测结果）
+    gated: bool = False
+    # 是否由光流跟踪得出（未运行 MediaPipe）
+    tracked: bool = False
+
+
+class MotionMeter:
+    """
+    帧差计：在缩小的灰度图上计算相邻两帧的平均绝对差
+    """
+    def __init__(self, size=MOTION_SIZE):
+        self.size = size
+        self._prev = None
+        self._gray = None
+        # 最近一帧的灰度图（缓冲区复用，下一帧前有效），供跟踪器使用
+        self.gray = None
+        # 最近一帧的缩略灰度图，供运动门控复用
+        self.thumbnail = None
+        # 最近一帧与上一帧缩略图的逐像素差，首帧为 None
+        self.diff = None
+
+    def update(self, frame_bgr) -> Optional[float]:
+        if self._gray is None or self._gray.shape != frame_bgr.shape[:2]:
+            self._gray = np.empty(frame_bgr.shape[:2], np.uint8)
+        gray = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        self.gray = gray
+        small = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+        prev, self._prev = self._prev, small
+        self.thumbnail = small
+        if prev is None:
+            self.diff = None
+            return None
+        self.diff = cv2.absdiff(small, prev)
+        return float(self.diff.mean())
+
+    def reset(self):
+        self._prev = None
+        self.gray = None
+        self.thumbnail = None
+        self.diff = None
+
+
+class MotionGate:
+    """
+    运动门控：与上一次真正执行检测时的缩略图比较，
+    画面没有明显变化时跳过 MediaPipe，并定期强制刷新
+    """
+    def __init__(self,
+                 pixel_delta: int = GATE_PIXEL_DELTA,
+                 changed_ratio: float = GATE_CHANGED_RATIO,
+                 refresh_frames: int = GATE_REFRESH_FRAMES):
+        self.pixel_delta = pixel_delta
+        self.changed_ratio = changed_ratio
+        self.refresh_frames = refresh_frames
+        self._reference = None
+        self._skipped = 0
+
+    def should_detect(self, thumbnail) -> bool:
+        """返回 True 表示需要运行检测，此时当前缩略图成为新的参考帧"""
+        if self.refresh_frames > 0 and self._reference is not None and self._skipped < self.refresh_frames:
+            diff = cv2.absdiff(thumbnail, self._reference)
+            changed = np.count_nonzero(diff > self.pixel_delta)
+            if changed < self.changed_ratio * diff.size:
+                self._skipped += 1
+                return False
+
+        self._reference = thumbnail
+        self._skipped = 0
+        return True
+
+
+class FramePipeline:
+    """
+    单个连接的帧处理流水线（同步执行，运行在工作线程中）
+    """
+    def __init__(self, detector: HandDetector, profile: DetectorProfile = DEFAULT_PROFILE):
+        self.detector = detector
+        self.profile = profile
+        self.preprocessor = FramePreprocessor(profile.input_size)
+        self.motion = MotionMeter()
+        self.gate = MotionGate(refresh_frames=profile.refresh_frames)
+        self.hybrid = HybridHandDetector(detector, TRACK_REDETECT_FRAMES) if HAND_TRACKING else None
+        self.roi = RoiLearner() if HAND_ROI else None
+        self._last_has_hand = False
+
+    def process(self, data: bytes) -> FrameResult:
+        """
+        按检测尺寸解码一帧 JPEG，计算帧差并检测手部；画面静止时复用上一次的结果
+
+        参数:
+            data: 前端发送的图像字节
+
+        返回:
+            FrameResult: 是否检测到手及画面变化程度
+        """
+        frame = self.preprocessor.decode(data)
+        if frame is None:
+            raise ValueError("无法解码图像帧")
+        return self.process_frame(frame)
+
+    def process_frame(self, frame) -> FrameResult:
+        """
+        处理一帧已解码的 BGR 图像（长边不超过检测尺寸，见 FramePreprocessor.fit）
+
+        返回:
+            FrameResult: 是否检测到手及画面变化程度
+        """
+        motion = self.motion.update(frame)
+        if not self.gate.should_detect(self.motion.thumbnail):
+            return FrameResult(self._last_has_hand, motion, gated=True)
+
+        frame_rgb = self.preprocessor.to_rgb(frame)
+        region = self._detection_region(frame.shape)
+        if self.hybrid is None:
+            landmarks = self.detector.detect_landmarks(frame_rgb, region)
+            tracked = False
+        else:
+            _, tracked = self.hybrid.detect(frame_rgb, self.motion.gray, region)
+            landmarks = self.hybrid.last_landmarks
+
+        if self.roi is not None and landmarks is not None:
+            self.roi.observe(landmarks, frame.shape)
+        self._last_has_hand = tracked or landmarks is not None
+        return FrameResult(self._last_has_hand, motion, tracked=tracked)
+
+    def _detection_region(self, frame_shape):
+        """本帧完整检测使用的区域，None 表示全画面"""
+        if self.roi is None or (self.hybrid is not None and self.hybrid.will_track):
+            return None
+        motion_mask = None if self.motion.diff is None else self.motion.diff > self.gate.pixel_delta
+        return self.roi.region_for(frame_shape, motion_mask)
+
+
+class DetectorSession:
+    """
+    连接与检测器的绑定关系，异步接口只负责把帧交给执行器并等待结果
+
+    handle 由具体执行器解释：线程执行器中是 FramePipeline，进程执行器中是工作进程上的会话句柄。
+    """
+    def __init__(self, pool: "BaseDetectorPool", handle):
+        self.pool = pool
+        self.handle = handle
+        self.closed = False
+
+        # 统计
+        self.frames = 0
+        self.gated = 0
+        self.tracked = 0
+
+    async def process(self, data: bytes) -> FrameResult:
+        result = await self.pool.submit(self, data)
+        self.frames += 1
+        self.gated += result.gated
+        self.tracked += result.tracked
+        return result
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            if self.frames:
+                logger.info(f"检测统计：共 {self.frames} 帧，运动门控跳过 {self.gated} 帧 "
+                            f"({self.gated / self.frames:.1%})，光流跟踪 {self.tracked} 帧")
+            self.pool.release(self)
+
+
+class BaseDetectorPool:
+    """
+    检测执行器基类，负责会话登记与统计
+    """
+    def __init__(self, profile: DetectorProfile = DEFAULT_PROFILE):
+        self._sessions: set = set()
+        # 当前使用的检测器配置档，只影响之后打开的连接
+        self.profile = profile
+
+        # 已关闭连接的累计统计
+        self._closed_frames = 0
+        self._closed_gated = 0
+        self._closed_tracked = 0
+
+    def _register(self, handle) -> DetectorSession:
+        session = DetectorSession(self, handle)
+        self._sessions.add(session)
+        return session
+
+    def _unregister(self, session: DetectorSession):
+        self._sessions.discard(session)
+        self._closed_frames += session.frames
+        self._closed_gated += session.gated
+        self._closed_tracked += session.tracked
+
+    async def open_session(self) -> DetectorSession:
+        """为新连接分配一个检测器"""
+        raise NotImplementedError
+
+    async def submit(self, session: DetectorSession, data: bytes) -> FrameResult:
+        """处理一帧"""
+        raise NotImplementedError
+
+    def release(self, session: DetectorSession):
+        """连接断开后回收检测器"""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """检测统计，包括运动门控命中率与光流跟踪帧数"""
+        frames = self._closed_frames + sum(s.frames for s in self._sessions)
+        gated = self._closed_gated + sum(s.gated for s in self._sessions)
+        tracked = self._closed_tracked + sum(s.tracked for s in self._sessions)
+        return {
+            "profile": self.profile.name,
+            "active_sessions": len(self._sessions),
+            "frames": frames,
+            "detected_frames": frames - gated - tracked,
+            "gated_frames": gated,
+            "tracked_frames": tracked,
+            "gate_hit_rate": gated / frames if frames else 0.0,
+        }
+
+    def shutdown(self):
+        raise NotImplementedError
+
+
+class DetectorPool(BaseDetectorPool):
+    """
+    HandDetector 实例池（线程执行器）
+
+    同一连接的帧按顺序提交，因此一个检测器同一时刻只会被一个线程使用；
+    不同连接的帧可以在多个线程中并行处理。
+    """
+    def __init__(self, max_workers: int = DETECTOR_THREADS, idle_max: int = DETECTOR_IDLE_MAX,
+                 profile: DetectorProfile = DEFAULT_PROFILE):
+        super().__init__(profile)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hand-detector")
+        self.idle_max = idle_max
+        self._idle: list = []
+        self._lock = threading.Lock()
+        # 每个连接最近提交的一帧；连接断开时该帧可能仍在工作线程中检测
+        self._inflight: Dict[DetectorSession, Future] = {}
+
+    def _acquire_detector(self, profile: DetectorProfile) -> HandDetector:
+        with self._lock:
+            while self._idle:
+                idle_profile, detector = self._idle.pop()
+                if idle_profile == profile:
+                    return detector
+        # 创建 MediaPipe 图耗时较长，放在工作线程中执行
+        return HandDetector.from_profile(profile)
+
+    async def open_session(self) -> DetectorSession:
+        loop = asyncio.get_running_loop()
+        profile = self.profile
+        detector = await loop.run_in_executor(self.executor, self._acquire_detector, profile)
+        return self._register(FramePipeline(detector, profile))
+
+    async def submit(self, session: DetectorSession, data: bytes) -> FrameResult:
+        future = self.executor.submit(session.handle.process, data)
+        self._inflight[session] = future
+        return await asyncio.wrap_future(future)
+
+    def release(self, session: DetectorSession):
+        """
+        回收连接的检测器
+
+        连接断开时等待结果的协程被取消，但工作线程中的检测不会中断；
+        此时等该帧处理完（在工作线程中）再重置并放回池中，避免新连接拿到仍在使用的检测器
+        """
+        self._unregister(session)
+        pipeline: FramePipeline = session.handle
+        future = self._inflight.pop(session, None)
+        if future is None or future.done():
+            self._recycle(pipeline)
+        else:
+            future.add_done_callback(lambda _: self._recycle(pipeline))
+
+    def _recycle(self, pipeline: FramePipeline):
+        pipeline.detector.reset()
+        with self._lock:
+            if len(self._idle) < self.idle_max:
+                self._idle.append((pipeline.profile, pipeline.detector))
+        # 未放回池中的检测器由 HandDetector.__del__ 释放
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+        with self._lock:
+            self._idle.clear()
+        logger.info("检测执行器已关闭")
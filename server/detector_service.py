@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+多进程手部检测服务
+MediaPipe 推理在独立的工作进程中执行，突破单进程 GIL 的限制；
+帧数据通过共享内存传递，进程间队列只传递很小的控制消息
+"""
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+import itertools
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+
+from detector_pool import BaseDetectorPool, DetectorSession, DetectorPool, FrameResult
+
+logger = logging.getLogger(__name__)
+
+# 检测执行器类型：thread 线程池（单进程），process 多进程检测服务
+DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "thread")
+# 检测工作进程数，0 表示与 CPU 核数一致
+DETECTOR_WORKERS = int(os.getenv("DETECTOR_WORKERS", "0")) or (os.cpu_count() or 1)
+# 每个连接的共享内存帧缓冲区初始大小（字节），帧更大时自动扩容
+FRAME_BUFFER_SIZE = int(os.getenv("FRAME_BUFFER_SIZE", str(1024 * 1024)))
+# 等待一帧检测结果的最长时间（秒），超时按无效帧处理，连接不会一直等待
+DETECTOR_RESULT_TIMEOUT = float(os.getenv("DETECTOR_RESULT_TIMEOUT", "10"))
+
+# 检查工作进程是否存活的间隔（秒）
+_LIVENESS_INTERVAL = 1.0
+# 重启后这么多秒内再次退出时，不再在新进程中重新打开其上的连接（避免反复崩溃）
+_RESTART_GRACE = 30.0
+
+
+def _worker_main(worker_id: int, requests, results):
+    """
+    工作进程主循环
+
+    消息格式:
+        ("open", session_id, profile)
+        ("frame", session_id, request_id, shm_name, length)
+        ("close", session_id)
+        None 表示退出
+    """
+    from hand_detection import HandDetector
+    from detector_pool import FramePipeline
+
+    pipelines: Dict[int, FramePipeline] = {}
+    buffers: Dict[int, shared_memory.SharedMemory] = {}
+    # 检测器创建失败的连接及错误信息，该连接的每一帧都返回此错误
+    failures: Dict[int, str] = {}
+
+    def detach(session_id):
+        shm = buffers.pop(session_id, None)
+        if shm is not None:
+            shm.close()
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+
+        kind, session_id = message[0], message[1]
+        if kind == "open":
+            profile = message[2]
+            try:
+                pipelines[session_id] = FramePipeline(HandDetector.from_profile(profile), profile)
+                failures.pop(session_id, None)
+            except Exception as e:
+                failures[session_id] = f"检测器初始化失败: {type(e).__name__}: {str(e)}"
+        elif kind == "close":
+            pipelines.pop(session_id, None)
+            failures.pop(session_id, None)
+            detach(session_id)
+        elif kind == "frame":
+            _, _, request_id, shm_name, length = message
+            if session_id in failures:
+                results.put((request_id, None, failures[session_id]))
+                continue
+            try:
+                shm = buffers.get(session_id)
+                if shm is None or shm.name != shm_name:
+                    # 主进程扩容后会换用新的共享内存块
+                    detach(session_id)
+                    shm = shared_memory.SharedMemory(name=shm_name)
+                    buffers[session_id] = shm
+                data = shm.buf[:length]
+                try:
+                    result = pipelines[session_id].process(data)
+                finally:
+                    data.release()
+                results.put((request_id, result, None))
+            except Exception as e:
+                results.put((request_id, None, f"{type(e).__name__}: {str(e)}"))
+
+    for session_id in list(buffers):
+        detach(session_id)
+    results.put(("exit", worker_id, None))
+
+
+class _WorkerHandle:
+    """主进程侧的会话句柄：所在工作进程和共享内存帧缓冲区"""
+    def __init__(self, session_id: int, worker: int, profile):
+        self.session_id = session_id
+        self.worker = worker
+        self.profile = profile
+        # 所在工作进程反复崩溃后不再重新打开，该连接的每一帧都直接失败
+        self.failed = False
+        self.shm: Optional[shared_memory.SharedMemory] = None
+        # 最近一次请求的序号和结果；超时或调用方取消后仍保留到工作进程返回结果，
+        # 期间工作进程可能还在读取共享内存，不能写入新帧
+        self.request_id: Optional[int] = None
+        self.inflight: Optional[asyncio.Future] = None
+
+    @property
+    def busy(self) -> bool:
+        return self.inflight is not None and not self.inflight.done()
+
+    def write_frame(self, data: bytes) -> str:
+        """把帧写入共享内存，返回共享内存块名称"""
+        if self.shm is None or self.shm.size < len(data):
+            self.free()
+            size = max(FRAME_BUFFER_SIZE, len(data))
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.shm.buf[:len(data)] = data
+        return self.shm.name
+
+    def free(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class ProcessDetectorPool(BaseDetectorPool):
+    """
+    多进程检测服务
+
+    - 每个工作进程持有若干连接各自的 FramePipeline（含 MediaPipe Hands 实例），
+      连接固定分配到当前会话数最少的进程，跟踪状态始终留在同一进程内。
+    - 每个连接同一时刻最多只有一帧在途（前端帧接收已做最新帧优先），
+      工作进程按 FIFO 处理请求，等价于在其上的连接之间轮转，实现公平调度。
+    - 工作进程在第一个连接到来时才启动，避免导入 main 时派生子进程。
+    - 每帧结果最多等待 DETECTOR_RESULT_TIMEOUT 秒，超时的请求在结果返回前本连接不写入新帧；工作进程意外退出时，
+      其在途请求立即失败，进程被重新启动，原有连接在新进程中重新打开。
+    """
+    def __init__(self, workers: int = DETECTOR_WORKERS):
+        super().__init__()
+        self.workers = workers
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = []
+        self._queues = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # 请求序号 -> (结果, 所在工作进程)
+        self._pending: Dict[int, Tuple[asyncio.Future, int]] = {}
+        self._load = [0] * workers
+        self._ids = itertools.count(1)
+        self._stopping = threading.Event()
+        self._restarted_at = [float("-inf")] * workers
+        self.restarts = 0
+
+    def _spawn(self, worker_id: int):
+        """
+        启动一个工作进程及其结果收集线程
+
+        每个进程使用独立的结果队列：进程被杀死时可能持有队列的写锁，
+        共用一个队列会让其他进程的结果也无法送达
+        """
+        requests = self._context.Queue()
+        results = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, requests, results),
+            name=f"hand-detector-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        threading.Thread(target=self._collect_results, args=(worker_id, process, results),
+                         name=f"detector-results-{worker_id}", daemon=True).start()
+        return requests, process
+
+    def _start(self):
+        self._loop = asyncio.get_running_loop()
+        for worker_id in range(self.workers):
+            requests, process = self._spawn(worker_id)
+            self._queues.append(requests)
+            self._processes.append(process)
+        logger.info(f"多进程检测服务已启动，工作进程数：{self.workers}")
+
+    def _collect_results(self, worker_id: int, process, results):
+        """结果收集线程：把一个工作进程的结果交回事件循环，并检查该进程是否存活"""
+        while True:
+            try:
+                request_id, result, error = results.get(timeout=_LIVENESS_INTERVAL)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                if not process.is_alive():
+                    self._loop.call_soon_threadsafe(self._restart_worker, worker_id, process)
+                    return
+                continue
+            if request_id == "exit":
+                return
+            self._loop.call_soon_threadsafe(self._resolve, request_id, result, error)
+
+    def _restart_worker(self, worker_id: int, process):
+        """工作进程意外退出：在途请求失败，重新启动进程并重新打开其上的连接"""
+        if self._stopping.is_set() or self._processes[worker_id] is not process:
+            return
+        logger.error(f"检测工作进程 {worker_id} 意外退出（exitcode={process.exitcode}），正在重新启动")
+        for request_id, (future, worker) in list(self._pending.items()):
+            if worker == worker_id:
+                del self._pending[request_id]
+                if not future.done():
+                    future.set_exception(ValueError("检测工作进程意外退出"))
+        self._queues[worker_id], self._processes[worker_id] = self._spawn(worker_id)
+        self.restarts += 1
+        now = time.monotonic()
+        reopen = now - self._restarted_at[worker_id] >= _RESTART_GRACE
+        self._restarted_at[worker_id] = now
+        for session in self._sessions:
+            handle: _WorkerHandle = session.handle
+            if handle.worker != worker_id or handle.failed:
+                continue
+            if reopen:
+                self._queues[worker_id].put(("open", handle.session_id, handle.profile))
+            else:
+                handle.failed = True
+                logger.error(f"检测工作进程 {worker_id} 重启后再次退出，连接 {handle.session_id} 停止检测")
+
+    def _resolve(self, request_id: int, result: Optional[FrameResult], error: Optional[str]):
+        future, _ = self._pending.pop(request_id, (None, None))
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(ValueError(error))
+        else:
+            future.set_result(result)
+
+    async def open_session(self) -> DetectorSession:
+        if not self._processes:
+            self._start()
+        worker = min(range(self.workers), key=self._load.__getitem__)
+        self._load[worker] += 1
+        handle = _WorkerHandle(next(self._ids), worker, self.profile)
+        self._queues[worker].put(("open", handle.session_id, self.profile))
+        return self._register(handle)
+
+    async def submit(self, session: DetectorSession, data: bytes) -> FrameResult:
+        handle: _WorkerHandle = session.handle
+        if handle.failed:
+            raise ValueError("检测工作进程反复崩溃，本连接已停止检测")
+        if handle.busy:
+            # 上一帧超时后结果尚未返回，工作进程可能仍在读取共享内存：跳过本帧
+            raise ValueError("上一帧仍在检测中，本帧跳过")
+        shm_name = handle.write_frame(data)
+        request_id = next(self._ids)
+        future = self._loop.create_future()
+        self._pending[request_id] = (future, handle.worker)
+        handle.request_id, handle.inflight = request_id, future
+        self._queues[handle.worker].put(("frame", handle.session_id, request_id, shm_name, len(data)))
+        try:
+            # shield：超时或连接断开时请求仍在途，结果返回（或进程重启、连接释放）时才从 _pending 中移除
+            return await asyncio.wait_for(asyncio.shield(future), DETECTOR_RESULT_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise ValueError(f"检测超时（{DETECTOR_RESULT_TIMEOUT:g}s）")
+        finally:
+            if future.done():
+                self._pending.pop(request_id, None)
+
+    def release(self, session: DetectorSession):
+        self._unregister(session)
+        handle: _WorkerHandle = session.handle
+        self._load[handle.worker] -= 1
+        # 未返回的请求不再等待；共享内存在工作进程中仍有映射，unlink 不影响其读取
+        future, _ = self._pending.pop(handle.request_id, (None, None))
+        if future is not None:
+            future.cancel()
+        self._queues[handle.worker].put(("close", handle.session_id))
+        handle.free()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["workers"] = self.workers
+        stats["sessions_per_worker"] = list(self._load)
+        stats["worker_restarts"] = self.restarts
+        return stats
+
+    def shutdown(self):
+        self._stopping.set()
+        for requests in self._queues:
+            requests.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+        for future, _ in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        logger.info("多进程检测服务已关闭")
+
+
+def create_detector_pool() -> BaseDetectorPool:
+    """根据 DETECTOR_BACKEND 创建检测执行器"""
+    if DETECTOR_BACKEND == "process":
+        return ProcessDetectorPool()
+    return DetectorPool()
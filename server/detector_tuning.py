@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+检测器配置档自动调优
+启动时在当前 CPU 上用样本帧测试各配置档的单帧耗时，
+选出满足目标延迟的最准确配置档
+"""
+import os
+import time
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from hand_detection import HandDetector, FramePreprocessor, DetectorProfile, DETECTOR_PROFILES, DEFAULT_PROFILE
+
+logger = logging.getLogger(__name__)
+
+# 检测器配置档名称，auto 表示启动时自动选择
+DETECTOR_PROFILE = os.getenv("DETECTOR_PROFILE", "auto")
+# 自动调优的目标单帧耗时（毫秒），包括解码与检测
+DETECTOR_TARGET_MS = float(os.getenv("DETECTOR_TARGET_MS", "30"))
+# 自动调优的样本帧目录，默认使用截图目录
+DETECTOR_TUNE_SAMPLES = os.getenv("DETECTOR_TUNE_SAMPLES", str(Path(__file__).parent / "shots"))
+
+# 每个样本帧的测量次数（不含预热）
+_TUNE_ROUNDS = 3
+# 最多使用的样本帧数量
+_TUNE_MAX_SAMPLES = 5
+# 检测流的 JPEG 质量，与客户端（client/app.js 的 LOW_QUALITY）一致
+_STREAM_QUALITY = 60
+# 样本帧保留的长边像素数：最大配置档的输入尺寸，测试各配置档时再缩小
+_SAMPLE_SIZE = max(profile.input_size for profile in DETECTOR_PROFILES.values())
+
+
+def _to_stream_frame(image: np.ndarray, size: int) -> bytes:
+    """把图像缩放编码成与检测流相同尺寸（长边 size 像素）和质量的 JPEG"""
+    height, width = image.shape[:2]
+    scale = size / max(height, width)
+    if scale < 1:
+        image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, _STREAM_QUALITY])[1].tobytes()
+
+
+def load_sample_frames(sample_dir: str = DETECTOR_TUNE_SAMPLES) -> List[bytes]:
+    """
+    读取样本帧（JPEG 字节），目录中没有可解码的图片时生成合成帧
+
+    截图是高清原图，而检测流是客户端按配置档输入尺寸缩小后的低质量 JPEG，
+    样本先缩小到最大配置档的尺寸，测试各配置档时再缩放成其检测流尺寸；无法解码的文件跳过
+    """
+    samples = []
+    directory = Path(sample_dir)
+    if directory.is_dir():
+        for path in sorted(directory.iterdir(), reverse=True):
+            if not (path.is_file() and path.suffix.lower() in ('.jpg', '.jpeg', '.png')):
+                continue
+            image = cv2.imread(str(path), cv2.IMREAD_REDUCED_COLOR_2)
+            if image is None:
+                logger.warning(f"跳过无法解码的样本帧 {path.name}")
+                continue
+            samples.append(_to_stream_frame(image, _SAMPLE_SIZE))
+            if len(samples) >= _TUNE_MAX_SAMPLES:
+                break
+
+    if not samples:
+        samples = _synthetic_frames()
+    return samples
+
+
+def _synthetic_frames() -> List[bytes]:
+    """合成帧：带噪声的画面，近似检测流帧的解码开销"""
+    rng = np.random.default_rng(0)
+    samples = []
+    for _ in range(3):
+        frame = rng.integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+        frame = cv2.GaussianBlur(frame, (9, 9), 0)
+        samples.append(_to_stream_frame(frame, _SAMPLE_SIZE))
+    return samples
+
+
+def benchmark_profile(profile: DetectorProfile, samples: List[bytes]) -> float:
+    """
+    测量配置档的平均单帧耗时（毫秒），包括缩小解码、颜色转换和 MediaPipe 检测
+    """
+    detector = HandDetector.from_profile(profile)
+    preprocessor = FramePreprocessor(profile.input_size)
+
+    # 预热：第一次调用包含图初始化开销
+    detector.detect(preprocessor.to_rgb(preprocessor.decode(samples[0])))
+
+    elapsed = 0.0
+    count = 0
+    for _ in range(_TUNE_ROUNDS):
+        for data in samples:
+            start = time.perf_counter()
+            frame = preprocessor.decode(data)
+            detector.detect(preprocessor.to_rgb(frame))
+            elapsed += time.perf_counter() - start
+            count += 1
+    return elapsed / count * 1000
+
+
+def _decode_samples(samples: List[bytes]) -> List[np.ndarray]:
+    """解码样本帧，跳过无法解码的"""
+    preprocessor = FramePreprocessor(_SAMPLE_SIZE)
+    images = []
+    for data in samples:
+        try:
+            image = preprocessor.decode(data)
+        except ValueError:
+            image = None
+        if image is not None:
+            # decode 可能返回复用的缓冲区
+            images.append(image.copy())
+    return images
+
+
+def autotune_profile(target_ms: float = DETECTOR_TARGET_MS,
+                     samples: Optional[List[bytes]] = None) -> DetectorProfile:
+    """
+    按准确度从高到低测试配置档，返回第一个满足目标耗时的配置档；
+    都不满足时返回最快的配置档
+
+    每个配置档使用按其输入尺寸缩放的样本（前端按配置档的输入尺寸发送检测帧）
+    """
+    # 调用方传入的样本也可能无法解码，只保留能解码的
+    images = _decode_samples(samples or load_sample_frames()) or _decode_samples(_synthetic_frames())
+    timings = {}
+    for profile in DETECTOR_PROFILES.values():
+        stream = [_to_stream_frame(image, profile.input_size) for image in images]
+        timings[profile.name] = benchmark_profile(profile, stream)
+        logger.info(f"检测器配置档 {profile.name}: {timings[profile.name]:.1f} ms/帧")
+        if timings[profile.name] <= target_ms:
+            return profile
+
+    fastest = min(timings, key=timings.get)
+    logger.warning(f"没有配置档满足 {target_ms:.0f} ms/帧 的目标，使用最快的配置档 {fastest}")
+    return DETECTOR_PROFILES[fastest]
+
+
+def select_profile(name: str = DETECTOR_PROFILE) -> DetectorProfile:
+    """根据 DETECTOR_PROFILE 选择配置档，auto 时运行自动调优"""
+    if name == "auto":
+        profile = autotune_profile()
+        logger.info(f"自动选择检测器配置档：{profile.name}")
+        return profile
+
+    if name not in DETECTOR_PROFILES:
+        logger.warning(f"未知的检测器配置档 {name}，使用默认配置档 {DEFAULT_PROFILE.name}")
+        return DEFAULT_PROFILE
+    return DETECTOR_PROFILES[name]
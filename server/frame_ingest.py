@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+WebSocket 帧接收模块
+读取任务持续接收前端帧，只保留最新一帧；处理任务取走最新帧进行检测。
+检测变慢时旧帧被直接丢弃，端到端延迟最多一帧。
+
+前端发送 hello 协商帧协议后，二进制消息带帧头（见 ws_protocol），
+高清截图按消息类型区分并存入高清帧缓冲区；未协商的旧前端按到达顺序区分高清截图。
+"""
+import json
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from ws_protocol import parse_frame, hello_reply, FrameHeader, MSG_DETECT, MSG_HD, PIXEL_ENCODED, HEADER_SIZE
+from hd_ring import HdFrameRing, HD_RING_SIZE, HD_REQUEST_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class FrameIngest:
+    """
+    单个连接的帧接收器（最新帧优先）
+    """
+    def __init__(self, websocket: WebSocket, detect_size: int = 0):
+        """
+        参数:
+            websocket: 连接
+            detect_size: 检测帧长边的像素数（本连接检测器配置档的输入尺寸），在 hello 应答中告知前端
+        """
+        self.websocket = websocket
+        self.detect_size = detect_size
+        self._frame: Optional[bytes] = None
+        self._frame_header: Optional[FrameHeader] = None
+        self._ready = asyncio.Event()
+        self._hd_waiter: Optional[asyncio.Future] = None
+        # 最近收到的检测帧（含帧头），高清截图请求超时时作为备选
+        self._preview: Optional[Tuple[bytes, Optional[FrameHeader]]] = None
+        self._error: Optional[BaseException] = None
+
+        # 协商后的协议版本，0 表示旧前端（无帧头）
+        self.version = 0
+        self.formats = ["jpeg"]
+        # 最近一次 next_frame 取走的帧的帧头（旧前端为 None）
+        self.header: Optional[FrameHeader] = None
+        self._last_seq = -1
+        # 前端推送的高清帧
+        self.hd_ring = HdFrameRing()
+
+        # 统计
+        self.received = 0
+        self.dropped = 0
+        self.invalid = 0
+        self.seq_gaps = 0
+
+    @property
+    def framed(self) -> bool:
+        """前端是否使用带帧头的协议"""
+        return self.version > 0
+
+    async def run(self):
+        """读取任务：接收到的帧覆盖尚未处理的旧帧"""
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
+
+                if message.get("text") is not None:
+                    await self._handle_control(message["text"])
+                elif message.get("bytes") is not None:
+                    self._handle_binary(message["bytes"])
+        except Exception as e:
+            # 连接断开或接收出错，交给处理任务抛出
+            self._error = e
+            self._ready.set()
+            if self._hd_waiter is not None and not self._hd_waiter.done():
+                self._hd_waiter.set_exception(e)
+
+    async def _handle_control(self, text: str):
+        try:
+            control = json.loads(text)
+        except ValueError:
+            logger.warning(f"无法解析的控制消息：{text[:100]}")
+            return
+
+        if control.get("type") == "hello":
+            reply = hello_reply(control.get("formats", []), hd_stream=HD_RING_SIZE > 0,
+                                detect_size=self.detect_size)
+            self.version = reply["version"]
+            self.formats = reply["formats"]
+            await self.websocket.send_json(reply)
+            logger.info(f"前端使用帧协议 v{self.version}，像素格式：{', '.join(self.formats)}")
+        else:
+            logger.debug(f"忽略未知控制消息：{control.get('type')}")
+
+    def _handle_binary(self, data: bytes):
+        try:
+            framed = parse_frame(data)
+        except ValueError as e:
+            self.invalid += 1
+            logger.warning(f"丢弃无效帧: {str(e)}")
+            return
+
+        if framed is None:
+            # 旧前端：正在等待高清截图时，下一条二进制消息即为高清帧
+            if self._hd_waiter is not None and not self._hd_waiter.done():
+                self._hd_waiter.set_result(data)
+            else:
+                self._push_frame(data, None)
+            return
+
+        header, payload = framed
+        if header.msg_type == MSG_HD:
+            self._push_hd(bytes(payload), header.timestamp)
+        elif header.msg_type == MSG_DETECT:
+            # 乱序到达的旧帧直接丢弃
+            if header.seq <= self._last_seq:
+                self.dropped += 1
+                return
+            if self._last_seq >= 0:
+                self.seq_gaps += header.seq - self._last_seq - 1
+            self._last_seq = header.seq
+            self._push_frame(data, header)
+        else:
+            self.invalid += 1
+            logger.warning(f"丢弃未知类型的消息：{header.msg_type}")
+
+    def _push_frame(self, data: bytes, header: Optional[FrameHeader]):
+        self.received += 1
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = data
+        self._frame_header = header
+        self._preview = (data, header)
+        self._ready.set()
+
+    def _push_hd(self, data: bytes, timestamp: float):
+        self.hd_ring.push(timestamp, data)
+        if self._hd_waiter is not None and not self._hd_waiter.done():
+            self._hd_waiter.set_result(data)
+
+    async def next_frame(self) -> bytes:
+        """处理任务：等待并取走最新一帧（带帧头的帧原样返回，由预处理解析）"""
+        while self._frame is None:
+            if self._error is not None:
+                raise self._error
+            self._ready.clear()
+            await self._ready.wait()
+
+        data, self._frame = self._frame, None
+        self.header = self._frame_header
+        return data
+
+    async def next_hd_frame(self, timeout: float = HD_REQUEST_TIMEOUT) -> bytes:
+        """
+        等待前端发送的下一张高清截图（只含图像字节，不含帧头）
+
+        异常:
+            asyncio.TimeoutError: timeout 秒内前端没有发送高清截图
+        """
+        if self._error is not None:
+            raise self._error
+        self._hd_waiter = asyncio.get_running_loop().create_future()
+        try:
+            return await asyncio.wait_for(self._hd_waiter, timeout)
+        finally:
+            self._hd_waiter = None
+
+    def fallback_frames(self) -> Tuple[str, List[bytes]]:
+        """
+        等不到高清截图时的候选帧
+
+        返回:
+            (来源, 图像字节列表)：缓冲区中有高清帧时为 ("ring", 全部缓存帧)，
+            否则为 ("preview", [最近一帧检测帧])；检测帧是原始像素格式或还没有收到帧时列表为空
+        """
+        frames = self.hd_ring.frames_after(0)
+        if frames:
+            return "ring", [frame.data for frame in frames]
+        if self._preview is None:
+            return "preview", []
+        data, header = self._preview
+        if header is None:
+            return "preview", [data]
+        if header.pixel_format != PIXEL_ENCODED:
+            return "preview", []
+        return "preview", [bytes(memoryview(data)[HEADER_SIZE:])]
+
+    def log_stats(self):
+        if self.received:
+            logger.info(f"帧接收统计：共 {self.received} 帧，丢弃旧帧 {self.dropped} 帧 "
+                        f"({self.dropped / self.received:.1%})，无效 {self.invalid} 帧，"
+                        f"序号缺口 {self.seq_gaps} 帧")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+监控帧率协商模块
+根据截图状态机决定前端的发送帧率：等待手部时降为低帧率，
+手在画面中或等待截图时恢复高帧率并推送高清帧，通过 JSON 控制消息通知前端
+"""
+import os
+import time
+from typing import Optional
+
+from capture_trigger import CaptureTrigger
+from hd_ring import HD_RING_SIZE, HD_STREAM_FPS
+
+# 空闲（等待手部）时的帧率
+FRAME_RATE_IDLE = float(os.getenv("FRAME_RATE_IDLE", "2"))
+# 手在画面中或等待截图时的帧率
+FRAME_RATE_ACTIVE = float(os.getenv("FRAME_RATE_ACTIVE", "10"))
+# 画面无手且无明显变化持续多少秒后降为空闲帧率
+FRAME_RATE_IDLE_DELAY = float(os.getenv("FRAME_RATE_IDLE_DELAY", "5"))
+# 空闲时帧差超过该值视为画面有动静，立即恢复高帧率
+FRAME_RATE_WAKE_MOTION = float(os.getenv("FRAME_RATE_WAKE_MOTION", "4.0"))
+
+
+def rate_message(fps: float, hd_fps: float = 0) -> dict:
+    """帧率提示控制消息，hd_fps 为高清帧推流帧率（0 表示停止推流）"""
+    return {"type": "rate", "fps": fps, "hd_fps": hd_fps}
+
+
+class FrameRateController:
+    """
+    单个连接的帧率控制器
+
+    - 状态机处于 HAND_ON / SETTLING 时始终使用高帧率
+    - WAIT_HAND 状态下画面持续 idle_delay 秒没有变化后降为低帧率，
+      翻页间隙手很快回到画面时不会掉帧
+    - 低帧率下画面出现变化（手伸进来）时立即恢复高帧率
+    - 手在画面中或等待截图时请求前端推送高清帧，截图直接取缓冲区中的帧
+    """
+    def __init__(self,
+                 idle_fps: float = FRAME_RATE_IDLE,
+                 active_fps: float = FRAME_RATE_ACTIVE,
+                 idle_delay: float = FRAME_RATE_IDLE_DELAY,
+                 wake_motion: float = FRAME_RATE_WAKE_MOTION,
+                 hd_stream_fps: float = HD_STREAM_FPS if HD_RING_SIZE > 0 else 0):
+        self.idle_fps = idle_fps
+        self.active_fps = active_fps
+        self.idle_delay = idle_delay
+        self.wake_motion = wake_motion
+        self.hd_stream_fps = hd_stream_fps
+
+        # 前端连接时使用自己的默认帧率，按高帧率处理
+        self.fps = active_fps
+        self.hd_fps = 0
+        self.last_active = time.monotonic()
+
+    def update(self, state: int, motion: Optional[float], now: Optional[float] = None,
+               capture_pending: bool = False) -> Optional[dict]:
+        """
+        输入处理完一帧后的状态机状态
+
+        参数:
+            state: CaptureTrigger 当前状态
+            motion: 与上一帧的帧差，None 表示无法计算
+            now: 当前时间（秒），默认使用 time.monotonic()
+            capture_pending: 是否有截图正在进行（状态机触发截图后已回到 WAIT_HAND，
+                截图仍在等待缓冲区中的高清帧，此时不能停止推流）
+
+        返回:
+            帧率发生变化时返回新的帧率提示消息，否则返回 None
+        """
+        if now is None:
+            now = time.monotonic()
+
+        if state != CaptureTrigger.WAIT_HAND or (motion is not None and motion >= self.wake_motion):
+            self.last_active = now
+            fps = self.active_fps
+        elif now - self.last_active >= self.idle_delay:
+            fps = self.idle_fps
+        else:
+            fps = self.fps
+
+        hd_fps = self.hd_stream_fps if state != CaptureTrigger.WAIT_HAND or capture_pending else 0
+        if fps == self.fps and hd_fps == self.hd_fps:
+            return None
+        self.fps = fps
+        self.hd_fps = hd_fps
+        return rate_message(fps, hd_fps)
@@ -3,15 +3,281 @@
 手部检测模块
 使用 MediaPipe 实现手部检测
 """
+import os
+from typing import NamedTuple
+
 import cv2
 import mediapipe as mp
 import numpy as np
 
+from image_header import read_image_header
+from ws_protocol import parse_frame, PIXEL_GRAY8, PIXEL_I420
+
+# 检测输入图像长边（像素），非 0 时覆盖所有配置档的输入尺寸；
+# 前端按所用配置档的输入尺寸发送检测帧（见 hello 应答的 detect_size）
+DETECTION_SIZE = int(os.getenv("DETECTION_SIZE", "0"))
+
+
+class DetectorProfile(NamedTuple):
+    """检测器配置档"""
+    name: str
+    # MediaPipe 手部模型复杂度：0 轻量，1 完整
+    model_complexity: int
+    # 检测输入图像长边（像素）
+    input_size: int
+    min_detection_confidence: float
+    min_tracking_confidence: float
+    # 画面静止时最多连续复用多少帧检测结果
+    refresh_frames: int
+    max_num_hands: int = 1
+
+
+# 检测器配置档，按准确度从高到低排列
+DETECTOR_PROFILES = {
+    profile.name: profile for profile in (
+        DetectorProfile("accurate", 1, 480, 0.5, 0.5, 5),
+        DetectorProfile("balanced", 1, 320, 0.5, 0.5, 10),
+        DetectorProfile("fast", 0, 256, 0.5, 0.5, 10),
+        DetectorProfile("minimal", 0, 160, 0.4, 0.4, 15),
+    )
+}
+if DETECTION_SIZE > 0:
+    DETECTOR_PROFILES = {name: profile._replace(input_size=DETECTION_SIZE)
+                         for name, profile in DETECTOR_PROFILES.items()}
+DEFAULT_PROFILE = DETECTOR_PROFILES["balanced"]
+
+# 缩小解码的倍率与对应的 imdecode 标志（由大到小）
+_REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+class FramePreprocessor:
+    """
+    检测流预处理：按目标尺寸缩小解码 JPEG，并复用颜色转换缓冲区
+
+    JPEG 在 DCT 域直接缩小解码，比完整解码后再缩放快得多；
+    同一连接的帧尺寸固定，因此缩放和 RGB 转换的输出缓冲区可以一直复用。
+    带帧头的灰度 / I420 原始帧直接包装为数组，无需 imdecode。
+    """
+    def __init__(self, target_size=DEFAULT_PROFILE.input_size):
+        """
+        参数:
+            target_size: 检测图像长边的目标像素数
+        """
+        self.target_size = target_size
+        self._resized = None
+        self._rgb = None
+        self._raw_bgr = None
+
+    def _decode_flag(self, data):
+        header = read_image_header(data)
+        if header is None:
+            return cv2.IMREAD_COLOR
+        long_edge = max(header.width, header.height)
+        for factor, flag in _REDUCED_DECODE_FLAGS:
+            if long_edge // factor >= self.target_size:
+                return flag
+        return cv2.IMREAD_COLOR
+
+    def decode(self, data):
+        """
+        解码检测帧
+
+        参数:
+            data: JPEG/PNG 字节，或带帧头的检测帧
+
+        返回:
+            BGR 图像，长边不超过 target_size；无法解码时返回 None
+
+        异常:
+            ValueError: 帧头无效
+        """
+        framed = parse_frame(data)
+        if framed is not None:
+            header, data = framed
+            if header.pixel_format in (PIXEL_GRAY8, PIXEL_I420):
+                return self.fit(self._wrap_raw(header, data))
+
+        frame = cv2.imdecode(np.frombuffer(data, np.uint8), self._decode_flag(data))
+        if frame is None:
+            return None
+        return self.fit(frame)
+
+    def _wrap_raw(self, header, payload):
+        """把灰度 / I420 原始帧转换为 BGR，结果写入复用的缓冲区"""
+        width, height = header.width, header.height
+        shape = (height, width, 3)
+        if self._raw_bgr is None or self._raw_bgr.shape != shape:
+            self._raw_bgr = np.empty(shape, np.uint8)
+
+        pixels = np.frombuffer(payload, np.uint8)
+        if header.pixel_format == PIXEL_GRAY8:
+            cv2.cvtColor(pixels.reshape(height, width), cv2.COLOR_GRAY2BGR, dst=self._raw_bgr)
+        else:
+            cv2.cvtColor(pixels.reshape(height * 3 // 2, width), cv2.COLOR_YUV2BGR_I420, dst=self._raw_bgr)
+        return self._raw_bgr
+
+    def fit(self, frame):
+        """长边超过 target_size 时缩小到复用的缓冲区"""
+        height, width = frame.shape[:2]
+        scale = self.target_size / max(height, width)
+        if scale >= 1:
+            return frame
+
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        if self._resized is None or self._resized.shape[1::-1] != size:
+            self._resized = np.empty((size[1], size[0], 3), np.uint8)
+        cv2.resize(frame, size, dst=self._resized, interpolation=cv2.INTER_AREA)
+        return self._resized
+
+    def to_rgb(self, frame):
+        """BGR 转 RGB，结果写入复用的缓冲区（下次调用前有效）"""
+        if self._rgb is None or self._rgb.shape != frame.shape:
+            self._rgb = np.empty_like(frame)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        return self._rgb
+
+
+class HandTracker:
+    """
+    轻量级手部跟踪器：在手部区域内取特征点，用金字塔 LK 光流逐帧跟踪
+
+    每个点做前向-后向一致性检查，手离开画面或被遮挡时有效点迅速减少，
+    跟踪器随即判定丢失，交还给完整检测。
+    """
+    def __init__(self, max_points=40, min_points=8, fb_threshold=1.0):
+        """
+        参数:
+            max_points: 手部区域内最多提取的角点数
+            min_points: 有效点少于该值时判定跟踪丢失
+            fb_threshold: 前向-后向误差阈值（像素）
+        """
+        self.max_points = max_points
+        self.min_points = min_points
+        self.fb_threshold = fb_threshold
+        self._lk_params = dict(winSize=(15, 15), maxLevel=2,
+                               criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+        self._prev = None
+        self._points = None
+
+    @property
+    def active(self):
+        return self._points is not None
+
+    def start(self, gray, landmarks):
+        """
+        以检测到的关键点初始化跟踪
+        
+        参数:
+            gray: 灰度图像
+            landmarks: 关键点像素坐标 (N, 2)
+        """
+        mask = np.zeros(gray.shape, np.uint8)
+        cv2.fillConvexPoly(mask, cv2.convexHull(landmarks.astype(np.int32)), 255)
+        corners = cv2.goodFeaturesToTrack(gray, self.max_points, 0.01, 3, mask=mask)
+        points = landmarks.reshape(-1, 1, 2)
+        if corners is not None:
+            points = np.concatenate([points, corners.astype(np.float32)])
+        self._points = points
+        self._prev = gray.copy()
+
+    def update(self, gray):
+        """
+        跟踪到新的一帧
+        
+        返回:
+            bool: 跟踪是否仍然有效
+        """
+        if self._points is None:
+            return False
+
+        forward, status, _ = cv2.calcOpticalFlowPyrLK(self._prev, gray, self._points, None, **self._lk_params)
+        backward, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self._prev, forward, None, **self._lk_params)
+        fb_error = np.linalg.norm((self._points - backward).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.fb_threshold)
+
+        if np.count_nonzero(good) < self.min_points:
+            self.reset()
+            return False
+
+        self._points = forward[good]
+        np.copyto(self._prev, gray)
+        return True
+
+    def reset(self):
+        self._prev = None
+        self._points = None
+
+
+class HybridHandDetector:
+    """
+    检测 + 跟踪混合模式
+
+    检测到手后在后续帧中用 HandTracker 代替 MediaPipe，
+    每 redetect_interval 帧或跟踪丢失时重新做一次完整检测；
+    没有手时每帧都做完整检测，保证手的出现和离开都能及时发现。
+    """
+    def __init__(self, detector, redetect_interval=5):
+        """
+        参数:
+            detector: HandDetector 实例
+            redetect_interval: 两次完整检测之间最多跟踪的帧数
+        """
+        self.detector = detector
+        self.redetect_interval = redetect_interval
+        self.tracker = HandTracker()
+        self._since_detect = 0
+        # 最近一次完整检测得到的关键点，跟踪帧为 None
+        self.last_landmarks = None
+
+    @property
+    def will_track(self):
+        """下一帧是否会先尝试跟踪"""
+        return self.tracker.active and self._since_detect < self.redetect_interval
+
+    def detect(self, image, gray, region=None):
+        """
+        检测图像中是否存在手
+        
+        参数:
+            image: RGB格式图像
+            gray: 同一帧的灰度图像
+            region: 完整检测时只在该区域内检测，None 表示全图
+            
+        返回:
+            (has_hand, tracked): 是否有手，以及结果是否来自跟踪器
+        """
+        self.last_landmarks = None
+        if self.will_track:
+            if self.tracker.update(gray):
+                self._since_detect += 1
+                return True, True
+
+        self._since_detect = 0
+        landmarks = self.detector.detect_landmarks(image, region)
+        self.last_landmarks = landmarks
+        if landmarks is None:
+            self.tracker.reset()
+            return False, False
+
+        self.tracker.start(gray, landmarks)
+        return True, False
+
+    def reset(self):
+        self.tracker.reset()
+        self._since_detect = 0
+
+
 class HandDetector:
     def __init__(self, 
                  max_num_hands=1, 
                  min_detection_confidence=0.5, 
-                 min_tracking_confidence=0.5):
+                 min_tracking_confidence=0.5,
+                 model_complexity=1,
+                 static_image_mode=False):
         """
         初始化手部检测器
         
@@ -19,14 +285,28 @@ class HandDetector:
             max_num_hands: 最大检测手数量
             min_detection_confidence: 最小检测置信度
             min_tracking_confidence: 最小跟踪置信度
+            model_complexity: 模型复杂度，0 轻量，1 完整
+            static_image_mode: 是否按独立图片检测（不做帧间跟踪）
         """
         self.mp_hands = mp.solutions.hands
         self.hands = self.mp_hands.Hands(
             max_num_hands=max_num_hands,
             min_detection_confidence=min_detection_confidence,
             min_tracking_confidence=min_tracking_confidence,
-            static_image_mode=False
+            model_complexity=model_complexity,
+            static_image_mode=static_image_mode
         )
+        # 上一次 detect_landmarks 的输入几何（区域, 图像尺寸），用于判断跟踪状态是否仍然有效
+        self._geometry = None
+    
+    @classmethod
+    def from_profile(cls, profile: DetectorProfile, static_image_mode=False):
+        """按配置档创建检测器"""
+        return cls(max_num_hands=profile.max_num_hands,
+                   min_detection_confidence=profile.min_detection_confidence,
+                   min_tracking_confidence=profile.min_tracking_confidence,
+                   model_complexity=profile.model_complexity,
+                   static_image_mode=static_image_mode)
         
     def detect(self, image):
         """
@@ -44,6 +324,40 @@ class HandDetector:
         # 检查是否有手部关键点
         return bool(results.multi_hand_landmarks)
     
+    def detect_landmarks(self, image, region=None):
+        """
+        检测手部并返回关键点像素坐标
+        
+        参数:
+            image: RGB格式图像
+            region: 只在该区域 (x0, y0, x1, y1) 内检测，None 表示全图
+            
+        返回:
+            np.ndarray: 所有手的关键点 (N, 2)，float32 全图像素坐标；未检测到手时返回 None
+        """
+        if region is not None:
+            x0, y0, x1, y1 = region
+            image = np.ascontiguousarray(image[y0:y1, x0:x1])
+        
+        # 跟踪模式下 MediaPipe 用上一帧的关键点（归一化坐标）作为本帧的搜索区域，
+        # 裁剪区域变化后这些坐标对应的是另一块画面，必须先清除跟踪状态重新做手掌检测
+        geometry = (region, image.shape[:2])
+        if geometry != self._geometry:
+            self.hands.reset()
+            self._geometry = geometry
+        
+        results = self.hands.process(image)
+        if not results.multi_hand_landmarks:
+            return None
+        
+        height, width = image.shape[:2]
+        points = np.array([(lm.x * width, lm.y * height)
+                           for hand_landmarks in results.multi_hand_landmarks
+                           for lm in hand_landmarks.landmark], dtype=np.float32)
+        if region is not None:
+            points += (region[0], region[1])
+        return points
+    
     def process_image(self, image, draw=True):
         """
         处理图像，检测手部并可选择绘制标记
@@ -77,6 +391,11 @@ class HandDetector:
         
         return image, has_hand
     
+    def reset(self):
+        """清除跟踪状态，便于检测器在不同连接之间复用"""
+        self.hands.reset()
+        self._geometry = None
+    
     def __del__(self):
         """释放资源"""
         self.hands.close() 
\ No newline at end of file
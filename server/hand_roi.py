@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+手部检测区域学习模块
+固定机位下手只会从画面的固定区域进入，按连接累计手部出现位置的热力图，
+检测时只把该区域（加边距）送入 MediaPipe，并定期做全画面检测
+"""
+import os
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+# 是否启用检测区域裁剪
+HAND_ROI = os.getenv("HAND_ROI", "1") == "1"
+# 每隔多少次检测做一次全画面检测（1 表示每次都做全画面检测）
+ROI_FULL_FRAME_INTERVAL = int(os.getenv("ROI_FULL_FRAME_INTERVAL", "10"))
+# 区域四周额外保留的边距（占画面宽/高的比例）
+ROI_MARGIN = float(os.getenv("ROI_MARGIN", "0.1"))
+# 至少观测到多少次手之后才开始裁剪
+ROI_MIN_OBSERVATIONS = int(os.getenv("ROI_MIN_OBSERVATIONS", "5"))
+
+# 热力图网格 (宽, 高)
+_GRID_SIZE = (32, 24)
+# 每次观测前的衰减系数，机位调整后区域会逐渐跟着移动
+_DECAY = 0.995
+# 热度不低于最大值该比例的网格计入区域
+_HEAT_RATIO = 0.05
+# 区域超过画面该比例时不再裁剪
+_MAX_AREA_RATIO = 0.8
+
+# 区域 (x0, y0, x1, y1)，像素坐标
+Region = Tuple[int, int, int, int]
+
+
+class RoiLearner:
+    """
+    按连接学习手部出现区域
+    """
+    def __init__(self,
+                 full_frame_interval: int = ROI_FULL_FRAME_INTERVAL,
+                 margin: float = ROI_MARGIN,
+                 min_observations: int = ROI_MIN_OBSERVATIONS):
+        # 小于 1 时按 1 处理，即每次都做全画面检测
+        self.full_frame_interval = max(1, full_frame_interval)
+        self.margin = margin
+        self.min_observations = min_observations
+        self.heatmap = np.zeros((_GRID_SIZE[1], _GRID_SIZE[0]), np.float32)
+        self.observations = 0
+        self._runs = 0
+        # 归一化区域 (x0, y0, x1, y1)，None 表示全画面
+        self._region: Optional[Tuple[float, float, float, float]] = None
+
+    def observe(self, landmarks, frame_shape):
+        """
+        记录一次检测到的手部位置
+
+        参数:
+            landmarks: 全画面像素坐标的关键点 (N, 2)
+            frame_shape: 检测图像的形状
+        """
+        height, width = frame_shape[:2]
+        grid_w, grid_h = _GRID_SIZE
+        x, y, w, h = cv2.boundingRect(landmarks.astype(np.int32))
+        gx0 = max(0, int(x / width * grid_w))
+        gy0 = max(0, int(y / height * grid_h))
+        gx1 = min(grid_w, int(np.ceil((x + w) / width * grid_w)) + 1)
+        gy1 = min(grid_h, int(np.ceil((y + h) / height * grid_h)) + 1)
+
+        self.heatmap *= _DECAY
+        self.heatmap[gy0:gy1, gx0:gx1] += 1.0
+        self.observations += 1
+        self._update_region()
+
+    def _update_region(self):
+        if self.observations < self.min_observations:
+            self._region = None
+            return
+
+        rows, cols = np.nonzero(self.heatmap >= self.heatmap.max() * _HEAT_RATIO)
+        grid_w, grid_h = _GRID_SIZE
+        x0 = max(0.0, cols.min() / grid_w - self.margin)
+        y0 = max(0.0, rows.min() / grid_h - self.margin)
+        x1 = min(1.0, (cols.max() + 1) / grid_w + self.margin)
+        y1 = min(1.0, (rows.max() + 1) / grid_h + self.margin)
+        if (x1 - x0) * (y1 - y0) > _MAX_AREA_RATIO:
+            self._region = None
+        else:
+            self._region = (x0, y0, x1, y1)
+
+    def region_for(self, frame_shape, motion_mask=None) -> Optional[Region]:
+        """
+        返回本次检测使用的区域
+
+        参数:
+            frame_shape: 检测图像的形状
+            motion_mask: 缩略图尺寸的变化像素掩码，区域外有变化时改用全画面
+
+        返回:
+            像素区域，None 表示本次做全画面检测
+        """
+        self._runs += 1
+        if self._region is None or self._runs % self.full_frame_interval == 0:
+            return None
+
+        x0, y0, x1, y1 = self._region
+        if motion_mask is not None:
+            mask_h, mask_w = motion_mask.shape
+            inside = np.zeros_like(motion_mask)
+            inside[int(y0 * mask_h):int(np.ceil(y1 * mask_h)), int(x0 * mask_w):int(np.ceil(x1 * mask_w))] = True
+            if np.any(motion_mask & ~inside):
+                return None
+
+        height, width = frame_shape[:2]
+        return (int(x0 * width), int(y0 * height), int(np.ceil(x1 * width)), int(np.ceil(y1 * height)))
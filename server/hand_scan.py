@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+截图手部残留扫描
+在提取内容之前，用静态图片模式的 HandDetector 检查 shots 目录中的每张截图，
+找出画面里仍有手的页面以便重拍。检测在多进程池中并行执行，
+结果按文件内容哈希缓存在截图元数据中，未变化的截图不会重复检测。
+
+命令行用法:
+    python hand_scan.py [--workers N] [--rescan]
+"""
+import os
+import sys
+import time
+import hashlib
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from image_header import read_image_header
+from shot_storage import SHOTS_DIR, read_shot_metadata, update_shot_metadata
+
+logger = logging.getLogger(__name__)
+
+# 扫描工作进程数，0 表示与 CPU 核数一致
+HAND_SCAN_WORKERS = int(os.getenv("HAND_SCAN_WORKERS", "0")) or (os.cpu_count() or 1)
+# 判定为有手的最小检测置信度
+HAND_SCAN_CONFIDENCE = float(os.getenv("HAND_SCAN_CONFIDENCE", "0.5"))
+
+# 参与扫描的图片扩展名（视频不扫描）
+_SCAN_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+# 检测图像长边的目标像素数，截图按该尺寸缩小解码
+_SCAN_SIZE = 640
+_REDUCED_COLOR_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+# 检测参数变化后旧的缓存结果作废
+_CACHE_KEY = f"static-c1-{HAND_SCAN_CONFIDENCE}"
+
+# 工作进程内的检测器（每个进程创建一次）
+_detector = None
+
+
+def _init_worker(confidence: float):
+    global _detector
+    from hand_detection import HandDetector
+    _detector = HandDetector(max_num_hands=2,
+                             min_detection_confidence=confidence,
+                             model_complexity=1,
+                             static_image_mode=True)
+
+
+def _decode_for_scan(data) -> Optional[np.ndarray]:
+    """按检测尺寸缩小解码为 BGR 图像"""
+    flag = cv2.IMREAD_COLOR
+    header = read_image_header(data)
+    if header is not None:
+        long_edge = max(header.width, header.height)
+        for factor, reduced_flag in _REDUCED_COLOR_FLAGS:
+            if long_edge // factor >= _SCAN_SIZE:
+                flag = reduced_flag
+                break
+    return cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+
+
+def _scan_file(path: str) -> dict:
+    """
+    工作进程：检测一张截图
+
+    返回:
+        {"hand": 是否有手, "bbox": 手部外接框（归一化坐标 x0, y0, x1, y1）或 None}；
+        无法读取或解码时 "error" 为错误说明
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        return {"hand": False, "bbox": None, "error": str(e)}
+    image = _decode_for_scan(data)
+    if image is None:
+        return {"hand": False, "bbox": None, "error": "图像解码失败"}
+
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    points = _detector.detect_landmarks(rgb)
+    if points is None:
+        return {"hand": False, "bbox": None}
+    height, width = image.shape[:2]
+    x0, y0 = points.min(axis=0)
+    x1, y1 = points.max(axis=0)
+    bbox = [round(float(x0) / width, 3), round(float(y0) / height, 3),
+            round(float(x1) / width, 3), round(float(y1) / height, 3)]
+    return {"hand": True, "bbox": bbox}
+
+
+def _file_hash(path) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def scan_shots(files: List[str], workers: int = HAND_SCAN_WORKERS, rescan: bool = False) -> dict:
+    """
+    扫描截图中残留的手（同步，在线程池或命令行中调用）
+
+    参数:
+        files: 按页码顺序排列的文件名（即 get_sorted_images 的结果）
+        workers: 工作进程数
+        rescan: 忽略缓存，全部重新检测
+
+    返回:
+        {"total": 扫描的图片数, "detected": 本次实际检测的图片数, "cached": 命中缓存数,
+         "elapsed": 耗时（秒）, "flagged": [{"page", "filename", "bbox"}], "errors": [...]}
+    """
+    started = time.monotonic()
+    pages = [(page, name) for page, name in enumerate(files, start=1)
+             if os.path.splitext(name)[1].lower() in _SCAN_EXTENSIONS]
+
+    results = {}
+    pending = []
+    for page, name in pages:
+        digest = _file_hash(SHOTS_DIR / name)
+        if digest is None:
+            continue
+        cached = read_shot_metadata(name).get("hand_scan")
+        if (not rescan and cached and cached.get("sha1") == digest
+                and cached.get("key") == _CACHE_KEY):
+            results[name] = cached
+        else:
+            pending.append((name, digest))
+
+    if pending:
+        workers = max(1, min(workers, len(pending)))
+        chunksize = max(1, len(pending) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker,
+                                 initargs=(HAND_SCAN_CONFIDENCE,)) as pool:
+            paths = [str(SHOTS_DIR / name) for name, _ in pending]
+            for (name, digest), result in zip(pending, pool.map(_scan_file, paths, chunksize=chunksize)):
+                result = {**result, "sha1": digest, "key": _CACHE_KEY}
+                results[name] = result
+                update_shot_metadata(name, {"hand_scan": result})
+
+    flagged, errors = [], []
+    for page, name in pages:
+        result = results.get(name)
+        if result is None:
+            continue
+        if "error" in result:
+            errors.append({"page": page, "filename": name, "error": result["error"]})
+        elif result["hand"]:
+            flagged.append({"page": page, "filename": name, "bbox": result["bbox"]})
+
+    elapsed = time.monotonic() - started
+    logger.info(f"手部残留扫描：共 {len(results)} 张，检测 {len(pending)} 张，"
+                f"发现 {len(flagged)} 张有手，耗时 {elapsed:.2f}s")
+    return {
+        "total": len(results),
+        "detected": len(pending),
+        "cached": len(results) - len(pending),
+        "elapsed": round(elapsed, 3),
+        "flagged": flagged,
+        "errors": errors,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="扫描 shots 目录中仍有手的截图")
+    parser.add_argument("--workers", type=int, default=HAND_SCAN_WORKERS, help="工作进程数")
+    parser.add_argument("--rescan", action="store_true", help="忽略缓存，全部重新检测")
+    args = parser.parse_args(argv)
+
+    from image_processing import get_sorted_images
+    report = scan_shots(get_sorted_images(), workers=args.workers, rescan=args.rescan)
+
+    print(f"共 {report['total']} 张截图（检测 {report['detected']} 张，缓存 {report['cached']} 张），"
+          f"耗时 {report['elapsed']:.2f}s")
+    for item in report["errors"]:
+        print(f"第{item['page']}页 {item['filename']}: 无法检测（{item['error']}）")
+    if not report["flagged"]:
+        print("没有发现残留的手")
+        return 0
+    print(f"以下 {len(report['flagged'])} 页需要重拍：")
+    for item in report["flagged"]:
+        print(f"第{item['page']}页 {item['filename']}")
+    return 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
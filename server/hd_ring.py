@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+高清帧环形缓冲区
+帧协议前端在手出现后按较低帧率持续发送高清帧，服务器为每个连接保留最近几帧；
+截图时直接从缓冲区选取手离开之后拍摄的帧，无需再向前端请求
+"""
+import os
+import asyncio
+from collections import deque
+from typing import List, NamedTuple
+
+# 每个连接缓存的高清帧数量，0 表示关闭高清帧推流（每次截图都向前端请求）
+HD_RING_SIZE = int(os.getenv("HD_RING_SIZE", "4"))
+# 手在画面中或等待截图时前端推送高清帧的帧率
+HD_STREAM_FPS = float(os.getenv("HD_STREAM_FPS", "2"))
+# 截图时缓冲区中还没有合适的帧，最多等待多少秒再改为向前端请求
+HD_RING_WAIT = float(os.getenv("HD_RING_WAIT", "1.0"))
+# 向前端请求高清截图后最多等待多少秒，超时改用缓存的高清帧或最近的检测帧
+HD_REQUEST_TIMEOUT = float(os.getenv("HD_REQUEST_TIMEOUT", "3.0"))
+
+
+class HdFrame(NamedTuple):
+    # 客户端采集时间（毫秒）
+    timestamp: float
+    data: bytes
+
+
+class HdFrameRing:
+    """
+    单个连接的高清帧缓冲区，只保留最近 size 帧
+    """
+    def __init__(self, size: int = HD_RING_SIZE):
+        self._frames = deque(maxlen=max(1, size))
+        self._arrived = asyncio.Event()
+
+    def push(self, timestamp: float, data: bytes):
+        self._frames.append(HdFrame(timestamp, data))
+        self._arrived.set()
+
+    def frames_after(self, timestamp: float) -> List[HdFrame]:
+        """返回采集时间不早于 timestamp 的缓存帧（按时间先后）"""
+        return [frame for frame in self._frames if frame.timestamp >= timestamp]
+
+    async def wait_frames_after(self, timestamp: float, timeout: float = HD_RING_WAIT) -> List[HdFrame]:
+        """
+        等待缓冲区中出现采集时间不早于 timestamp 的帧
+
+        返回:
+            符合条件的帧，超时仍没有时返回空列表
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            frames = self.frames_after(timestamp)
+            remaining = deadline - loop.time()
+            if frames or remaining <= 0:
+                return frames
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def clear(self):
+        self._frames.clear()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+图像头解析模块
+只读取文件头即可得到图像格式和尺寸，无需完整解码
+"""
+import struct
+from typing import NamedTuple, Optional
+
+
+class ImageHeader(NamedTuple):
+    format: str  # 'jpeg' / 'png' / 'webp'
+    width: int
+    height: int
+
+
+# 各格式对应的扩展名
+FORMAT_EXTENSIONS = {
+    "jpeg": ".jpg",
+    "png": ".png",
+    "webp": ".webp",
+}
+
+# JPEG 中携带图像尺寸的 SOF 段标记
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _parse_jpeg(data) -> Optional[ImageHeader]:
+    pos = 2
+    length = len(data)
+    while pos + 4 <= length:
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        # 填充字节
+        if marker == 0xFF:
+            pos += 1
+            continue
+        # 无长度字段的标记
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        segment_length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        if marker in _JPEG_SOF_MARKERS:
+            if pos + 9 > length:
+                return None
+            height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+            if width == 0 or height == 0:
+                return None
+            return ImageHeader("jpeg", width, height)
+        pos += 2 + segment_length
+    return None
+
+
+def _parse_png(data) -> Optional[ImageHeader]:
+    if len(data) < 24 or data[12:16] != b"IHDR":
+        return None
+    width, height = struct.unpack(">II", data[16:24])
+    if width == 0 or height == 0:
+        return None
+    return ImageHeader("png", width, height)
+
+
+def _parse_webp(data) -> Optional[ImageHeader]:
+    if len(data) < 30:
+        return None
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[26:30])
+        return ImageHeader("webp", width & 0x3FFF, height & 0x3FFF)
+    if chunk == b"VP8L":
+        bits = struct.unpack("<I", data[21:25])[0]
+        return ImageHeader("webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+    if chunk == b"VP8X":
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+        return ImageHeader("webp", width, height)
+    return None
+
+
+def read_image_header(data) -> Optional[ImageHeader]:
+    """
+    解析图像文件头
+
+    参数:
+        data: 图像字节（bytes / memoryview），只需包含文件头部分
+
+    返回:
+        ImageHeader，无法识别或头部损坏时返回 None
+    """
+    head = bytes(data[:2])
+    if head == b"\xff\xd8":
+        return _parse_jpeg(data)
+    if bytes(data[:8]) == b"\x89PNG\r\n\x1a\n":
+        return _parse_png(data)
+    if bytes(data[:4]) == b"RIFF" and bytes(data[8:12]) == b"WEBP":
+        return _parse_webp(data)
+    return None
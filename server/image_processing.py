@@ -3,106 +3,445 @@
 图像处理模块
 """
 import os
-import time
+import json
+import logging
+import base64
+import asyncio
+import functools
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, NamedTuple, Optional
 
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, Response
 from PIL import Image
 import traceback
 
+from shot_storage import (remove_shot_sidecars, write_file_atomic, write_shot_metadata, write_shot_original,
+                          reserve_shot_path, try_reserve_shot_path, release_shot_path)
+from shot_hash import shot_hashes, DUPLICATE_POLICY
+from shot_pipeline import prepare_shot, png_backlog, migrate_png_shot, SHOT_CODEC
+from hand_scan import scan_shots, HAND_SCAN_WORKERS
+from video_ingest import ingest_video, VIDEO_INGEST
+from shot_index import shot_index
+from thumbnails import thumbnail_cache, thumbnail_url
+from upload_stream import (StagedUpload, UploadTooLarge, FileTransaction, stage_upload, commit_staged,
+                           discard_staged)
+
 # 路由器
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # 截图目录
 SHOTS_DIR = Path(__file__).parent / "shots"
 SHOTS_DIR.mkdir(exist_ok=True)
 
 # 允许的文件类型
-ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.mp4'}
+ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.mp4'}
+
+# 临时目录
+TEMP_DIR = Path(__file__).parent / "temp"
+# 图片大小上限（MB）
+MAX_IMAGE_SIZE = 5
+# 视频大小上限（MB）
+MAX_VIDEO_SIZE = 200
+# 文字提取结果缓存（process_images.py 写入）
+PAGES_CACHE_FILE = TEMP_DIR / "pages_cache.json"
+
+# 分页列表可选字段
+LIST_FIELDS = {'page', 'size', 'width', 'height', 'captured_at', 'hash', 'thumbnail', 'status'}
+# 分页列表每页最多条数
+LIST_MAX_LIMIT = 500
+# 图片列表版本的响应头
+VERSION_HEADER = "X-Images-Version"
+# 按页码修改图片的操作（删除、替换、移动、插入、批量）串行提交，页码在提交期间不变；
+# 锁在首次使用时于当前事件循环中创建（Python 3.9 的 asyncio.Lock 在创建时绑定事件循环，
+# 导入模块时 uvicorn 的事件循环尚未创建），见 edit_lock()
+_edit_lock: Optional[asyncio.Lock] = None
+_edit_lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# 已提取文字的文件 (缓存文件修改时间, {文件名})
+_extracted_cache = (None, set())
+
+def edit_lock() -> asyncio.Lock:
+    """按页码修改图片的操作共用的锁（须在事件循环中调用）"""
+    global _edit_lock, _edit_lock_loop
+    loop = asyncio.get_running_loop()
+    if _edit_lock is None or _edit_lock_loop is not loop:
+        _edit_lock = asyncio.Lock()
+        _edit_lock_loop = loop
+    return _edit_lock
+
+def get_extracted_names():
+    """
+    返回已提取文字的截图文件名及提取时间，缓存文件未变化时不重复读取
+
+    返回:
+        (提取结果的修改时间戳，没有时为 None, 文件名集合)
+    """
+    global _extracted_cache
+    try:
+        mtime = PAGES_CACHE_FILE.stat().st_mtime
+    except OSError:
+        return None, set()
+    if _extracted_cache[0] != mtime:
+        try:
+            with open(PAGES_CACHE_FILE, "r", encoding="utf-8") as f:
+                pages = json.load(f)
+            names = {os.path.basename(page.get("path", "")) for page in pages}
+        except (OSError, ValueError):
+            names = set()
+        _extracted_cache = (mtime, names)
+    return _extracted_cache
+
+def _encode_cursor(position: float, name: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([position, name]).encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position, name = json.loads(base64.urlsafe_b64decode(padded))
+        return float(position), str(name)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的游标")
+
+def _captured_at(info) -> float:
+    """截图时间：文件名中的毫秒时间戳，无法解析时使用文件修改时间"""
+    prefix = info.name.split("_", 1)[0]
+    if len(prefix) == 13 and prefix.isdigit():
+        return int(prefix) / 1000
+    return info.mtime_ns / 1e9
 
 def get_sorted_images():
     """
-    获取排序后的图片列表
+    获取按页码排序的图片列表，来自内存中的截图索引
+    顺序由页面顺序清单决定；不在清单中的新文件按时间戳排序，最新的在前
+    """
+    return list(shot_index.names())
+
+def max_upload_bytes(file_ext: str) -> int:
+    """上传文件的大小上限（字节）：图片5MB，视频200MB"""
+    return (MAX_VIDEO_SIZE if file_ext == '.mp4' else MAX_IMAGE_SIZE) * 1024 * 1024
+
+class ReceivedUpload(NamedTuple):
+    # 暂存文件，内容已是要保存的内容（规整、转码后）
+    staged: StagedUpload
+    ext: str
+    original: Optional[bytes]
+    metadata: dict
+    duplicate: Optional[str]
+
+async def receive_upload(file: UploadFile, file_ext: str, ignore: Optional[str] = None) -> ReceivedUpload:
+    """
+    分块接收上传文件，并做入库前的页面规整、转码和近似重复检查（视频原样保存）
+
+    处理后的内容写回暂存文件，入库时只需重命名。
+    调用方负责用 discard_staged 清理暂存文件（提交后也可调用）
+
+    参数:
+        ignore: 查重时跳过的文件名（替换时被替换的图片）
+
+    异常:
+        UploadTooLarge: 超过大小上限
+        ValueError: 图片无法识别或解码
     """
+    staged = await stage_upload(file, max_upload_bytes(file_ext), file_ext)
+    if file_ext == '.mp4':
+        return ReceivedUpload(staged, file_ext, None, {"upload_sha1": staged.sha1}, None)
+
+    loop = asyncio.get_running_loop()
     try:
-        files = []
-        for file_path in SHOTS_DIR.glob("*"):
-            if file_path.is_file() and file_path.suffix.lower() in ALLOWED_EXTENSIONS:
-                files.append(file_path.name)
-                
-        # 按时间戳排序（最新的在前）
-        files.sort(reverse=True)
-        return files
-    except Exception as e:
-        print(f"获取排序图片出错: {str(e)}")
-        return []
+        content = await loop.run_in_executor(None, staged.path.read_bytes)
+        prepared = await loop.run_in_executor(
+            None, functools.partial(prepare_shot, content, ignore=ignore))
+        # 没有转码时要保存的就是收到的内容
+        if "codec" in prepared.metadata:
+            await loop.run_in_executor(None, write_file_atomic, staged.path, prepared.data)
+    except BaseException:
+        discard_staged(staged)
+        raise
+    metadata = {**prepared.metadata, "upload_sha1": staged.sha1}
+    return ReceivedUpload(staged, prepared.ext, prepared.original, metadata, prepared.duplicate)
+
+def unique_upload_name(original_name: str, save_ext: str) -> str:
+    """
+    生成唯一的文件名（页码顺序由页面顺序清单决定，文件名只需唯一）
+
+    文件名以空文件原子占位，并发上传同名文件时不会互相覆盖；
+    调用方随后用重命名写入，失败时用 release_shot_path 删除占位文件
+    """
+    original_filename_stem = Path(original_name).stem
+    safe_original_part = "".join(c for c in original_filename_stem if c.isalnum() or c in ('_', '-'))[:50] # 保留部分安全字符
+    path = reserve_shot_path(lambda timestamp_ms: f"{timestamp_ms}_{safe_original_part}{save_ext}")
+    return path.name
+
+def replacement_name(filename: str, save_ext: str) -> str:
+    """
+    替换后的文件名：文件名主体不变，转码后扩展名可能变化
+
+    与原文件名不同时和 unique_upload_name 一样以空文件占位
+    """
+    new_filename = Path(filename).stem + save_ext
+    if new_filename == filename or try_reserve_shot_path(SHOTS_DIR / new_filename):
+        return new_filename
+    return unique_upload_name(filename, save_ext)
+
+async def commit_upload(received: ReceivedUpload, original_name: str, after_page: Optional[int] = None) -> str:
+    """
+    把接收好的文件原子写入 shots 目录并加入索引
+
+    返回:
+        保存的文件名
+    """
+    loop = asyncio.get_running_loop()
+    new_filename = await loop.run_in_executor(None, unique_upload_name, original_name, received.ext)
+    try:
+        await loop.run_in_executor(None, write_upload_sidecars, new_filename, received.metadata, received.original)
+        await commit_staged(received.staged, SHOTS_DIR / new_filename)
+    except BaseException:
+        release_shot_path(SHOTS_DIR / new_filename)
+        raise
+    await loop.run_in_executor(None, shot_index.add, new_filename, after_page)
+    return new_filename
+
+async def ingest_staged_video(staged: StagedUpload, filename: str) -> Dict[str, Any]:
+    """
+    从暂存的视频中提取翻页截图（视频本身不保存）
+
+    返回:
+        该文件的上传结果
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        report = await loop.run_in_executor(None, ingest_video, staged.path, filename)
+    except ValueError as e:
+        return {
+            "filename": filename,
+            "status": "error",
+            "message": f"视频无效: {str(e)}"
+        }
+    return {
+        "filename": filename,
+        "status": "success",
+        "type": "video",
+        "pages": report["pages"],
+        "duplicates": report["duplicates"],
+        "sha1": staged.sha1,
+        "message": f"从视频中提取了 {len(report['pages'])} 页"
+    }
+
+def remove_shot(filename: str):
+    """删除截图及其元数据、哈希、索引和缩略图（同步，在线程池中调用）"""
+    (SHOTS_DIR / filename).unlink(missing_ok=True)
+    remove_shot_sidecars(filename)
+    shot_hashes.remove(filename)
+    shot_index.remove(filename)
+    thumbnail_cache.invalidate(filename)
+
+async def migrate_png_backlog() -> int:
+    """
+    把已有的 PNG 截图逐张转为 SHOT_CODEC 格式（启动后的后台任务）
+
+    每张图片在编辑锁内迁移，与删除、替换、移动等按页码的修改互斥；
+    等锁期间图片已被删除或替换时跳过。
+
+    返回:
+        迁移的图片数量
+    """
+    loop = asyncio.get_running_loop()
+    migrated = 0
+    saved_bytes = 0
+    for path in await loop.run_in_executor(None, png_backlog):
+        async with edit_lock():
+            saved = await loop.run_in_executor(None, migrate_png_shot, path)
+        if saved is None:
+            continue
+        thumbnail_cache.invalidate(path.name)
+        migrated += 1
+        saved_bytes += saved
+    if migrated:
+        logger.info(f"已将 {migrated} 张 PNG 截图转为 {SHOT_CODEC}，节省 {saved_bytes / 1024 / 1024:.1f} MB")
+    return migrated
+
+def remove_all_shots() -> int:
+    """删除全部截图，返回删除的数量"""
+    names = get_sorted_images()
+    for filename in names:
+        remove_shot(filename)
+    return len(names)
+
+def write_upload_sidecars(filename: str, metadata: dict, original: Optional[bytes]):
+    """写入上传图片的原图和元数据，并更新哈希索引"""
+    if original is not None:
+        write_shot_original(filename, original)
+        metadata = {**metadata, "original": True}
+    if metadata:
+        write_shot_metadata(filename, metadata)
+    if "dhash" in metadata:
+        shot_hashes.add(filename, int(metadata["dhash"], 16))
+
+async def _receive_for_upload(file: UploadFile):
+    """接收一个上传文件，失败时返回该文件的上传结果"""
+    file_ext = Path(file.filename).suffix.lower()
+    if file_ext not in ALLOWED_EXTENSIONS:
+        return {
+            "filename": file.filename,
+            "status": "error",
+            "message": f"不支持的文件类型: {file_ext}"
+        }
+    try:
+        return await receive_upload(file, file_ext)
+    except UploadTooLarge as e:
+        return {
+            "filename": file.filename,
+            "status": "error",
+            "message": str(e)
+        }
+    except ValueError as e:
+        return {
+            "filename": file.filename,
+            "status": "error",
+            "message": f"图片无效: {str(e)}"
+        }
 
 @router.post("/upload")
 async def upload_files(files: List[UploadFile] = File(...)):
     """
     上传图片或视频
+
+    各文件并发接收和处理，再按上传顺序依次入库（最后一个文件为第 1 页）
     """
+    received_list = await asyncio.gather(*(_receive_for_upload(file) for file in files),
+                                         return_exceptions=True)
     try:
+        for received in received_list:
+            if isinstance(received, BaseException):
+                raise received
+
         results = []
-        for file in files:
-            # 文件名
-            file_ext = Path(file.filename).suffix.lower()
-            if file_ext not in ALLOWED_EXTENSIONS:
-                results.append({
-                    "filename": file.filename,
-                    "status": "error",
-                    "message": f"不支持的文件类型: {file_ext}"
-                })
+        for file, received in zip(files, received_list):
+            if isinstance(received, dict):
+                results.append(received)
                 continue
-                
-            # 检查文件大小
-            file_content = await file.read()
-            file_size = len(file_content) / (1024 * 1024)  # MB
-            
-            max_size = 5 if file_ext != '.mp4' else 200  # 图片5MB，视频200MB
-            
-            if file_size > max_size:
+
+            # 视频提取翻页截图
+            if received.ext == '.mp4' and VIDEO_INGEST:
+                results.append(await ingest_staged_video(received.staged, file.filename))
+                continue
+
+            # 同一批中先入库的图片也参与查重
+            duplicate = received.duplicate
+            if duplicate is None and "dhash" in received.metadata:
+                duplicate = shot_hashes.find_duplicate(int(received.metadata["dhash"], 16))
+            if duplicate is not None and DUPLICATE_POLICY == "reject":
                 results.append({
                     "filename": file.filename,
-                    "status": "error",
-                    "message": f"文件太大: {file_size:.2f}MB，最大允许{max_size}MB"
+                    "status": "duplicate",
+                    "message": f"与已有图片重复: {duplicate}",
+                    "duplicate_of": duplicate
                 })
                 continue
-            
-            # 生成唯一文件名
-            timestamp = int(time.time())
-            new_filename = f"{timestamp}_{file.filename}"
-            file_path = SHOTS_DIR / new_filename
-            
-            # 写入文件
-            with open(file_path, "wb") as f:
-                f.write(file_content)
-                
+
+            new_filename = await commit_upload(received, file.filename)
+
             # 返回结果
             results.append({
                 "filename": file.filename,
                 "saved_as": new_filename,
                 "status": "success",
-                "type": "video" if file_ext == '.mp4' else "image"
+                "type": "video" if received.ext == '.mp4' else "image",
+                "sha1": received.staged.sha1,
+                "duplicate_of": duplicate
             })
-            
+
         return {"results": results}
-        
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"上传文件出错: {str(e)}")
+    finally:
+        for received in received_list:
+            if isinstance(received, ReceivedUpload):
+                discard_staged(received.staged)
 
 @router.get("/images")
-async def get_images():
+async def get_images(response: Response):
     """
-    获取所有截图
+    获取所有截图（响应头带列表版本，供批量操作使用）
     """
     try:
+        response.headers[VERSION_HEADER] = shot_index.token
         return get_sorted_images()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取图片列表失败: {str(e)}")
 
+@router.get("/images/hand-scan")
+async def hand_scan(rescan: bool = False):
+    """
+    扫描截图中残留的手，返回需要重拍的页码
+    """
+    try:
+        files = get_sorted_images()
+        return await asyncio.get_running_loop().run_in_executor(None, scan_shots, files, HAND_SCAN_WORKERS, rescan)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"手部残留扫描失败: {str(e)}")
+
+@router.get("/images/list")
+async def list_images(cursor: Optional[str] = None, limit: int = 50,
+                      fields: str = "page", since: Optional[str] = None):
+    """
+    分页获取截图列表（来自截图索引，每页耗时与总数无关）
+
+    参数:
+        cursor: 上一页返回的 next_cursor，为空时从第 1 页开始
+        limit: 每页条数
+        fields: 逗号分隔的可选字段：page, size, width, height, captured_at, hash, thumbnail, status
+        since: 上次返回的 token，与当前一致时返回空列表
+    """
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - LIST_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知的字段: {', '.join(sorted(unknown))}")
+    limit = max(1, min(limit, LIST_MAX_LIMIT))
+
+    token = shot_index.token
+    if since is not None and since == token:
+        return {"items": [], "next_cursor": None, "total": len(shot_index), "token": token, "unchanged": True}
+
+    after = _decode_cursor(cursor) if cursor else None
+    entries = shot_index.entries_after(after, limit + 1)
+    more = len(entries) > limit
+    entries = entries[:limit]
+    extracted_at, extracted = get_extracted_names() if "status" in requested else (None, set())
+
+    items = []
+    for page, position, info in entries:
+        item = {"name": info.name}
+        if "page" in requested:
+            item["page"] = page
+        if "size" in requested:
+            item["size"] = info.size
+        if "width" in requested:
+            item["width"] = info.width
+        if "height" in requested:
+            item["height"] = info.height
+        if "captured_at" in requested:
+            item["captured_at"] = _captured_at(info)
+        if "hash" in requested:
+            item["hash"] = info.dhash
+        if "thumbnail" in requested:
+            item["thumbnail"] = thumbnail_url(info.name)
+        if "status" in requested:
+            # 提取后又被替换的页面视为过期
+            if info.name not in extracted:
+                item["status"] = "pending"
+            elif info.mtime_ns / 1e9 > extracted_at:
+                item["status"] = "stale"
+            else:
+                item["status"] = "extracted"
+        items.append(item)
+
+    next_cursor = _encode_cursor(entries[-1][1], entries[-1][2].name) if more else None
+    return {"items": items, "next_cursor": next_cursor, "total": len(shot_index), "token": token, "unchanged": False}
+
 @router.delete("/images/{filename}")
 async def delete_image(filename: str):
     """
@@ -113,7 +452,8 @@ async def delete_image(filename: str):
         if not file_path.exists():
             raise HTTPException(status_code=404, detail=f"文件不存在: {filename}")
             
-        file_path.unlink()
+        async with edit_lock():
+            await asyncio.get_running_loop().run_in_executor(None, remove_shot, filename)
         return {"message": f"已删除文件: {filename}"}
     
     except HTTPException as e:
@@ -127,11 +467,8 @@ async def delete_all_images():
     删除所有截图
     """
     try:
-        count = 0
-        for file_path in SHOTS_DIR.glob("*"):
-            if file_path.is_file() and file_path.suffix.lower() in ALLOWED_EXTENSIONS:
-                file_path.unlink()
-                count += 1
+        async with edit_lock():
+            count = await asyncio.get_running_loop().run_in_executor(None, remove_all_shots)
                 
         return {"message": f"已删除 {count} 个文件"}
         
@@ -163,14 +500,13 @@ async def delete_image_by_page(page: int):
     按页码删除图片
     """
     try:
-        files = get_sorted_images()
-        if page < 1 or page > len(files):
-            raise HTTPException(status_code=404, detail='页码不存在')
-            
-        # 获取对应文件名并删除
-        filename = files[page-1]
-        file_path = SHOTS_DIR / filename
-        file_path.unlink()
+        async with edit_lock():
+            filename = shot_index.name_at(page)
+            if filename is None:
+                raise HTTPException(status_code=404, detail='页码不存在')
+
+            # 删除对应文件
+            await asyncio.get_running_loop().run_in_executor(None, remove_shot, filename)
         
         return {'message': f'已删除第{page}页图片: {filename}'}
     except HTTPException as e:
@@ -178,27 +514,78 @@ async def delete_image_by_page(page: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"删除图片失败: {str(e)}")
 
+def stage_replacement(transaction: FileTransaction, filename: str, received: ReceivedUpload) -> str:
+    """
+    在文件事务中用接收好的文件替换 filename
+
+    返回:
+        替换后的文件名（转码后扩展名可能变化）
+    """
+    new_filename = replacement_name(filename, received.ext)
+    if new_filename != filename:
+        transaction.reserved(SHOTS_DIR / new_filename)
+    transaction.put(received.staged.path, SHOTS_DIR / new_filename)
+    if new_filename != filename:
+        transaction.remove(SHOTS_DIR / filename)
+    return new_filename
+
+def finish_replacement(filename: str, new_filename: str, received: ReceivedUpload):
+    """替换的文件就位后更新元数据、哈希和缩略图（原截图的质量评分等元数据不再适用）"""
+    remove_shot_sidecars(filename)
+    shot_hashes.remove(filename)
+    thumbnail_cache.invalidate(filename)
+    write_upload_sidecars(new_filename, received.metadata, received.original)
+
+def commit_replacement(filename: str, received: ReceivedUpload) -> str:
+    """替换一张截图并更新索引（同步，在线程池中调用），返回替换后的文件名"""
+    transaction = FileTransaction()
+    try:
+        new_filename = stage_replacement(transaction, filename, received)
+    except BaseException:
+        transaction.rollback()
+        raise
+    transaction.finish()
+    finish_replacement(filename, new_filename, received)
+    if new_filename != filename:
+        shot_index.rename(filename, new_filename)
+    else:
+        shot_index.add(filename)
+    return new_filename
+
 @router.post('/images/replace/{page}')
 async def replace_image(page: int, file: UploadFile = File(...)):
     """
-    替换指定页码的图片
+    替换指定页码的图片（与上传相同，经过页面规整、转码和查重）
     """
     try:
-        files = get_sorted_images()
-        if page < 1 or page > len(files):
+        file_ext = Path(file.filename).suffix.lower()
+        if file_ext not in ALLOWED_EXTENSIONS:
+            raise HTTPException(status_code=400, detail=f"不支持的文件类型: {file_ext}")
+        filename = shot_index.name_at(page)
+        if filename is None:
             raise HTTPException(status_code=404, detail='页码不存在')
-            
-        # 获取对应文件路径
-        dest = SHOTS_DIR / files[page-1]
-        print(f"Replacing image at page {page}, file: {dest}") # 添加日志
+        print(f"Replacing image at page {page}, file: {filename}") # 添加日志
         
-        # 保存上传的文件
-        content = await file.read()
-        with open(dest, "wb") as f:
-            f.write(content)
+        # 分块接收，页面规整、转码和近似重复检查（不与被替换的图片比较）
+        try:
+            received = await receive_upload(file, file_ext, ignore=filename)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"图片无效: {str(e)}")
+        try:
+            if received.duplicate is not None and DUPLICATE_POLICY == "reject":
+                raise HTTPException(status_code=409, detail=f"与已有图片重复: {received.duplicate}")
+            async with edit_lock():
+                if shot_index.name_at(page) != filename:
+                    raise HTTPException(status_code=409, detail='图片列表已变化，请刷新后重试')
+                new_filename = await asyncio.get_running_loop().run_in_executor(
+                    None, commit_replacement, filename, received)
+        finally:
+            discard_staged(received.staged)
             
-        print(f"Successfully replaced {dest}") # 添加日志
-        return {'message': f'已替换第{page}页图片'}
+        print(f"Successfully replaced {filename} with {new_filename}") # 添加日志
+        return {'message': f'已替换第{page}页图片', 'filename': new_filename, 'duplicate_of': received.duplicate}
     except HTTPException as e:
         print(f"Error replacing image (HTTP): {e.detail}") # 添加日志
         raise e
@@ -206,6 +593,214 @@ async def replace_image(page: int, file: UploadFile = File(...)):
         print(f"Error replacing image (Exception): {str(e)}") # 添加日志
         raise HTTPException(status_code=500, detail=f"替换图片失败: {str(e)}")
 
+# 批量操作类型
+BATCH_OPERATIONS = {'delete', 'move', 'replace', 'insert'}
+
+class _BatchInsert(NamedTuple):
+    """批量操作中新插入的图片"""
+    received: ReceivedUpload
+    original_name: str
+
+def _batch_int(op: dict, key: str, index: int) -> int:
+    value = op.get(key)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise HTTPException(status_code=400, detail=f"第{index + 1}个操作缺少整数字段 {key}")
+    return value
+
+def plan_batch(operations: List[dict], snapshot: List[str], file_count: int):
+    """
+    检查批量操作并计算操作后的页码顺序（不修改任何文件）
+
+    页码都指调用方看到的快照中的页码，不受同一批中前面操作的影响；
+    move / insert 的 after 为 0 表示排到最前面。
+
+    返回:
+        (新的页码顺序，插入项为文件序号, 要删除的文件名, {被替换的文件名: 文件序号})
+
+    异常:
+        HTTPException(400): 操作无效
+    """
+    order: List[Any] = list(snapshot)
+    deletes, replaces, used_files = [], {}, set()
+
+    def snapshot_name(index: int, page: int) -> str:
+        if page < 1 or page > len(snapshot):
+            raise HTTPException(status_code=400, detail=f"第{index + 1}个操作的页码无效: {page}")
+        name = snapshot[page - 1]
+        if name not in order:
+            raise HTTPException(status_code=400, detail=f"第{index + 1}个操作的第{page}页已在本批中删除")
+        return name
+
+    def anchor_index(index: int, after: int) -> int:
+        return 0 if after == 0 else order.index(snapshot_name(index, after)) + 1
+
+    def take_file(index: int, op: dict) -> int:
+        file_index = _batch_int(op, 'file', index)
+        if file_index < 0 or file_index >= file_count or file_index in used_files:
+            raise HTTPException(status_code=400, detail=f"第{index + 1}个操作的文件序号无效: {file_index}")
+        used_files.add(file_index)
+        return file_index
+
+    for index, op in enumerate(operations):
+        kind = op.get('op') if isinstance(op, dict) else None
+        if kind not in BATCH_OPERATIONS:
+            raise HTTPException(status_code=400, detail=f"第{index + 1}个操作类型无效: {kind}")
+        if kind == 'delete':
+            name = snapshot_name(index, _batch_int(op, 'page', index))
+            order.remove(name)
+            replaces.pop(name, None)
+            deletes.append(name)
+        elif kind == 'move':
+            name = snapshot_name(index, _batch_int(op, 'page', index))
+            after = _batch_int(op, 'after', index)
+            if after != 0 and snapshot_name(index, after) == name:
+                raise HTTPException(status_code=400, detail=f"第{index + 1}个操作不能把页面移到自身之后")
+            order.remove(name)
+            order.insert(anchor_index(index, after), name)
+        elif kind == 'replace':
+            name = snapshot_name(index, _batch_int(op, 'page', index))
+            replaces[name] = take_file(index, op)
+        else:
+            position = anchor_index(index, _batch_int(op, 'after', index))
+            order.insert(position, take_file(index, op))
+    return order, deletes, replaces
+
+def _commit_batch(order: List[Any], deletes: List[str], replaces: Dict[str, ReceivedUpload],
+                  inserts: Dict[int, _BatchInsert]):
+    """
+    提交批量操作（同步，在线程池中调用，不占用截图索引的锁）
+
+    先用重命名完成全部文件修改，任何一步失败都撤销已完成的部分，索引和清单保持不变；
+    文件全部就位后再更新元数据、哈希和缩略图，最后一次性更新索引和清单。
+
+    返回:
+        (新的页码顺序, 新插入的文件名)
+    """
+    transaction = FileTransaction()
+    renamed: Dict[str, str] = {}
+    inserted: Dict[int, str] = {}
+    try:
+        for name, received in replaces.items():
+            renamed[name] = stage_replacement(transaction, name, received)
+        for name in deletes:
+            transaction.remove(SHOTS_DIR / name)
+        for file_index, insert in inserts.items():
+            new_filename = unique_upload_name(insert.original_name, insert.received.ext)
+            transaction.put(insert.received.staged.path, transaction.reserved(SHOTS_DIR / new_filename))
+            inserted[file_index] = new_filename
+    except BaseException:
+        transaction.rollback()
+        raise
+    transaction.finish()
+
+    for name, received in replaces.items():
+        finish_replacement(name, renamed[name], received)
+    for name in deletes:
+        remove_shot_sidecars(name)
+        shot_hashes.remove(name)
+        thumbnail_cache.invalidate(name)
+    for file_index, insert in inserts.items():
+        write_upload_sidecars(inserted[file_index], insert.received.metadata, insert.received.original)
+
+    names = [renamed.get(item, item) if isinstance(item, str) else inserted[item] for item in order]
+    removed = deletes + [name for name, new_filename in renamed.items() if new_filename != name]
+    rewritten = list(renamed.values()) + list(inserted.values())
+    new_order = shot_index.apply_batch(names, removed, rewritten)
+    return new_order, [inserted[item] for item in order if not isinstance(item, str)]
+
+@router.post('/images/batch')
+async def batch_images(version: str = Form(...), operations: str = Form(...),
+                       files: List[UploadFile] = File([])):
+    """
+    在一次请求中执行多个图片管理操作，并返回新的页码顺序
+
+    version 为调用方看到的列表版本（GET /images 的 X-Images-Version 响应头，
+    或分页列表的 token），与当前不一致时返回 409，不做任何修改。
+    operations 为 JSON 数组，按顺序执行，页码都指该版本中的页码：
+        {"op": "delete", "page": 3}
+        {"op": "move", "page": 5, "after": 0}
+        {"op": "replace", "page": 2, "file": 0}
+        {"op": "insert", "after": 4, "file": 1}
+    file 为 files 中的文件序号。替换和插入的图片与上传一样经过规整、转码和查重。
+    文件修改要么全部完成，要么全部撤销；索引和清单只更新一次。
+    """
+    try:
+        operations = json.loads(operations)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="operations 不是有效的 JSON")
+    if not isinstance(operations, list):
+        raise HTTPException(status_code=400, detail="operations 应为数组")
+
+    snapshot = list(shot_index.names())
+    if shot_index.token != version:
+        raise HTTPException(status_code=409, detail='图片列表已变化，请刷新后重试',
+                            headers={VERSION_HEADER: shot_index.token})
+    order, deletes, replace_files = plan_batch(operations, snapshot, len(files))
+    insert_files = [item for item in order if not isinstance(item, str)]
+
+    # 并发接收替换和插入的文件
+    async def receive(file_index: int, ignore: Optional[str]):
+        file = files[file_index]
+        file_ext = Path(file.filename).suffix.lower()
+        if file_ext not in ALLOWED_EXTENSIONS:
+            raise HTTPException(status_code=400, detail=f"不支持的文件类型: {file_ext}")
+        try:
+            received = await receive_upload(file, file_ext, ignore=ignore)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=400, detail=f"{file.filename}: {str(e)}")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"{file.filename}: 图片无效: {str(e)}")
+        if received.duplicate is not None and DUPLICATE_POLICY == "reject":
+            discard_staged(received.staged)
+            raise HTTPException(status_code=409, detail=f"{file.filename}: 与已有图片重复: {received.duplicate}")
+        return received
+
+    tasks = [receive(file_index, name) for name, file_index in replace_files.items()]
+    tasks += [receive(file_index, None) for file_index in insert_files]
+    received_list = await asyncio.gather(*tasks, return_exceptions=True)
+    try:
+        for item in received_list:
+            if isinstance(item, BaseException):
+                raise item
+        replaces = dict(zip(replace_files, received_list[:len(replace_files)]))
+        inserts = {file_index: _BatchInsert(received, files[file_index].filename)
+                   for file_index, received in zip(insert_files, received_list[len(replace_files):])}
+
+        async with edit_lock():
+            # 接收文件期间列表可能已变化
+            if shot_index.token != version:
+                raise HTTPException(status_code=409, detail='图片列表已变化，请刷新后重试',
+                                    headers={VERSION_HEADER: shot_index.token})
+            names, inserted = await asyncio.get_running_loop().run_in_executor(
+                None, _commit_batch, order, deletes, replaces, inserts)
+
+        return {
+            'message': f'已执行 {len(operations)} 个操作',
+            'version': shot_index.token,
+            'images': names,
+            'inserted': inserted,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc() # 打印详细错误堆栈
+        raise HTTPException(status_code=500, detail=f"批量操作失败: {str(e)}")
+    finally:
+        for item in received_list:
+            if isinstance(item, ReceivedUpload):
+                discard_staged(item.staged)
+
+@router.post('/images/move/{page}')
+async def move_image(page: int, to: int):
+    """
+    把第 page 页移动到第 to 页（只改写页面顺序清单，不重命名文件）
+    """
+    async with edit_lock():
+        filename = await asyncio.get_running_loop().run_in_executor(None, shot_index.move, page, to)
+    if filename is None:
+        raise HTTPException(status_code=404, detail='页码不存在')
+    return {'message': f'已将第{page}页移动到第{shot_index.page_of(filename)}页', 'filename': filename}
+
 @router.post('/images/insert/{page}')
 async def insert_image(page: int, file: UploadFile = File(...)):
     """
@@ -219,67 +814,34 @@ async def insert_image(page: int, file: UploadFile = File(...)):
         if file_ext not in ALLOWED_EXTENSIONS:
             raise HTTPException(status_code=400, detail=f"不支持的文件类型: {file_ext}")
 
-        content = await file.read()
-        file_size = len(content) / (1024 * 1024) # MB
-        max_size = 5 if file_ext != '.mp4' else 200
-        if file_size > max_size:
-            raise HTTPException(status_code=400, detail=f"文件太大: {file_size:.2f}MB，最大允许{max_size}MB")
+        # 分块接收，页面规整、转码和近似重复检查
+        try:
+            received = await receive_upload(file, file_ext)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"图片无效: {str(e)}")
+        try:
+            duplicate = received.duplicate
+            if duplicate is not None and DUPLICATE_POLICY == "reject":
+                raise HTTPException(status_code=409, detail=f"与已有图片重复: {duplicate}")
 
-        files = get_sorted_images()
-        num_files = len(files)
-
-        # 验证页码
-        if page < 0 or page > num_files:
-             raise HTTPException(status_code=404, detail=f'无效的页码: {page}，当前共 {num_files} 张图片')
-
-        # -- 根据 page 计算目标时间戳 --
-        target_timestamp_ms = int(time.time() * 1000) # 默认是当前时间 (用于 page=0)
-
-        if num_files > 0:
-            if page == num_files: # 插入到最后 (Add button)
-                # 获取当前最后一张图片的时间戳 (它是列表第一个，因为是降序)
-                # 不对，get_sorted_images 是降序，最后一张是 files[num_files-1]
-                try:
-                    last_file_timestamp_str = files[num_files - 1].split('_')[0]
-                    last_file_timestamp_ms = int(last_file_timestamp_str)
-                    target_timestamp_ms = last_file_timestamp_ms - 1 # 比最后一张稍早
-                except (IndexError, ValueError):
-                    print(f"Warning: Could not parse timestamp from last file: {files[num_files - 1]}. Using current time minus offset.")
-                    target_timestamp_ms = int(time.time() * 1000) - 5000 # fallback: 5秒前
-
-            elif page > 0: # 在指定页码 N 之后插入 (Insert After button)
-                # 需要在 files[page-1] 之后插入
-                # 所以时间戳需要比 files[page-1] 的时间戳稍早
-                try:
-                    after_file_timestamp_str = files[page - 1].split('_')[0]
-                    after_file_timestamp_ms = int(after_file_timestamp_str)
-                    target_timestamp_ms = after_file_timestamp_ms - 1 # 比目标图片稍早
-                except (IndexError, ValueError):
-                     print(f"Warning: Could not parse timestamp from file at page {page}: {files[page - 1]}. Using current time.")
-                     target_timestamp_ms = int(time.time() * 1000) # fallback: 当前时间
-        # -- 时间戳计算结束 --
-
-        # 使用原始文件名的一部分，防止特殊字符问题
-        original_filename_stem = Path(file.filename).stem
-        original_filename_suffix = Path(file.filename).suffix
-        safe_original_part = "".join(c for c in original_filename_stem if c.isalnum() or c in ('_', '-'))[:50] # 保留部分安全字符
-        
-        # 确保时间戳是唯一的，如果计算出的时间戳已存在，稍微调整
-        while True:
-            new_filename = f"{target_timestamp_ms}_{safe_original_part}{original_filename_suffix}"
-            file_path = SHOTS_DIR / new_filename
-            if not file_path.exists():
-                break
-            target_timestamp_ms -= 1 # 如果冲突，时间戳再减1毫秒
-
-        print(f"Inserting image after page {page}. Target timestamp: {target_timestamp_ms}, New file: {file_path}")
-
-        # 写入文件
-        with open(file_path, "wb") as f:
-            f.write(content)
-
-        print(f"Successfully inserted {file_path}")
-        return {'message': f'已在第{page}页目标位置附近插入图片', 'new_filename': new_filename} # 修改消息提示
+            async with edit_lock():
+                num_files = len(shot_index)
+
+                # 验证页码
+                if page < 0 or page > num_files:
+                     raise HTTPException(status_code=404, detail=f'无效的页码: {page}，当前共 {num_files} 张图片')
+
+                print(f"Inserting image after page {page}.")
+
+                # 写入文件
+                new_filename = await commit_upload(received, file.filename, after_page=page)
+        finally:
+            discard_staged(received.staged)
+
+        print(f"Successfully inserted {new_filename}")
+        return {'message': f'已在第{page}页之后插入图片', 'new_filename': new_filename, 'duplicate_of': duplicate, 'sha1': received.staged.sha1}
 
     except HTTPException as e:
         print(f"Error inserting image (HTTP): {e.detail}") # 添加日志
@@ -6,14 +6,12 @@
 import os
 import time
 import uuid
+import asyncio
 import logging
 from pathlib import Path
 from typing import List, Dict, Any
 import json
 
-import cv2
-import numpy as np
-import mediapipe as mp
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, UploadFile, File, Form, Response
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
@@ -21,9 +19,6 @@ from fastapi.staticfiles import StaticFiles
 import subprocess
 import shutil
 
-# MediaPipe 手部检测
-mp_hands = mp.solutions.hands
-
 # 日志配置
 logging.basicConfig(
     level=logging.INFO,
@@ -56,9 +51,13 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 app.mount("/shots", StaticFiles(directory=SHOTS_DIR), name="shots")
 
 # 包含图片管理 API 路由
-from image_processing import router as image_router
+from image_processing import router as image_router, migrate_png_backlog
 app.include_router(image_router, prefix="/api")
 
+# 缩略图与预览图路由
+from thumbnails import router as thumbnail_router
+app.include_router(thumbnail_router, prefix="/api")
+
 # 导入设置API路由
 from settings_api import router as settings_router
 app.include_router(settings_router, prefix="/api")
@@ -69,28 +68,53 @@ if os.path.exists(os.path.join(os.path.dirname(__file__), "zhipu_api.py")):
     setup_zhipu_api(app)
     logger.info("智谱API路由已加载")
 
-# 创建手部检测器
-class HandDetector:
-    def __init__(self, 
-                 max_num_hands=1, 
-                 min_detection_confidence=0.5, 
-                 min_tracking_confidence=0.5):
-        self.hands = mp_hands.Hands(
-            max_num_hands=max_num_hands,
-            min_detection_confidence=min_detection_confidence,
-            min_tracking_confidence=min_tracking_confidence,
-            static_image_mode=False
-        )
-        
-    def detect(self, image):
-        # 处理图像
-        results = self.hands.process(image)
-        
-        # 检查是否有手部关键点
-        return bool(results.multi_hand_landmarks)
+# 检测执行器：每个连接独占一个 HandDetector，检测在线程池或检测进程中执行
+from detector_service import create_detector_pool
+from detector_tuning import select_profile
+from capture_trigger import CaptureTrigger, EVENT_HAND_DETECTED, EVENT_HAND_LEFT, EVENT_CAPTURE
+from frame_ingest import FrameIngest
+from frame_rate import FrameRateController
+from ws_protocol import control_message
+from shot_storage import save_shot
+from capture_quality import select_best_frame, CAPTURE_CANDIDATES
+from shot_hash import shot_hashes, DUPLICATE_POLICY
+from shot_index import shot_index
+from upload_stream import clear_upload_staging
+from shot_pipeline import prepare_shot, SHOT_MIGRATE
+detector_pool = create_detector_pool()
+
+@app.on_event("startup")
+async def select_detector_profile():
+    """选择检测器配置档（DETECTOR_PROFILE=auto 时在线程中运行自动调优）"""
+    loop = asyncio.get_running_loop()
+    detector_pool.profile = await loop.run_in_executor(None, select_profile)
+
+@app.on_event("startup")
+async def start_png_migration():
+    """在后台把已有的 PNG 截图迁移为配置的编码格式，不阻塞启动（逐张在编辑锁内进行）"""
+    if SHOT_MIGRATE:
+        asyncio.create_task(migrate_png_backlog())
+
+@app.on_event("startup")
+async def start_shot_index():
+    """加载截图索引并开始轮询 shots 目录的外部修改"""
+    await asyncio.get_running_loop().run_in_executor(None, shot_index.rescan)
+    shot_index.start_watcher()
+
+@app.on_event("startup")
+async def clear_stale_uploads():
+    """清理上次运行中断时遗留的上传暂存文件"""
+    await asyncio.get_running_loop().run_in_executor(None, clear_upload_staging)
 
-# 初始化手部检测器
-hand_detector = HandDetector()
+@app.on_event("shutdown")
+async def shutdown_detector_pool():
+    detector_pool.shutdown()
+    shot_index.stop_watcher()
+
+@app.get("/api/detector/stats")
+async def get_detector_stats():
+    """获取手部检测统计（含运动门控命中率）"""
+    return detector_pool.stats()
 
 # 管理连接的客户端
 class ConnectionManager:
@@ -115,6 +139,84 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+async def send_event(websocket: WebSocket, ingest: FrameIngest, text: str, event: str, **fields):
+    """发送状态事件：帧协议前端收到 JSON 控制消息，旧前端收到中文状态文本"""
+    if ingest.framed:
+        await websocket.send_json(control_message(event, **fields))
+    else:
+        await manager.send_message(text, websocket)
+
+async def capture_shot(websocket: WebSocket, ingest: FrameIngest, hand_left_at: float):
+    """
+    完成一次截图：优先使用前端推送到缓冲区、手离开之后拍摄的高清帧，
+    缓冲区中没有合适的帧（或旧前端）时再向前端请求高清截图，请求超时则改用缓存的高清帧或最近的检测帧。
+    多张候选帧时按清晰度和曝光评分，只保存最好的一张
+    """
+    try:
+        frames = await ingest.hd_ring.wait_frames_after(hand_left_at) if ingest.framed else []
+        if frames:
+            source = "ring"
+            candidates = [frame.data for frame in frames[-CAPTURE_CANDIDATES:]]
+        else:
+            await send_event(websocket, ingest, "请发送高清截图", "capture_request")
+            source = "request"
+            try:
+                candidates = [await ingest.next_hd_frame()]
+            except asyncio.TimeoutError:
+                # 前端没有回应：改用缓存的高清帧，没有时用最近的检测帧
+                source, candidates = ingest.fallback_frames()
+                if not candidates:
+                    logger.warning("等待高清截图超时，没有可用的备选帧")
+                    await send_event(websocket, ingest, "截图失败：等待高清截图超时", "shot_failed",
+                                     error="等待高清截图超时")
+                    return
+                logger.warning(f"等待高清截图超时，改用 {source} 帧截图")
+                candidates = candidates[-CAPTURE_CANDIDATES:]
+        
+        # 质量评分（解码和滤波在线程池中执行）
+        loop = asyncio.get_running_loop()
+        best, qualities = await loop.run_in_executor(None, select_best_frame, candidates)
+        if best < 0:
+            await send_event(websocket, ingest, "截图失败：高清帧无法解码", "shot_failed", error="高清帧无法解码")
+            return
+        metadata = {
+            "source": source,
+            "candidates": len(candidates),
+            **qualities[best].to_dict(),
+            "candidate_scores": [None if q is None else round(q.score, 2) for q in qualities],
+        }
+        
+        # 页面规整、转码和查重（与上一页比较：手伸进来又离开但没有翻页）
+        try:
+            prepared = await loop.run_in_executor(None, prepare_shot, candidates[best], True)
+        except ValueError as e:
+            logger.warning(f"高清截图无效: {str(e)}")
+            await send_event(websocket, ingest, f"截图失败：{str(e)}", "shot_failed", error=str(e))
+            return
+        if prepared.duplicate is not None and DUPLICATE_POLICY == "reject":
+            logger.info(f"截图与上一页 {prepared.duplicate} 重复，已跳过")
+            ingest.hd_ring.clear()
+            await send_event(websocket, ingest, f"截图重复，已跳过：{prepared.duplicate}", "shot_duplicate",
+                             duplicate_of=prepared.duplicate)
+            return
+        metadata.update(prepared.metadata)
+        
+        # 截图保存（在线程池中写盘）
+        shot_path = await save_shot(prepared.data, metadata=metadata, original=prepared.original)
+        ingest.hd_ring.clear()
+        await loop.run_in_executor(None, shot_index.add, shot_path.name)
+        if prepared.shot_hash is not None:
+            shot_hashes.add(shot_path.name, prepared.shot_hash)
+        logger.info(f"截图 {shot_path.name}：{len(candidates)} 张候选，清晰度 {qualities[best].sharpness:.1f}")
+        
+        # 发送成功消息给前端
+        await send_event(websocket, ingest, f"截图成功：{shot_path.name}", "shot",
+                         name=shot_path.name, duplicate_of=metadata.get("duplicate_of"))
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"截图处理错误: {str(e)}")
+
 # 路由
 @app.get("/")
 async def root():
@@ -123,49 +225,65 @@ async def root():
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
+    profile = detector_pool.profile
+    session = await detector_pool.open_session()
     
-    # 状态机状态
-    state = 0  # 0: WAIT_HAND, 1: HAND_ON
-    count = 0
+    # 读取任务只保留最新一帧，处理任务按自己的节奏取帧；前端按配置档的输入尺寸发送检测帧
+    ingest = FrameIngest(websocket, detect_size=profile.input_size)
+    reader = asyncio.create_task(ingest.run())
+    
+    # 截图触发状态机
+    trigger = CaptureTrigger()
+    # 前端发送帧率控制
+    rate = FrameRateController()
+    # 手离开时的客户端时间戳（毫秒），截图只选用此后拍摄的高清帧
+    hand_left_at = 0.0
+    capture_task = None
     
     try:
         while True:
-            # 接收前端发送的图像帧
-            data = await websocket.receive_bytes()
+            # 取出最新的图像帧（积压的旧帧已被丢弃）
+            data = await ingest.next_frame()
             
-            # 转换为图像并处理
-            frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            # 解码并检测手部（在检测线程池中执行）
+            started = time.perf_counter()
+            try:
+                result = await session.process(data)
+            except ValueError as e:
+                logger.warning(f"跳过无效帧: {str(e)}")
+                if ingest.header is not None:
+                    await websocket.send_json(control_message("ack", seq=ingest.header.seq, error=str(e)))
+                continue
             
-            # 检测手部
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            has_hand = hand_detector.detect(frame_rgb)
+            # 帧协议下回传序号和客户端时间戳，前端据此计算端到端延迟并控制在途帧数
+            if ingest.header is not None:
+                await websocket.send_json(control_message(
+                    "ack",
+                    seq=ingest.header.seq,
+                    timestamp=ingest.header.timestamp,
+                    has_hand=result.has_hand,
+                    process_ms=round((time.perf_counter() - started) * 1000, 1),
+                ))
             
             # 状态机逻辑
-            if state == 0 and has_hand:
-                state = 1
-                await manager.send_message("手势已检测", websocket)
-            elif state == 1 and not has_hand:
-                # 延时2秒，确保手真的离开
-                await websocket.send_text("手部消失，准备截图...")
-                time.sleep(2.0)
-                
-                # 请求高清截图
-                await websocket.send_text("请发送高清截图")
-                
-                # 等待高清截图
-                hd_data = await websocket.receive_bytes()
-                hd_frame = cv2.imdecode(np.frombuffer(hd_data, np.uint8), cv2.IMREAD_COLOR)
-                
-                # 截图保存
-                count += 1
-                shot_path = SHOTS_DIR / f'shot_{count}.png'
-                cv2.imwrite(str(shot_path), hd_frame)
-                
-                # 发送成功消息给前端
-                await manager.send_message(f"截图成功：{shot_path}", websocket)
-                
-                # 重置状态
-                state = 0
+            event = trigger.update(result.has_hand, result.motion)
+            # 截图完成前保持高清帧推流，截图任务结束后的下一帧再停止
+            capture_pending = event == EVENT_CAPTURE or (capture_task is not None and not capture_task.done())
+            hint = rate.update(trigger.state, result.motion, capture_pending=capture_pending)
+            if hint is not None:
+                await websocket.send_json(hint)
+            if event == EVENT_HAND_DETECTED:
+                await send_event(websocket, ingest, "手势已检测", EVENT_HAND_DETECTED)
+            elif event == EVENT_HAND_LEFT:
+                # 等待画面静止后再截图，期间继续处理后续帧
+                hand_left_at = ingest.header.timestamp if ingest.header is not None else 0.0
+                await send_event(websocket, ingest, "手部消失，准备截图...", EVENT_HAND_LEFT)
+            elif event == EVENT_CAPTURE:
+                # 截图在独立任务中完成，检测循环不等待高清帧
+                if capture_task is not None and not capture_task.done():
+                    logger.warning("上一次截图尚未完成，跳过本次截图")
+                    continue
+                capture_task = asyncio.create_task(capture_shot(websocket, ingest, hand_left_at))
                 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -173,6 +291,13 @@ async def websocket_endpoint(websocket: WebSocket):
     except Exception as e:
         logger.error(f"WebSocket处理错误: {str(e)}")
         manager.disconnect(websocket)
+    
+    finally:
+        reader.cancel()
+        if capture_task is not None:
+            capture_task.cancel()
+        ingest.log_stats()
+        session.close()
 
 # 获取 output 目录下的文件夹列表
 @app.get("/api/output-folders")
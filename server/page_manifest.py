@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+页面顺序清单
+截图的页码顺序保存在 shots/.manifest.sqlite3 中（文件名 → 位置值），与文件名无关。
+位置值是浮点数，插入和移动只需取相邻两页的中间值并写一行，
+无需重命名或复制文件；间隔耗尽时整体重新编号（很少发生）。
+每次修改都在一个 SQLite 事务中完成，进程中断不会留下半改的顺序。
+"""
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+from shot_storage import SHOTS_DIR
+
+# 清单数据库路径
+MANIFEST_PATH = SHOTS_DIR / ".manifest.sqlite3"
+
+
+class PageManifest:
+    """
+    页面顺序清单的持久化存储（线程安全）
+    """
+    def __init__(self, path: Path = MANIFEST_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+            # WAL 模式下提取脚本等其他进程读取时不阻塞写入
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS pages (name TEXT PRIMARY KEY, position REAL NOT NULL)")
+        return self._conn
+
+    def load(self) -> Dict[str, float]:
+        """读取全部文件名及其位置值"""
+        with self._lock:
+            return dict(self._connect().execute("SELECT name, position FROM pages"))
+
+    def apply(self, updates: Iterable[Tuple[str, float]] = (), deletes: Iterable[str] = ()):
+        """
+        在一个事务中写入位置值并删除条目
+
+        参数:
+            updates: (文件名, 位置值)
+            deletes: 要删除的文件名
+        """
+        updates, deletes = list(updates), list(deletes)
+        if not updates and not deletes:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if deletes:
+                    conn.executemany("DELETE FROM pages WHERE name = ?", [(name,) for name in deletes])
+                if updates:
+                    conn.executemany("INSERT OR REPLACE INTO pages (name, position) VALUES (?, ?)", updates)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+页面规整模块
+在截图中查找纸张四边形，透视校正后裁掉桌面、手和背景，
+只把页面本身发送给视觉模型；原图另存到 shots/.originals
+"""
+import os
+from typing import NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+# 是否在截图和上传时规整页面
+PAGE_NORMALIZE = os.getenv("PAGE_NORMALIZE", "1") == "1"
+# 页面四边形至少占画面面积的比例，过小视为没有找到页面
+PAGE_MIN_AREA = float(os.getenv("PAGE_MIN_AREA", "0.2"))
+
+# 查找轮廓时的图像长边（像素）
+_DETECT_SIZE = 800
+# 页面四边形占满画面时无需裁剪
+_MAX_AREA = 0.97
+
+
+class PageNormalization(NamedTuple):
+    # 透视校正后的页面图像
+    image: np.ndarray
+    # 原图像素坐标中的页面四角：左上、右上、右下、左下
+    quad: list
+
+
+def _order_corners(points: np.ndarray) -> np.ndarray:
+    """四个角点按左上、右上、右下、左下排序"""
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()
+    return np.array([
+        points[np.argmin(sums)],
+        points[np.argmin(diffs)],
+        points[np.argmax(sums)],
+        points[np.argmax(diffs)],
+    ], np.float32)
+
+
+def find_page_quad(image: np.ndarray) -> Optional[np.ndarray]:
+    """
+    查找页面四边形
+
+    参数:
+        image: BGR 图像
+
+    返回:
+        原图像素坐标的四个角点 (4, 2)，找不到页面时返回 None
+    """
+    height, width = image.shape[:2]
+    scale = min(1.0, _DETECT_SIZE / max(height, width))
+    small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else image
+
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    gray = cv2.GaussianBlur(gray, (5, 5), 0)
+    edges = cv2.Canny(gray, 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    frame_area = small.shape[0] * small.shape[1]
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        area_ratio = cv2.contourArea(contour) / frame_area
+        if area_ratio < PAGE_MIN_AREA:
+            break
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(approx) == 4 and cv2.isContourConvex(approx):
+            if area_ratio > _MAX_AREA:
+                return None
+            return _order_corners(approx.reshape(4, 2).astype(np.float32) / scale)
+    return None
+
+
+def warp_page(image: np.ndarray, quad: np.ndarray) -> np.ndarray:
+    """把页面四边形透视校正为矩形"""
+    top_left, top_right, bottom_right, bottom_left = quad
+    width = int(round(max(np.linalg.norm(top_right - top_left), np.linalg.norm(bottom_right - bottom_left))))
+    height = int(round(max(np.linalg.norm(bottom_left - top_left), np.linalg.norm(bottom_right - top_right))))
+    target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], np.float32)
+    matrix = cv2.getPerspectiveTransform(quad, target)
+    return cv2.warpPerspective(image, matrix, (width, height), flags=cv2.INTER_CUBIC)
+
+
+def normalize_page(image: np.ndarray) -> Optional[PageNormalization]:
+    """
+    规整一张截图
+
+    参数:
+        image: BGR 图像
+
+    返回:
+        PageNormalization，找不到页面时返回 None（保留原图）
+    """
+    quad = find_page_quad(image)
+    if quad is None:
+        return None
+    return PageNormalization(warp_page(image, quad), np.round(quad.astype(float), 1).tolist())
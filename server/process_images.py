@@ -2,14 +2,14 @@ import os
 import base64
 import json
 import requests
-import shutil
 import argparse
-from pathlib import Path
 import re
 import time
 from typing import List, Dict, Optional, Any
 import importlib.util
 
+from shot_index import shot_index
+
 # 检查智谱API模块是否存在
 ZHIPU_API_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "zhipu_api.py")
 HAS_ZHIPU_API = os.path.exists(ZHIPU_API_PATH)
@@ -29,7 +29,7 @@ SHOTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shots")
 LM_STUDIO_URL = "http://192.168.1.217:1234/v1/chat/completions"
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "output")
 MAX_BATCH_SIZE = 10  # 每批最多处理的图片数
-TEMP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp")  # 临时目录，用于重命名操作
+TEMP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp")  # 临时目录，用于缓存和临时MD文件
 PAGES_CACHE_FILE = os.path.join(TEMP_DIR, "pages_cache.json")  # 页面内容缓存文件
 TEMP_MD_FILE = os.path.join(TEMP_DIR, "temp.md")  # 临时MD文件，用于保存提取的文字内容
 
@@ -40,36 +40,15 @@ def encode_image_to_base64(image_path):
 
 def get_sorted_images():
     """
-    获取排序后的图片列表，与 image_processing.py 中保持一致
+    获取排序后的图片列表，与图片管理共用截图索引（shot_index）
     """
-    try:
-        files = []
-        for file_path in Path(SHOTS_DIR).glob("*"):
-            if file_path.is_file() and file_path.suffix.lower() in ('.jpg', '.jpeg', '.png', '.mp4'):
-                files.append(file_path.name)
-                
-        # 按时间戳排序（最新的在前）
-        files.sort(reverse=True)
-        return files
-    except Exception as e:
-        print(f"获取排序图片出错: {str(e)}")
-        return []
+    return list(shot_index.names())
 
-def rename_images_by_ui_order():
+def get_ordered_image_paths():
     """
-    根据 UI 中的图片顺序重命名图片文件
-    返回重命名后的图片路径列表
+    按 UI 中的页码顺序返回图片路径列表
+    页码顺序来自页面顺序清单，直接读取 shots 目录中的文件，无需复制和重命名
     """
-    # 确保临时目录存在
-    os.makedirs(TEMP_DIR, exist_ok=True)
-    
-    # 清空临时目录中的图片文件，但保留缓存文件
-    for file in os.listdir(TEMP_DIR):
-        file_path = os.path.join(TEMP_DIR, file)
-        if os.path.isfile(file_path) and not file.endswith('.json'):  # 保留json缓存文件
-            os.remove(file_path)
-    
-    # 获取 UI 中的图片顺序（按 image_processing.py 中的逻辑获取）
     ui_image_list = get_sorted_images()
     
     if not ui_image_list:
@@ -77,22 +56,7 @@ def rename_images_by_ui_order():
         return []
     
     print(f"UI 中的图片顺序: {ui_image_list}")
-    
-    # 按照顺序重命名并复制到临时目录
-    renamed_paths = []
-    for idx, filename in enumerate(ui_image_list):
-        # 创建新文件名（确保按顺序排序）
-        original_path = os.path.join(SHOTS_DIR, filename)
-        new_filename = f"{idx+1:03d}{Path(filename).suffix}"
-        new_path = os.path.join(TEMP_DIR, new_filename)
-        
-        # 复制文件到临时目录
-        shutil.copy2(original_path, new_path)
-        renamed_paths.append(new_path)
-        print(f"已复制 {filename} 到 {new_path}")
-    
-    print(f"共重命名 {len(renamed_paths)} 个文件")
-    return sorted(renamed_paths)  # 确保按照新的数字序号排序
+    return [os.path.join(SHOTS_DIR, filename) for filename in ui_image_list]
 
 def get_cached_pages():
     """读取缓存的页面内容"""
@@ -429,7 +393,7 @@ def clean_temp_directory():
     print("已清空临时目录")
 
 def extract_mode():
-    """提取模式：重命名图片、提取文字并保存缓存"""
+    """提取模式：按页码顺序提取文字并保存缓存"""
     print("运行模式: 提取文字")
     
     # 确保临时目录存在
@@ -445,18 +409,18 @@ def extract_mode():
         os.remove(TEMP_MD_FILE)
         print("已清空之前的临时MD文件")
     
-    print("根据 UI 顺序重命名图片...")
-    renamed_image_paths = rename_images_by_ui_order()
+    print("读取 UI 页码顺序...")
+    image_paths = get_ordered_image_paths()
     
-    if not renamed_image_paths:
-        print("未找到图片或重命名失败")
+    if not image_paths:
+        print("未找到图片")
         return
     
-    print(f"找到 {len(renamed_image_paths)} 张图片")
+    print(f"找到 {len(image_paths)} 张图片")
     
     # 分批处理图片，提取文字内容
     print("开始分批提取图片文字...")
-    pages_content = process_images_in_batches(renamed_image_paths)
+    pages_content = process_images_in_batches(image_paths)
     
     if not pages_content:
         print("提取文字失败")
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+截图感知哈希模块
+为 shots 目录中的每张图片计算 64 位 dHash，截图和上传时据此识别近似重复的页面，
+避免同一页被重复保存并重复发送给视觉模型。哈希值缓存在截图元数据中。
+"""
+import os
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+from image_header import read_image_header
+from shot_storage import SHOTS_DIR, read_shot_metadata, update_shot_metadata
+from shot_index import shot_index
+
+logger = logging.getLogger(__name__)
+
+# 近似重复的处理方式：reject 拒绝保存；flag 保存但在元数据中标记；off 不检查
+# 64 位 dHash 对背景相同、文字不同的两页也可能很接近，默认只标记不拒绝
+DUPLICATE_POLICY = os.getenv("DUPLICATE_POLICY", "flag")
+# 汉明距离不超过该值视为近似重复（共 64 位）
+DUPLICATE_DISTANCE = int(os.getenv("DUPLICATE_DISTANCE", "5"))
+
+# 参与哈希的图片扩展名
+_HASH_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+# 计算哈希前的缩小解码标志：哈希只需要 9x8 像素，尽量在解码阶段缩小
+_REDUCED_GRAY_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+_MIN_DECODE_EDGE = 64
+
+
+def dhash(data) -> Optional[int]:
+    """
+    计算图像的 64 位 dHash（相邻像素亮度差）
+
+    参数:
+        data: 图像字节
+
+    返回:
+        哈希值，无法解码时返回 None
+    """
+    flag = cv2.IMREAD_GRAYSCALE
+    header = read_image_header(data)
+    if header is not None:
+        short_edge = min(header.width, header.height)
+        for factor, reduced_flag in _REDUCED_GRAY_FLAGS:
+            if short_edge // factor >= _MIN_DECODE_EDGE:
+                flag = reduced_flag
+                break
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if gray is None:
+        return None
+    return dhash_image(gray)
+
+
+def dhash_image(image: np.ndarray) -> int:
+    """计算已解码图像（灰度或 BGR）的 64 位 dHash"""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    # 先缩到 72x64 再以浮点缩到 9x8，避免 uint8 取整造成的亮度相等
+    small = cv2.resize(image, (72, 64), interpolation=cv2.INTER_AREA).astype(np.float32)
+    small = cv2.resize(small, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class ShotHashIndex:
+    """
+    shots 目录的感知哈希索引
+
+    截图、上传、替换和删除时通过 add / remove 更新；每次查询前与截图索引对账，
+    目录被外部修改时也能保持一致。缺失的哈希从元数据读取或现场计算。
+    """
+    def __init__(self, directory: Path = SHOTS_DIR):
+        self.directory = directory
+        self._hashes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # 对账时计算哈希较慢，另用一把锁串行执行，不占用 _lock（add / remove 不被阻塞）
+        self._sync_lock = threading.Lock()
+        # 每个文件名的 add / remove 次数，对账期间有变化的文件不写入算出的旧哈希
+        self._changes: Dict[str, int] = {}
+
+    def _sync(self, names):
+        """与截图索引对账，缺失的哈希在 _lock 之外读取或计算"""
+        names = {name for name in names if os.path.splitext(name)[1].lower() in _HASH_EXTENSIONS}
+        with self._sync_lock:
+            with self._lock:
+                for name in set(self._hashes) - names:
+                    del self._hashes[name]
+                missing = {name: self._changes.get(name, 0) for name in names - set(self._hashes)}
+            loaded = {}
+            for name in missing:
+                value = self._load_hash(name)
+                if value is not None:
+                    loaded[name] = value
+            with self._lock:
+                for name, value in loaded.items():
+                    if self._changes.get(name, 0) == missing[name] and name not in self._hashes:
+                        self._hashes[name] = value
+
+    def _load_hash(self, name: str) -> Optional[int]:
+        metadata = read_shot_metadata(name)
+        if "dhash" in metadata:
+            return int(metadata["dhash"], 16)
+        try:
+            value = dhash((self.directory / name).read_bytes())
+        except OSError:
+            return None
+        if value is not None:
+            update_shot_metadata(name, {"dhash": f"{value:016x}"})
+        return value
+
+    def add(self, name: str, value: int):
+        """记录新保存的图片的哈希（调用方负责把哈希写入元数据）"""
+        with self._lock:
+            self._hashes[name] = value
+            self._changes[name] = self._changes.get(name, 0) + 1
+
+    def remove(self, name: str):
+        with self._lock:
+            self._hashes.pop(name, None)
+            self._changes[name] = self._changes.get(name, 0) + 1
+
+    def find_duplicate(self, value: int, latest_only: bool = False,
+                       max_distance: int = DUPLICATE_DISTANCE, ignore: Optional[str] = None) -> Optional[str]:
+        """
+        查找与 value 近似重复的图片
+
+        参数:
+            value: 待检查图片的哈希
+            latest_only: 只与最新一张（上一页）比较，截图时使用
+            max_distance: 汉明距离阈值
+            ignore: 不参与比较的文件名（替换时被替换的图片）
+
+        返回:
+            重复图片的文件名，没有时返回 None
+        """
+        # 先读取截图索引再加 _lock，两把锁不嵌套
+        ordered = shot_index.names()
+        self._sync(ordered)
+        with self._lock:
+            if latest_only:
+                # 新截图排在第 1 页
+                latest = ordered[0] if ordered else None
+                names = [latest] if latest in self._hashes else []
+            else:
+                names = [name for name in ordered if name in self._hashes]
+            for name in names:
+                if name == ignore:
+                    continue
+                if hamming_distance(self._hashes[name], value) <= max_distance:
+                    return name
+        return None
+
+
+shot_hashes = ShotHashIndex()
+
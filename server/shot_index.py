@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+截图索引模块
+在内存中维护 shots 目录的有序文件列表和每张截图的基本信息（大小、修改时间、尺寸、哈希），
+首次使用时扫描一次目录；服务器自身的写入路径直接更新索引，
+外部对目录的修改由后台轮询线程发现。列表和按页码查找都不再扫描目录。
+
+页码顺序保存在页面顺序清单中（见 page_manifest），新截图排在最前面（第 1 页），
+插入和移动只改写清单，不重命名文件。
+"""
+import os
+import uuid
+import bisect
+import logging
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from image_header import read_image_header
+from page_manifest import PageManifest
+from shot_storage import SHOTS_DIR, read_shot_metadata
+
+logger = logging.getLogger(__name__)
+
+# 后台轮询 shots 目录的间隔（秒），0 表示不轮询（只依赖服务器自身的写入路径）
+SHOT_INDEX_POLL = float(os.getenv("SHOT_INDEX_POLL", "2"))
+
+# 索引的文件类型
+SHOT_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.mp4'}
+# 读取图像尺寸时最多读取的文件头字节数
+_HEADER_BYTES = 64 * 1024
+
+
+class ShotInfo(NamedTuple):
+    name: str
+    size: int
+    # 修改时间（纳秒）
+    mtime_ns: int
+    # 图像尺寸，视频或无法解析时为 None
+    width: Optional[int]
+    height: Optional[int]
+    # 元数据中的 dHash（十六进制），没有时为 None
+    dhash: Optional[str]
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "size": self.size,
+            "mtime": self.mtime_ns / 1e9,
+            "width": self.width,
+            "height": self.height,
+            "dhash": self.dhash,
+        }
+
+
+def _longest_increasing(values: List[Optional[float]]) -> set:
+    """严格递增的最长子序列（跳过 None）的下标集合"""
+    tails: List[float] = []
+    tail_indices: List[int] = []
+    previous: Dict[int, int] = {}
+    for index, value in enumerate(values):
+        if value is None:
+            continue
+        slot = bisect.bisect_left(tails, value)
+        if slot == len(tails):
+            tails.append(value)
+            tail_indices.append(index)
+        else:
+            tails[slot] = value
+            tail_indices[slot] = index
+        if slot > 0:
+            previous[index] = tail_indices[slot - 1]
+    kept = set()
+    index = tail_indices[-1] if tail_indices else None
+    while index is not None:
+        kept.add(index)
+        index = previous.get(index)
+    return kept
+
+
+def _is_shot(name: str) -> bool:
+    return not name.startswith(".") and os.path.splitext(name)[1].lower() in SHOT_EXTENSIONS
+
+
+def _read_info(name: str, stat: os.stat_result) -> ShotInfo:
+    width = height = None
+    if not name.lower().endswith(".mp4"):
+        try:
+            with open(SHOTS_DIR / name, "rb") as f:
+                header = read_image_header(f.read(_HEADER_BYTES))
+            if header is not None:
+                width, height = header.width, header.height
+        except OSError:
+            pass
+    dhash = read_shot_metadata(name).get("dhash")
+    return ShotInfo(name, stat.st_size, stat.st_mtime_ns, width, height, dhash)
+
+
+class ShotIndex:
+    """
+    shots 目录的有序内存索引（线程安全）
+
+    页码顺序由页面顺序清单（page_manifest）中的位置值决定，(位置值, 文件名) 按升序保存在列表中：
+    按页码取文件名 O(1)，按文件名查页码 O(log n)；插入、移动、删除只改动清单中的一行。
+    每次变化时 version 加一，调用方可据此判断列表是否变化。
+    """
+    def __init__(self, directory=SHOTS_DIR, poll_interval: float = SHOT_INDEX_POLL,
+                 manifest: Optional[PageManifest] = None):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.manifest = manifest or PageManifest()
+        # 按页码顺序排列的 (位置值, 文件名)
+        self._order: List[Tuple[float, str]] = []
+        self._positions: Dict[str, float] = {}
+        self._info: Dict[str, ShotInfo] = {}
+        self._lock = threading.RLock()
+        self._loaded = False
+        # 页码顺序的文件名列表缓存，索引变化后重建
+        self._names_cache: Optional[List[str]] = None
+        self.version = 0
+        # 区分不同进程实例的版本号
+        self._epoch = uuid.uuid4().hex[:8]
+
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.rescan()
+
+    def _changed(self):
+        self.version += 1
+        self._names_cache = None
+
+    def _place(self, name: str, position: float):
+        self._unplace(name)
+        self._positions[name] = position
+        bisect.insort(self._order, (position, name))
+
+    def _unplace(self, name: str):
+        position = self._positions.pop(name, None)
+        if position is not None:
+            del self._order[bisect.bisect_left(self._order, (position, name))]
+
+    def _position_after(self, page: int) -> float:
+        """排在第 page 页之后（page=0 为最前面）的新位置值，间隔耗尽时先重新编号"""
+        count = len(self._order)
+        if count == 0:
+            return 0.0
+        if page <= 0:
+            return self._order[0][0] - 1.0
+        if page >= count:
+            return self._order[-1][0] + 1.0
+        before, after = self._order[page - 1][0], self._order[page][0]
+        middle = (before + after) / 2
+        if before < middle < after:
+            return middle
+        self._renumber()
+        return page - 0.5
+
+    def _renumber(self):
+        """按当前顺序把位置值重排为 0, 1, 2, ...（浮点间隔耗尽时调用）"""
+        names = [name for _, name in self._order]
+        self._order = [(float(index), name) for index, name in enumerate(names)]
+        self._positions = {name: position for position, name in self._order}
+        self.manifest.apply(updates=[(name, position) for position, name in self._order])
+        logger.info(f"页面顺序已重新编号（共 {len(names)} 页）")
+
+    def _scan(self) -> Optional[Dict[str, os.stat_result]]:
+        entries = {}
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if _is_shot(entry.name) and entry.is_file():
+                        stat = entry.stat()
+                        # 空文件是写入前占位的文件名（见 shot_storage.reserve_shot_path）
+                        if stat.st_size > 0:
+                            entries[entry.name] = stat
+        except OSError as e:
+            logger.warning(f"扫描截图目录失败: {str(e)}")
+            return None
+        return entries
+
+    def _changed_infos(self, entries: Dict[str, os.stat_result], known: Dict[str, ShotInfo]) -> Dict[str, ShotInfo]:
+        """读取新增或大小、修改时间变化的文件信息"""
+        infos = {}
+        for name, stat in entries.items():
+            info = known.get(name)
+            if info is None or info.size != stat.st_size or info.mtime_ns != stat.st_mtime_ns:
+                infos[name] = _read_info(name, stat)
+        return infos
+
+    def rescan(self) -> bool:
+        """
+        与目录内容对账：新增、删除以及大小或修改时间变化的文件
+
+        扫描目录和读取文件信息在锁外进行；期间索引被服务器自身的写入修改时，
+        扫描结果可能已过时（如刚插入的文件被当作已删除），此时在锁内重新扫描一次。
+
+        不在清单中的新文件（首次启用清单时的已有截图，或外部放入的文件）
+        按文件名降序排在最前面，与按时间戳排序的旧规则一致。
+
+        返回:
+            索引是否发生变化
+        """
+        with self._lock:
+            version, loaded, known = self.version, self._loaded, dict(self._info)
+        entries = self._scan() if loaded else None
+        infos = self._changed_infos(entries, known) if entries is not None else {}
+
+        with self._lock:
+            if not loaded or self.version != version:
+                entries = self._scan()
+                if entries is None:
+                    return False
+                infos = self._changed_infos(entries, self._info)
+            elif entries is None:
+                return False
+
+            if not self._loaded:
+                for name, position in self.manifest.load().items():
+                    self._place(name, position)
+
+            changed = False
+            deletes = [name for name in self._positions if name not in entries]
+            for name in deletes:
+                self._unplace(name)
+                self._info.pop(name, None)
+                changed = True
+            for name, info in infos.items():
+                self._info[name] = info
+                changed = True
+
+            untracked = sorted((name for name in entries if name not in self._positions), reverse=True)
+            first = self._order[0][0] if self._order else 0.0
+            updates = []
+            for offset, name in enumerate(untracked):
+                position = first - (len(untracked) - offset)
+                self._place(name, position)
+                updates.append((name, position))
+            self.manifest.apply(updates, deletes)
+
+            if changed or not self._loaded:
+                self._changed()
+            self._loaded = True
+            return changed
+
+    def add(self, name: str, after_page: Optional[int] = None):
+        """
+        记录新写入或被替换的文件（文件不存在时按删除处理）
+
+        参数:
+            name: 文件名
+            after_page: 排在第 after_page 页之后（0 为最前面，页码不含该文件本身）；
+                None 时已有文件保持原位置，新文件排在最前面（最新的截图为第 1 页）
+        """
+        try:
+            stat = os.stat(self.directory / name)
+        except OSError:
+            self.remove(name)
+            return
+        if not _is_shot(name) or stat.st_size == 0:
+            return
+        # 读取文件信息不占用锁
+        info = _read_info(name, stat)
+        with self._lock:
+            self._ensure_loaded()
+            self._info[name] = info
+            if after_page is not None or name not in self._positions:
+                self._unplace(name)
+                position = self._position_after(after_page or 0)
+                self._place(name, position)
+                self.manifest.apply([(name, position)])
+            self._changed()
+
+    def move(self, page: int, to_page: int) -> Optional[str]:
+        """
+        把第 page 页移动到第 to_page 页（超出范围时移到首尾），只改写该页的位置值
+
+        返回:
+            被移动的文件名，页码无效时返回 None
+        """
+        with self._lock:
+            name = self.name_at(page)
+            if name is None:
+                return None
+            self._unplace(name)
+            position = self._position_after(min(max(to_page, 1), len(self._order) + 1) - 1)
+            self._place(name, position)
+            self.manifest.apply([(name, position)])
+            self._changed()
+            return name
+
+    def rename(self, old_name: str, new_name: str):
+        """文件改名（如转码后扩展名变化），保持原页码"""
+        try:
+            info = _read_info(new_name, os.stat(self.directory / new_name))
+        except OSError:
+            info = None
+        with self._lock:
+            self._ensure_loaded()
+            position = self._positions.get(old_name)
+            if position is None:
+                self.add(new_name)
+                return
+            self._unplace(old_name)
+            self._info.pop(old_name, None)
+            if info is None:
+                self.manifest.apply(deletes=[old_name])
+                self._changed()
+                return
+            self._info[new_name] = info
+            self._place(new_name, position)
+            self.manifest.apply([(new_name, position)], [old_name])
+            self._changed()
+
+    def apply_batch(self, order: List[str], deletes: Iterable[str] = (), rewritten: Iterable[str] = ()) -> List[str]:
+        """
+        一次性更新一批修改后的页码顺序（文件已由调用方修改完毕）
+
+        参数:
+            order: 这批页面修改后的顺序；期间由其他途径新增的文件不在其中，保持原位置
+            deletes: 已删除的文件名
+            rewritten: 内容被改写的文件名，需重新读取文件信息
+
+        返回:
+            新的页码顺序
+        """
+        rewritten = set(rewritten)
+        # 读取文件信息不占用锁
+        infos: Dict[str, Optional[ShotInfo]] = {}
+        for name in order:
+            if name in rewritten or self.get(name) is None:
+                try:
+                    infos[name] = _read_info(name, os.stat(self.directory / name))
+                except OSError:
+                    infos[name] = None
+
+        with self._lock:
+            self._ensure_loaded()
+            deletes = {name for name in deletes if name in self._positions}
+            deletes.update(name for name, info in infos.items() if info is None and name in self._positions)
+            for name in deletes:
+                self._unplace(name)
+                self._info.pop(name, None)
+            kept_names = [name for name in order if infos.get(name, True) is not None and name not in deletes]
+            for name in kept_names:
+                if infos.get(name) is not None:
+                    self._info[name] = infos[name]
+
+            # 保留最多的原有位置值（最长递增子序列），其余在相邻位置值之间等分
+            old_positions = [self._positions.get(name) for name in kept_names]
+            kept = _longest_increasing(old_positions)
+            positions: List[float] = []
+            index = 0
+            while index < len(kept_names):
+                if index in kept:
+                    positions.append(old_positions[index])
+                    index += 1
+                    continue
+                end = index
+                while end < len(kept_names) and end not in kept:
+                    end += 1
+                low = positions[-1] if positions else None
+                high = old_positions[end] if end < len(kept_names) else None
+                count = end - index
+                for offset in range(1, count + 1):
+                    if low is not None and high is not None:
+                        positions.append(low + (high - low) * offset / (count + 1))
+                    elif high is not None:
+                        positions.append(high - (count + 1 - offset))
+                    elif low is not None:
+                        positions.append(low + offset)
+                    else:
+                        positions.append(float(offset - 1))
+                index = end
+
+            renumber = any(a >= b for a, b in zip(positions, positions[1:]))
+            updates = [(name, position) for name, position in zip(kept_names, positions)
+                       if self._positions.get(name) != position]
+            for name, position in zip(kept_names, positions):
+                self._unplace(name)
+                if not renumber:
+                    self._place(name, position)
+            if renumber:
+                # 浮点间隔耗尽：按新顺序排在其他页面之后，再整体重新编号
+                last = self._order[-1][0] if self._order else 0.0
+                for offset, name in enumerate(kept_names, start=1):
+                    self._place(name, last + offset)
+                self._renumber()
+                updates = []
+            self.manifest.apply(updates, deletes)
+            self._changed()
+            return list(self.names())
+
+    def remove(self, name: str):
+        with self._lock:
+            self._ensure_loaded()
+            if name in self._positions:
+                self._unplace(name)
+                self._info.pop(name, None)
+                self.manifest.apply(deletes=[name])
+                self._changed()
+
+    def names(self) -> List[str]:
+        """按页码顺序（第 1 页在前）返回文件名列表（调用方不应修改）"""
+        with self._lock:
+            self._ensure_loaded()
+            if self._names_cache is None:
+                self._names_cache = [name for _, name in self._order]
+            return self._names_cache
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._order)
+
+    def name_at(self, page: int) -> Optional[str]:
+        """第 page 页（从 1 开始）的文件名，页码无效时返回 None"""
+        with self._lock:
+            self._ensure_loaded()
+            if page < 1 or page > len(self._order):
+                return None
+            return self._order[page - 1][1]
+
+    def page_of(self, name: str) -> Optional[int]:
+        """文件的页码，不在索引中时返回 None"""
+        with self._lock:
+            self._ensure_loaded()
+            position = self._positions.get(name)
+            if position is None:
+                return None
+            return bisect.bisect_left(self._order, (position, name)) + 1
+
+    def entries_after(self, after: Optional[Tuple[float, str]], limit: int) -> List[Tuple[int, float, ShotInfo]]:
+        """
+        分页读取：排在 after（位置值, 文件名）之后的最多 limit 项
+
+        after 对应的文件已被删除时仍从原位置继续，不会跳过或重复其他页。
+
+        返回:
+            [(页码, 位置值, ShotInfo)]
+        """
+        with self._lock:
+            self._ensure_loaded()
+            start = 0 if after is None else bisect.bisect_right(self._order, tuple(after))
+            return [(start + offset + 1, position, self._info[name])
+                    for offset, (position, name) in enumerate(self._order[start:start + limit])]
+
+    @property
+    def token(self) -> str:
+        """变更令牌：索引有任何变化（或服务重启）后都会不同"""
+        return f"{self._epoch}-{self.version}"
+
+    def get(self, name: str) -> Optional[ShotInfo]:
+        with self._lock:
+            self._ensure_loaded()
+            return self._info.get(name)
+
+    def start_watcher(self):
+        """启动后台轮询线程，发现外部对 shots 目录的修改"""
+        if self.poll_interval <= 0 or self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="shot-index-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            if self.rescan():
+                logger.info(f"截图目录有外部修改，索引已更新（共 {len(self)} 张）")
+
+
+shot_index = ShotIndex()
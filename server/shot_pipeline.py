@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+截图入库流水线
+截图和上传共用：页面规整 → 缩小到最大长边 → 按部署配置的编码格式转码 → 感知哈希查重。
+图像只解码、编码各一次；格式和尺寸都已符合要求时原样保存，不做有损重编码。
+另提供后台迁移任务，把已有的 PNG 截图转为配置的编码格式。
+"""
+import os
+import logging
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+from image_header import read_image_header, FORMAT_EXTENSIONS
+from page_normalize import normalize_page, PAGE_NORMALIZE
+from shot_hash import dhash_image, shot_hashes, DUPLICATE_POLICY
+from shot_index import shot_index
+from shot_storage import (SHOTS_DIR, ORIGINALS_DIR, write_file_atomic, read_shot_metadata,
+                          write_shot_metadata, write_shot_original, remove_shot_sidecars)
+
+logger = logging.getLogger(__name__)
+
+# 旧配置：CAPTURE_STORAGE_MODE=png 等价于 SHOT_CODEC=png
+CAPTURE_STORAGE_MODE = os.getenv("CAPTURE_STORAGE_MODE", "passthrough")
+# 截图编码格式：jpeg / webp / png；original 保持来源格式
+SHOT_CODEC = os.getenv("SHOT_CODEC", "png" if CAPTURE_STORAGE_MODE == "png" else "jpeg")
+# 有损编码质量（1-100）
+SHOT_QUALITY = int(os.getenv("SHOT_QUALITY", "90"))
+# 图像长边上限（像素），0 表示不限制
+SHOT_MAX_EDGE = int(os.getenv("SHOT_MAX_EDGE", "2560"))
+# 转码时是否在 shots/.originals 保留收到的原图（页面规整时总会保留）
+SHOT_KEEP_ORIGINAL = os.getenv("SHOT_KEEP_ORIGINAL", "0") == "1"
+# 启动时是否在后台把已有的 PNG 截图迁移为 SHOT_CODEC（有损格式会丢弃原 PNG，需显式开启）
+SHOT_MIGRATE = os.getenv("SHOT_MIGRATE", "0") == "1"
+
+
+class PreparedShot(NamedTuple):
+    # 要保存的图像字节
+    data: bytes
+    # 对应的扩展名
+    ext: str
+    # 需要另存的原图（未规整、未转码），不需要时为 None
+    original: Optional[bytes]
+    metadata: dict
+    # 哈希值，不查重时为 None
+    shot_hash: Optional[int]
+    # 近似重复的已有图片文件名
+    duplicate: Optional[str]
+
+
+def _target_format(source_format: str, codec: str) -> str:
+    return source_format if codec == "original" else codec
+
+
+def _fit_max_edge(image: np.ndarray, max_edge: int):
+    """长边超过 max_edge 时等比缩小，返回 (图像, 是否缩小)"""
+    height, width = image.shape[:2]
+    if max_edge <= 0 or max(height, width) <= max_edge:
+        return image, False
+    scale = max_edge / max(height, width)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), True
+
+
+def encode_image(image: np.ndarray, image_format: str, quality: int = SHOT_QUALITY) -> bytes:
+    """按格式编码图像"""
+    if image_format == "png":
+        ok, encoded = cv2.imencode(".png", image)
+    elif image_format == "webp":
+        ok, encoded = cv2.imencode(".webp", image, [cv2.IMWRITE_WEBP_QUALITY, quality])
+    else:
+        ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError(f"{image_format} 编码失败")
+    return encoded.tobytes()
+
+
+def prepare_shot(data, latest_only: bool = False,
+                 codec: str = SHOT_CODEC,
+                 quality: int = SHOT_QUALITY,
+                 max_edge: int = SHOT_MAX_EDGE,
+                 keep_original: bool = SHOT_KEEP_ORIGINAL,
+                 ignore: Optional[str] = None) -> PreparedShot:
+    """
+    入库前处理一张图片（同步，在线程池中调用）
+
+    参数:
+        data: 收到的图像字节
+        latest_only: 查重时只与最新一张比较（截图），否则与全部图片比较（上传）
+        ignore: 查重时跳过的文件名（替换时被替换的图片）
+
+    返回:
+        PreparedShot
+
+    异常:
+        ValueError: 图像格式无法识别或无法解码
+    """
+    header = read_image_header(data)
+    if header is None:
+        raise ValueError("无法识别的图像格式")
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("图像解码失败")
+
+    metadata = {}
+    changed = False
+    if PAGE_NORMALIZE:
+        page = normalize_page(image)
+        if page is not None:
+            image = page.image
+            metadata["page_quad"] = page.quad
+            changed = True
+    image, resized = _fit_max_edge(image, max_edge)
+
+    target = _target_format(header.format, codec)
+    if not changed and not resized and target == header.format:
+        # 格式和尺寸都符合要求，原样保存
+        output = bytes(data)
+    else:
+        output = encode_image(image, target, quality)
+        metadata["codec"] = target
+    metadata["width"], metadata["height"] = image.shape[1], image.shape[0]
+
+    original = None
+    if "page_quad" in metadata or (keep_original and "codec" in metadata):
+        original = bytes(data)
+
+    shot_hash, duplicate = None, None
+    if DUPLICATE_POLICY != "off":
+        shot_hash = dhash_image(image)
+        duplicate = shot_hashes.find_duplicate(shot_hash, latest_only, ignore=ignore)
+        metadata["dhash"] = f"{shot_hash:016x}"
+        if duplicate is not None:
+            metadata["duplicate_of"] = duplicate
+
+    return PreparedShot(output, FORMAT_EXTENSIONS[target], original, metadata, shot_hash, duplicate)
+
+
+def png_backlog(codec: str = SHOT_CODEC) -> List[Path]:
+    """shots 目录中待转为 codec 格式的 PNG 截图（codec 为 png / original 时为空）"""
+    if codec in ("png", "original"):
+        return []
+    paths = []
+    for path in sorted(SHOTS_DIR.iterdir()):
+        if not path.is_file() or path.suffix.lower() != ".png":
+            continue
+        # 空文件是写入前占位的文件名
+        if path.stat().st_size == 0 or path.with_suffix(FORMAT_EXTENSIONS[codec]).exists():
+            continue
+        paths.append(path)
+    return paths
+
+
+def migrate_png_shot(path: Path,
+                     codec: str = SHOT_CODEC,
+                     quality: int = SHOT_QUALITY,
+                     max_edge: int = SHOT_MAX_EDGE,
+                     keep_original: bool = SHOT_KEEP_ORIGINAL) -> Optional[int]:
+    """
+    把一张 PNG 截图转为 codec 格式（同步；调用方持有图片编辑锁，期间该页不会被删除或替换）
+
+    文件名主体不变，只替换扩展名，页码在页面顺序清单中保持不变；
+    元数据和原图随文件一起迁移。
+
+    返回:
+        节省的字节数；文件已不存在（已被删除或替换）、无法解码或迁移失败时返回 None
+    """
+    target = path.with_suffix(FORMAT_EXTENSIONS[codec])
+    try:
+        if not path.exists() or target.exists():
+            return None
+        data = path.read_bytes()
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            logger.warning(f"跳过无法解码的截图: {path.name}")
+            return None
+        image, _ = _fit_max_edge(image, max_edge)
+        output = encode_image(image, codec, quality)
+
+        metadata = read_shot_metadata(path.name)
+        metadata.update(codec=codec, width=image.shape[1], height=image.shape[0])
+        kept_original = ORIGINALS_DIR / path.name
+        if kept_original.exists():
+            write_shot_original(target.name, kept_original.read_bytes())
+            metadata["original"] = True
+        elif keep_original:
+            write_shot_original(target.name, data)
+            metadata["original"] = True
+        write_shot_metadata(target.name, metadata)
+        write_file_atomic(target, output)
+
+        path.unlink()
+        shot_index.rename(path.name, target.name)
+        remove_shot_sidecars(path.name)
+        shot_hashes.remove(path.name)
+    except OSError as e:
+        logger.warning(f"迁移截图 {path.name} 失败: {str(e)}")
+        return None
+    return len(data) - len(output)
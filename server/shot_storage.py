@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+截图存储模块
+高清截图（经 shot_pipeline 处理后）写入 shots 目录，写盘在线程池中执行；
+截图的附加信息（质量评分等）写入 shots/.meta 下的同名 JSON 文件，
+页面规整或转码前的原图保存在 shots/.originals 下的同名文件
+"""
+import os
+import time
+import json
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+from image_header import read_image_header, FORMAT_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+# 截图目录
+SHOTS_DIR = Path(__file__).parent / "shots"
+SHOTS_DIR.mkdir(exist_ok=True)
+# 截图元数据目录
+META_DIR = SHOTS_DIR / ".meta"
+# 页面规整前的原图目录
+ORIGINALS_DIR = SHOTS_DIR / ".originals"
+
+# 写盘线程池
+_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="shot-writer")
+# 元数据写入锁：手部扫描、哈希补算等线程会同时读-改-写同一张截图的元数据
+_metadata_lock = threading.RLock()
+
+
+def write_file_atomic(path: Path, data) -> None:
+    """先写临时文件再重命名，避免读取方看到写了一半的文件"""
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def try_reserve_shot_path(path: Path) -> bool:
+    """以空文件占位（O_EXCL），文件已存在时返回 False"""
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    os.close(fd)
+    return True
+
+
+def reserve_shot_path(make_name: Callable[[int], str]) -> Path:
+    """
+    选一个不存在的文件名并以空文件占位
+
+    选名和占位是同一个原子操作，多个写盘线程（或其他进程）同一毫秒保存时不会选中同一个文件名。
+    调用方随后用原子重命名覆盖占位文件，失败时调用 release_shot_path；ShotIndex 不收录空文件。
+
+    参数:
+        make_name: 由毫秒时间戳生成文件名，重名时时间戳加一重试
+    """
+    timestamp_ms = int(time.time() * 1000)
+    while True:
+        path = SHOTS_DIR / make_name(timestamp_ms)
+        if try_reserve_shot_path(path):
+            return path
+        timestamp_ms += 1
+
+
+def release_shot_path(path: Path) -> None:
+    """删除尚未写入内容的占位文件"""
+    try:
+        if path.stat().st_size == 0:
+            path.unlink()
+    except OSError:
+        pass
+
+
+def _meta_path(filename: str) -> Path:
+    return META_DIR / f"{filename}.json"
+
+
+def write_shot_metadata(filename: str, metadata: dict) -> None:
+    """写入截图元数据"""
+    with _metadata_lock:
+        META_DIR.mkdir(exist_ok=True)
+        write_file_atomic(_meta_path(filename), json.dumps(metadata, ensure_ascii=False).encode("utf-8"))
+
+
+def update_shot_metadata(filename: str, changes: dict) -> None:
+    """在锁内把 changes 合并进截图元数据；截图已被删除时不写入，避免留下孤立的元数据"""
+    with _metadata_lock:
+        if not (SHOTS_DIR / filename).exists():
+            return
+        metadata = read_shot_metadata(filename)
+        metadata.update(changes)
+        write_shot_metadata(filename, metadata)
+
+
+def read_shot_metadata(filename: str) -> dict:
+    """读取截图元数据，没有时返回空字典"""
+    try:
+        return json.loads(_meta_path(filename).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def write_shot_original(filename: str, data) -> None:
+    """保存页面规整 / 转码前的原图"""
+    ORIGINALS_DIR.mkdir(exist_ok=True)
+    write_file_atomic(ORIGINALS_DIR / filename, data)
+
+
+def remove_shot_sidecars(filename: str) -> None:
+    """删除截图的元数据和原图（截图被删除或替换时调用）"""
+    with _metadata_lock:
+        _meta_path(filename).unlink(missing_ok=True)
+    (ORIGINALS_DIR / filename).unlink(missing_ok=True)
+
+
+def save_shot_sync(data, metadata: Optional[dict] = None, original=None) -> Path:
+    """
+    保存一张高清截图（同步版本），扩展名按图像格式确定
+
+    参数:
+        data: 图像字节
+        metadata: 截图元数据，写入 shots/.meta
+        original: 页面规整 / 转码前的原图字节，写入 shots/.originals
+
+    返回:
+        保存后的文件路径
+    """
+    header = read_image_header(data)
+    if header is None:
+        raise ValueError("无法识别的截图格式")
+
+    # 文件名以毫秒时间戳开头
+    ext = FORMAT_EXTENSIONS[header.format]
+    path = reserve_shot_path(lambda timestamp_ms: f"{timestamp_ms}_shot{ext}")
+    try:
+        # 先写元数据和原图，列表中出现截图时它们已就绪
+        if original is not None:
+            write_shot_original(path.name, original)
+            metadata = {**(metadata or {}), "original": True}
+        if metadata:
+            write_shot_metadata(path.name, metadata)
+        write_file_atomic(path, data)
+    except BaseException:
+        release_shot_path(path)
+        raise
+    return path
+
+
+async def save_shot(data, metadata: Optional[dict] = None, original=None) -> Path:
+    """保存一张高清截图，写盘在线程池中执行，不阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_writer, save_shot_sync, data, metadata, original)
@@ -0,0 +1,63 @@
+"""
+测试公共配置
+server 下的模块按顶层模块导入，测试时把 server 目录加入 sys.path；
+shots_dir 把截图目录、索引、哈希索引和缩略图缓存都指向临时目录，测试不会改动真实的 shots 目录
+"""
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_image(value: int = 128, size=(120, 160), ext: str = ".png") -> bytes:
+    """生成一张纯色测试图片（不同 value 的图片 dHash 不同时用渐变区分）"""
+    image = np.full((size[0], size[1], 3), value, np.uint8)
+    image[:, : size[1] // 2] = (value * 7) % 256
+    return cv2.imencode(ext, image)[1].tobytes()
+
+
+@pytest.fixture
+def shots_dir(tmp_path, monkeypatch):
+    """临时截图目录，返回 (目录, ShotIndex)"""
+    import shot_storage
+    import shot_index as shot_index_module
+    import shot_hash
+    import hand_scan
+    import shot_pipeline
+    import upload_stream
+    import image_processing
+    import video_ingest
+    import thumbnails
+    from page_manifest import PageManifest
+    from thumbnails import ThumbnailCache
+
+    directory = tmp_path / "shots"
+    directory.mkdir()
+    monkeypatch.setattr(shot_storage, "SHOTS_DIR", directory)
+    monkeypatch.setattr(shot_storage, "META_DIR", directory / ".meta")
+    monkeypatch.setattr(shot_storage, "ORIGINALS_DIR", directory / ".originals")
+    monkeypatch.setattr(shot_index_module, "SHOTS_DIR", directory)
+    monkeypatch.setattr(shot_pipeline, "SHOTS_DIR", directory)
+    monkeypatch.setattr(shot_pipeline, "ORIGINALS_DIR", directory / ".originals")
+    monkeypatch.setattr(upload_stream, "UPLOAD_STAGING_DIR", directory / ".uploads")
+    monkeypatch.setattr(image_processing, "SHOTS_DIR", directory)
+    monkeypatch.setattr(hand_scan, "SHOTS_DIR", directory)
+    monkeypatch.setattr(thumbnails, "SHOTS_DIR", directory)
+
+    index = shot_index_module.ShotIndex(directory, poll_interval=0,
+                                        manifest=PageManifest(directory / ".manifest.sqlite3"))
+    for module in (shot_index_module, shot_hash, shot_pipeline, image_processing, video_ingest, thumbnails):
+        monkeypatch.setattr(module, "shot_index", index)
+    hashes = shot_hash.ShotHashIndex(directory)
+    for module in (shot_hash, shot_pipeline, image_processing, video_ingest):
+        monkeypatch.setattr(module, "shot_hashes", hashes)
+    cache = ThumbnailCache(tmp_path / "thumbs")
+    for module in (image_processing, thumbnails):
+        monkeypatch.setattr(module, "thumbnail_cache", cache)
+
+    yield directory, index
+    index.manifest.close()
@@ -0,0 +1,140 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import image_processing
+import upload_stream
+
+from conftest import make_image
+
+
+@pytest.fixture
+def client(shots_dir):
+    app = FastAPI()
+    app.include_router(image_processing.router)
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def pages(shots_dir):
+    """三张截图，页码顺序 c, b, a"""
+    directory, index = shots_dir
+    for value, name in enumerate(["a.png", "b.png", "c.png"]):
+        (directory / name).write_bytes(make_image(40 + value * 60))
+    assert index.names() == ["c.png", "b.png", "a.png"]
+    return directory, index
+
+
+def batch(client, version, operations, files=()):
+    return client.post("/images/batch",
+                       data={"version": version, "operations": json.dumps(operations)},
+                       files=[("files", (name, data, "image/png")) for name, data in files])
+
+
+def snapshot(directory):
+    return {path.name: path.read_bytes() for path in directory.iterdir() if path.is_file()}
+
+
+def test_batch_applies_operations_against_snapshot_pages(client, pages):
+    directory, index = pages
+    response = batch(client, index.token, [
+        {"op": "delete", "page": 1},
+        {"op": "move", "page": 3, "after": 0},
+        {"op": "insert", "after": 2, "file": 0},
+    ], files=[("new.png", make_image(250))])
+    assert response.status_code == 200, response.text
+
+    body = response.json()
+    inserted = body["inserted"]
+    assert len(inserted) == 1
+    assert body["images"] == ["a.png", "b.png", inserted[0]]
+    assert body["version"] == index.token
+    assert index.names() == body["images"]
+    assert not (directory / "c.png").exists()
+    assert (directory / inserted[0]).exists()
+
+
+def test_batch_replace_keeps_page(client, pages):
+    directory, index = pages
+    old = (directory / "b.png").read_bytes()
+    response = batch(client, index.token, [{"op": "replace", "page": 2, "file": 0}],
+                     files=[("new.png", make_image(250))])
+    assert response.status_code == 200, response.text
+
+    images = response.json()["images"]
+    assert images[0] == "c.png" and images[2] == "a.png"
+    assert images[1].startswith("b.")
+    assert (directory / images[1]).read_bytes() != old
+
+
+def test_stale_version_is_rejected(client, pages):
+    directory, index = pages
+    before = snapshot(directory)
+    response = batch(client, "stale", [{"op": "delete", "page": 1}])
+    assert response.status_code == 409
+    assert response.headers[image_processing.VERSION_HEADER] == index.token
+    assert snapshot(directory) == before
+
+
+@pytest.mark.parametrize("operations", [
+    [{"op": "rotate", "page": 1}],
+    [{"op": "delete", "page": 4}],
+    [{"op": "delete", "page": 1}, {"op": "move", "page": 1, "after": 0}],
+    [{"op": "move", "page": 2, "after": 2}],
+    [{"op": "insert", "after": 0, "file": 0}],
+])
+def test_invalid_operations_change_nothing(client, pages, operations):
+    directory, index = pages
+    before, token = snapshot(directory), index.token
+    response = batch(client, token, operations)
+    assert response.status_code == 400
+    assert snapshot(directory) == before
+    assert index.token == token
+
+
+def test_failed_commit_rolls_back_files(client, pages, monkeypatch):
+    directory, index = pages
+    before, token = snapshot(directory), index.token
+
+    def fail(self, path):
+        raise OSError("磁盘错误")
+
+    # 替换已完成、删除时失败：替换也要撤销
+    monkeypatch.setattr(upload_stream.FileTransaction, "remove", fail)
+    response = batch(client, token, [
+        {"op": "replace", "page": 1, "file": 0},
+        {"op": "delete", "page": 2},
+    ], files=[("new.png", make_image(250))])
+    assert response.status_code == 500
+
+    assert snapshot(directory) == before
+    assert index.names() == ["c.png", "b.png", "a.png"]
+    assert index.token == token
+    assert not any((directory / ".uploads").iterdir())
+
+
+def test_failed_insert_releases_reserved_names(client, pages, monkeypatch):
+    directory, index = pages
+    before, token = snapshot(directory), index.token
+    put = upload_stream.FileTransaction.put
+    calls = []
+
+    def fail_second(self, staged_path, dest):
+        calls.append(dest)
+        if len(calls) == 2:
+            raise OSError("磁盘错误")
+        put(self, staged_path, dest)
+
+    # 第一个插入已写入、第二个插入的文件名已占位时失败：两个占位文件都要删除
+    monkeypatch.setattr(upload_stream.FileTransaction, "put", fail_second)
+    response = batch(client, token, [
+        {"op": "insert", "after": 0, "file": 0},
+        {"op": "insert", "after": 0, "file": 1},
+    ], files=[("x.png", make_image(250)), ("y.png", make_image(10))])
+    assert response.status_code == 500
+    assert len(calls) == 2
+    assert snapshot(directory) == before
+    assert index.names() == ["c.png", "b.png", "a.png"]
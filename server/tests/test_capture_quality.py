@@ -0,0 +1,34 @@
+import cv2
+import numpy as np
+
+from capture_quality import measure_quality, select_best_frame
+
+
+def page(blur=0, value_range=(60, 200)):
+    """有文字状纹理的页面；blur 为高斯模糊核大小，value_range 控制亮度范围"""
+    rng = np.random.default_rng(0)
+    low, high = value_range
+    image = rng.integers(low, high, (480, 640), dtype=np.uint8)
+    if blur:
+        image = cv2.GaussianBlur(image, (blur, blur), 0)
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+def test_sharpest_frame_wins():
+    candidates = [page(blur=9), page(), page(blur=5)]
+    best, qualities = select_best_frame(candidates)
+    assert best == 1
+    assert qualities[1].sharpness > qualities[2].sharpness > qualities[0].sharpness
+
+
+def test_clipped_exposure_lowers_score():
+    quality = measure_quality(page(value_range=(0, 256)))
+    assert quality.clipped_ratio > 0.02
+    assert quality.score < quality.sharpness
+    assert measure_quality(page()).clipped_ratio == 0.0
+
+
+def test_undecodable_candidates_are_skipped():
+    best, qualities = select_best_frame([b"broken", page(blur=5)])
+    assert best == 1 and qualities[0] is None
+    assert select_best_frame([b"broken"]) == (-1, [None])
@@ -0,0 +1,72 @@
+from capture_trigger import CaptureTrigger, EVENT_HAND_DETECTED, EVENT_HAND_LEFT, EVENT_CAPTURE
+
+
+def make_trigger(**kwargs):
+    options = dict(hysteresis_frames=3, stable_threshold=2.0, stable_frames=2, timeout=2.0)
+    options.update(kwargs)
+    return CaptureTrigger(**options)
+
+
+def run(trigger, frames):
+    """依次输入 (has_hand, motion, now)，返回每帧的事件"""
+    return [trigger.update(has_hand, motion, now) for has_hand, motion, now in frames]
+
+
+def test_waits_for_hand():
+    trigger = make_trigger()
+    assert run(trigger, [(False, 0.0, 0.0), (False, None, 0.1)]) == [None, None]
+    assert trigger.state == CaptureTrigger.WAIT_HAND
+
+
+def test_hand_left_after_hysteresis_then_capture_when_stable():
+    trigger = make_trigger()
+    events = run(trigger, [
+        (True, 10.0, 0.0),
+        (False, 10.0, 0.1),
+        (False, 10.0, 0.2),
+        (False, 10.0, 0.3),  # 第 3 帧无手：手离开
+        (False, 5.0, 0.4),   # 画面仍在动
+        (False, 1.0, 0.5),
+        (False, 1.0, 0.6),   # 连续 2 帧静止：截图
+    ])
+    assert events == [EVENT_HAND_DETECTED, None, None, EVENT_HAND_LEFT, None, None, EVENT_CAPTURE]
+    assert trigger.state == CaptureTrigger.WAIT_HAND
+
+
+def test_single_missed_frame_does_not_count_as_leaving():
+    trigger = make_trigger()
+    events = run(trigger, [
+        (True, None, 0.0),
+        (False, None, 0.1),
+        (False, None, 0.2),
+        (True, None, 0.3),   # 检测抖动，重新计数
+        (False, None, 0.4),
+        (False, None, 0.5),
+    ])
+    assert EVENT_HAND_LEFT not in events
+    assert trigger.state == CaptureTrigger.HAND_ON
+
+
+def test_timeout_captures_even_if_page_keeps_moving():
+    trigger = make_trigger(hysteresis_frames=1)
+    run(trigger, [(True, None, 0.0), (False, None, 1.0)])
+    assert trigger.update(False, 50.0, 2.9) is None
+    assert trigger.update(False, 50.0, 3.0) == EVENT_CAPTURE
+
+
+def test_unknown_motion_is_not_stable():
+    trigger = make_trigger(hysteresis_frames=1)
+    run(trigger, [(True, None, 0.0), (False, None, 0.0)])
+    assert run(trigger, [(False, None, 0.1), (False, None, 0.2), (False, None, 0.3)]) == [None, None, None]
+    assert trigger.state == CaptureTrigger.SETTLING
+
+
+def test_hand_returning_while_settling_cancels_capture():
+    trigger = make_trigger(hysteresis_frames=1)
+    run(trigger, [(True, None, 0.0), (False, None, 0.1), (False, 1.0, 0.2)])
+    assert trigger.update(True, 1.0, 0.3) is None
+    assert trigger.state == CaptureTrigger.HAND_ON
+    # 再次离开时重新计时和计数静止帧
+    assert trigger.update(False, 1.0, 5.0) == EVENT_HAND_LEFT
+    assert trigger.update(False, 1.0, 5.1) is None
+    assert trigger.update(False, 1.0, 5.2) == EVENT_CAPTURE
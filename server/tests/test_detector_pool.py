@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+import pytest
+
+from detector_pool import DetectorPool, FrameResult
+from hand_detection import DEFAULT_PROFILE
+
+
+class FakeDetector:
+    def __init__(self):
+        self.busy = False
+        self.reset_while_busy = False
+        self.resets = 0
+
+    def reset(self):
+        self.reset_while_busy |= self.busy
+        self.resets += 1
+
+
+class BlockingPipeline:
+    """process 阻塞到测试放行，模拟连接断开时仍在检测的帧"""
+    def __init__(self):
+        self.detector = FakeDetector()
+        self.profile = DEFAULT_PROFILE
+        self.started = threading.Event()
+        self.proceed = threading.Event()
+
+    def process(self, data):
+        self.detector.busy = True
+        self.started.set()
+        self.proceed.wait(5)
+        self.detector.busy = False
+        return FrameResult(True, 0.0)
+
+
+def test_release_waits_for_in_flight_frame():
+    pool = DetectorPool(max_workers=2, idle_max=2)
+    pipeline = BlockingPipeline()
+
+    async def scenario():
+        session = pool._register(pipeline)
+        task = asyncio.ensure_future(session.process(b"frame"))
+        await asyncio.get_running_loop().run_in_executor(None, pipeline.started.wait, 5)
+        # 连接断开：等待结果的协程被取消，检测仍在工作线程中进行
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        pool.release(session)
+        assert pool._idle == []
+
+        pipeline.proceed.set()
+        await asyncio.get_running_loop().run_in_executor(None, pool.executor.shutdown, True)
+
+    asyncio.run(scenario())
+    assert pool._idle == [(DEFAULT_PROFILE, pipeline.detector)]
+    assert pipeline.detector.resets == 1
+    assert not pipeline.detector.reset_while_busy
+
+
+def test_release_recycles_idle_detector_immediately():
+    pool = DetectorPool(max_workers=1, idle_max=1)
+    pipeline = BlockingPipeline()
+    pipeline.proceed.set()
+
+    async def scenario():
+        session = pool._register(pipeline)
+        assert (await session.process(b"frame")).has_hand
+        pool.release(session)
+
+    asyncio.run(scenario())
+    assert pool._idle == [(DEFAULT_PROFILE, pipeline.detector)]
+    pool.shutdown()
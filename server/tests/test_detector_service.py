@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+import detector_service
+from detector_pool import FrameResult
+from detector_service import ProcessDetectorPool
+
+
+class FakeWorker:
+    """代替工作进程的请求队列，记录收到的消息，由测试决定何时返回结果"""
+    def __init__(self):
+        self.messages = []
+
+    def put(self, message):
+        self.messages.append(message)
+
+    def frames(self):
+        return [message for message in self.messages if message[0] == "frame"]
+
+
+def make_pool(monkeypatch):
+    monkeypatch.setattr(detector_service, "DETECTOR_RESULT_TIMEOUT", 0.05)
+    pool = ProcessDetectorPool(workers=1)
+    pool._loop = asyncio.get_running_loop()
+    worker = FakeWorker()
+    pool._queues = [worker]
+    pool._processes = [object()]
+    return pool, worker
+
+
+def test_timed_out_frame_keeps_buffer_until_result_returns(monkeypatch):
+    async def scenario():
+        pool, worker = make_pool(monkeypatch)
+        session = await pool.open_session()
+        handle = session.handle
+
+        with pytest.raises(ValueError, match="超时"):
+            await pool.submit(session, b"first")
+        # 工作进程可能仍在读取第一帧：第二帧不能覆盖共享内存
+        with pytest.raises(ValueError, match="仍在检测"):
+            await pool.submit(session, b"second")
+        assert bytes(handle.shm.buf[:5]) == b"first"
+        assert len(worker.frames()) == 1
+
+        # 迟到的结果只属于第一帧，之后可以继续提交
+        request_id = worker.frames()[0][2]
+        pool._resolve(request_id, FrameResult(True, 1.0), None)
+        assert not pool._pending
+        task = asyncio.ensure_future(pool.submit(session, b"third"))
+        await asyncio.sleep(0)
+        assert bytes(handle.shm.buf[:5]) == b"third"
+        pool._resolve(worker.frames()[1][2], FrameResult(False, 0.5), None)
+        assert await task == FrameResult(False, 0.5)
+        assert not pool._pending
+        pool.release(session)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_submit_does_not_leak_pending(monkeypatch):
+    async def scenario():
+        pool, worker = make_pool(monkeypatch)
+        session = await pool.open_session()
+        task = asyncio.ensure_future(pool.submit(session, b"frame"))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # 连接断开后释放会话，未返回的请求随之移除
+        pool.release(session)
+        assert not pool._pending
+        assert worker.messages[-1] == ("close", session.handle.session_id)
+        # 迟到的结果被忽略
+        pool._resolve(worker.frames()[0][2], FrameResult(True, 1.0), None)
+
+    asyncio.run(scenario())
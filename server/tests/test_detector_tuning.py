@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import detector_tuning
+from hand_detection import DETECTOR_PROFILES
+
+from conftest import make_image
+
+
+def decoded_size(data):
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR).shape[:2]
+
+
+def test_profiles_have_distinct_input_sizes():
+    sizes = [profile.input_size for profile in DETECTOR_PROFILES.values()]
+    assert len(set(sizes)) == len(sizes)
+
+
+def test_samples_skip_undecodable_files(tmp_path):
+    (tmp_path / "broken.jpg").write_bytes(b"not an image")
+    (tmp_path / "page.png").write_bytes(make_image(size=(1080, 1920)))
+    samples = detector_tuning.load_sample_frames(str(tmp_path))
+    assert len(samples) == 1
+    assert max(decoded_size(samples[0])) == detector_tuning._SAMPLE_SIZE
+
+
+def test_each_profile_is_benchmarked_at_its_stream_size(monkeypatch):
+    measured = {}
+
+    def fake_benchmark(profile, samples):
+        measured[profile.name] = {max(decoded_size(data)) for data in samples}
+        return 100.0 if profile.name != "fast" else 10.0
+
+    monkeypatch.setattr(detector_tuning, "benchmark_profile", fake_benchmark)
+    samples = [b"garbage", make_image(size=(720, 1280), ext=".jpg")]
+    assert detector_tuning.autotune_profile(20.0, samples).name == "fast"
+    # 按准确度从高到低测试，满足目标后停止
+    assert list(measured) == ["accurate", "balanced", "fast"]
+    for name, sizes in measured.items():
+        assert sizes == {DETECTOR_PROFILES[name].input_size}
+
+
+def test_fastest_profile_when_none_meets_target(monkeypatch):
+    timings = {"accurate": 90.0, "balanced": 60.0, "fast": 40.0, "minimal": 45.0}
+    monkeypatch.setattr(detector_tuning, "benchmark_profile", lambda profile, samples: timings[profile.name])
+    assert detector_tuning.autotune_profile(10.0, [make_image()]).name == "fast"
+
+
+def test_detection_size_overrides_every_profile():
+    server = Path(__file__).resolve().parent.parent
+    code = "from hand_detection import DETECTOR_PROFILES as p; print(sorted({x.input_size for x in p.values()}))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=server, capture_output=True, text=True,
+                            env={**os.environ, "DETECTION_SIZE": "200"}, check=True).stdout
+    assert output.strip().splitlines()[-1] == "[200]"
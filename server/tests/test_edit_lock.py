@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import time
+
+import httpx
+from fastapi import FastAPI
+
+import image_processing
+
+from conftest import make_image
+
+
+def test_edit_lock_follows_the_running_loop():
+    async def get_lock():
+        return image_processing.edit_lock()
+
+    async def same_loop():
+        return image_processing.edit_lock() is image_processing.edit_lock()
+
+    assert asyncio.run(same_loop())
+    # 每个事件循环（如 uvicorn 启动的循环）使用自己的锁，不会沿用导入模块时或上一个循环的锁
+    assert asyncio.run(get_lock()) is not asyncio.run(get_lock())
+
+
+def test_overlapping_edits_are_serialized(shots_dir, monkeypatch):
+    directory, index = shots_dir
+    for name in ["a.png", "b.png", "c.png"]:
+        (directory / name).write_bytes(make_image())
+    index.names()
+
+    spans = []
+    spans_lock = threading.Lock()
+    move = index.move
+
+    def slow_move(page, to):
+        started = time.monotonic()
+        time.sleep(0.1)
+        name = move(page, to)
+        with spans_lock:
+            spans.append((started, time.monotonic()))
+        return name
+
+    monkeypatch.setattr(index, "move", slow_move)
+    app = FastAPI()
+    app.include_router(image_processing.router)
+
+    async def edit_twice():
+        # 模拟 ssl_main：先在另一个事件循环中用过锁，再在服务的事件循环中争用
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(client.post("/images/move/1", params={"to": 3}),
+                                        client.post("/images/move/1", params={"to": 3}))
+
+    asyncio.run(edit_twice())
+    responses = asyncio.run(edit_twice())
+    assert [response.status_code for response in responses] == [200, 200]
+    spans.sort()
+    assert all(end <= next_start for (_, end), (next_start, _) in zip(spans, spans[1:]))
+    assert len(spans) == 4
@@ -0,0 +1,147 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+from frame_ingest import FrameIngest
+from hd_ring import HdFrameRing
+from ws_protocol import FrameHeader, pack_frame, MSG_DETECT, MSG_HD, PIXEL_GRAY8
+
+
+class FakeWebSocket:
+    """按测试放入的顺序返回消息，记录发出的 JSON"""
+    def __init__(self):
+        self.incoming = asyncio.Queue()
+        self.sent = []
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+    def text(self, data):
+        self.incoming.put_nowait({"type": "websocket.receive", "text": json.dumps(data)})
+
+    def binary(self, data):
+        self.incoming.put_nowait({"type": "websocket.receive", "bytes": data})
+
+
+def detect(seq, payload=b"jpeg", **fields):
+    return pack_frame(FrameHeader(MSG_DETECT, seq, float(seq), **fields), payload)
+
+
+def hd(timestamp, payload):
+    return pack_frame(FrameHeader(MSG_HD, 0, timestamp), payload)
+
+
+async def start(framed=True):
+    websocket = FakeWebSocket()
+    ingest = FrameIngest(websocket, detect_size=320)
+    reader = asyncio.ensure_future(ingest.run())
+    if framed:
+        websocket.text({"type": "hello", "formats": ["jpeg", "gray8"]})
+    return websocket, ingest, reader
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_ring_returns_frames_after_hand_left():
+    async def scenario():
+        ring = HdFrameRing(size=3)
+        for timestamp in (1.0, 2.0, 3.0, 4.0):
+            ring.push(timestamp, f"hd{timestamp:.0f}".encode())
+        assert [frame.data for frame in ring.frames_after(3.0)] == [b"hd3", b"hd4"]
+
+        waiter = asyncio.ensure_future(ring.wait_frames_after(5.0, timeout=1.0))
+        await asyncio.sleep(0.01)
+        ring.push(5.0, b"hd5")
+        assert [frame.data for frame in await waiter] == [b"hd5"]
+        assert await ring.wait_frames_after(9.0, timeout=0.01) == []
+
+    asyncio.run(scenario())
+
+
+def test_hd_messages_fill_the_ring():
+    async def scenario():
+        websocket, ingest, reader = await start()
+        websocket.binary(detect(1))
+        websocket.binary(hd(1.5, b"hd"))
+        await settle()
+        assert websocket.sent[0]["detect_size"] == 320
+        assert await ingest.next_frame() == detect(1)
+        assert [frame.data for frame in ingest.hd_ring.frames_after(1.0)] == [b"hd"]
+        reader.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_hd_request_times_out_and_falls_back():
+    async def scenario():
+        websocket, ingest, reader = await start()
+        assert ingest.fallback_frames() == ("preview", [])
+        websocket.binary(detect(1, b"preview"))
+        await settle()
+
+        with pytest.raises(asyncio.TimeoutError):
+            await ingest.next_hd_frame(timeout=0.01)
+        assert ingest._hd_waiter is None
+        # 缓冲区为空时用最近的检测帧（去掉帧头）
+        assert ingest.fallback_frames() == ("preview", [b"preview"])
+
+        websocket.binary(hd(2.0, b"hd"))
+        await settle()
+        assert ingest.fallback_frames() == ("ring", [b"hd"])
+        reader.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_raw_preview_frame_is_not_a_fallback():
+    async def scenario():
+        websocket, ingest, reader = await start()
+        websocket.binary(detect(1, bytes(4 * 2), pixel_format=PIXEL_GRAY8, width=4, height=2))
+        await settle()
+        assert ingest.fallback_frames() == ("preview", [])
+        reader.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_legacy_client_hd_frame_is_next_binary_message():
+    async def scenario():
+        websocket, ingest, reader = await start(framed=False)
+        waiter = asyncio.ensure_future(ingest.next_hd_frame(timeout=1.0))
+        await settle()
+        websocket.binary(b"legacy-hd")
+        assert await waiter == b"legacy-hd"
+
+        websocket.binary(b"legacy-preview")
+        await settle()
+        assert ingest.fallback_frames() == ("preview", [b"legacy-preview"])
+        reader.cancel()
+
+    asyncio.run(scenario())
+
+
+def test_latest_frame_wins():
+    async def scenario():
+        websocket, ingest, reader = await start()
+        for seq in (1, 2, 3):
+            websocket.binary(detect(seq))
+        websocket.binary(detect(2))  # 乱序到达的旧帧
+        await settle()
+        assert await ingest.next_frame() == detect(3)
+        assert ingest.header.seq == 3
+        assert (ingest.received, ingest.dropped) == (3, 3)
+
+        websocket.incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        with pytest.raises(WebSocketDisconnect):
+            await ingest.next_frame()
+        await reader
+
+    asyncio.run(scenario())
@@ -0,0 +1,33 @@
+from capture_trigger import CaptureTrigger
+from frame_rate import FrameRateController, rate_message
+
+
+def controller():
+    rate = FrameRateController(idle_fps=2, active_fps=10, idle_delay=5, wake_motion=4.0, hd_stream_fps=2)
+    rate.last_active = 0.0
+    return rate
+
+
+def test_drops_to_idle_after_quiet_delay():
+    rate = controller()
+    assert rate.update(CaptureTrigger.WAIT_HAND, 0.5, now=3.0) is None
+    assert rate.update(CaptureTrigger.WAIT_HAND, 0.5, now=5.0) == rate_message(2, 0)
+    assert rate.update(CaptureTrigger.WAIT_HAND, 0.5, now=6.0) is None
+
+
+def test_motion_wakes_immediately():
+    rate = controller()
+    rate.update(CaptureTrigger.WAIT_HAND, 0.0, now=10.0)
+    assert rate.update(CaptureTrigger.WAIT_HAND, 6.0, now=11.0) == rate_message(10, 0)
+    # 唤醒后重新计时
+    assert rate.update(CaptureTrigger.WAIT_HAND, 0.0, now=15.0) is None
+    assert rate.update(CaptureTrigger.WAIT_HAND, 0.0, now=16.0) == rate_message(2, 0)
+
+
+def test_hd_stream_runs_until_capture_finishes():
+    rate = controller()
+    assert rate.update(CaptureTrigger.HAND_ON, None, now=1.0) == rate_message(10, 2)
+    assert rate.update(CaptureTrigger.SETTLING, 0.0, now=2.0) is None
+    # 截图已触发但仍在等待高清帧：保持推流
+    assert rate.update(CaptureTrigger.WAIT_HAND, 0.0, now=3.0, capture_pending=True) is None
+    assert rate.update(CaptureTrigger.WAIT_HAND, 0.0, now=4.0) == rate_message(10, 0)
@@ -0,0 +1,48 @@
+import numpy as np
+
+from hand_roi import RoiLearner
+
+FRAME = (240, 320, 3)
+
+
+def hand_at(x, y, size=30):
+    """以 (x, y) 为左上角的手部关键点"""
+    return np.array([[x, y], [x + size, y], [x, y + size], [x + size, y + size]], np.float32)
+
+
+def trained(**kwargs) -> RoiLearner:
+    learner = RoiLearner(margin=0.05, min_observations=3, **kwargs)
+    for _ in range(3):
+        learner.observe(hand_at(20, 20), FRAME)
+    return learner
+
+
+def test_region_learned_after_min_observations():
+    learner = RoiLearner(full_frame_interval=100, margin=0.05, min_observations=3)
+    learner.observe(hand_at(20, 20), FRAME)
+    assert learner.region_for(FRAME) is None
+
+    learner = trained(full_frame_interval=100)
+    x0, y0, x1, y1 = learner.region_for(FRAME)
+    assert x0 <= 20 and y0 <= 20 and x1 >= 50 and y1 >= 50
+    assert (x1 - x0) * (y1 - y0) < FRAME[0] * FRAME[1] / 4
+
+
+def test_periodic_full_frame_detection():
+    learner = trained(full_frame_interval=3)
+    regions = [learner.region_for(FRAME) for _ in range(6)]
+    assert [region is None for region in regions] == [False, False, True, False, False, True]
+
+
+def test_motion_outside_region_uses_full_frame():
+    learner = trained(full_frame_interval=100)
+    mask = np.zeros((24, 32), bool)
+    mask[2:4, 2:4] = True
+    assert learner.region_for(FRAME, mask) is not None
+    mask[20, 30] = True
+    assert learner.region_for(FRAME, mask) is None
+
+
+def test_zero_interval_always_full_frame():
+    learner = trained(full_frame_interval=0)
+    assert [learner.region_for(FRAME) for _ in range(3)] == [None, None, None]
@@ -0,0 +1,77 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import hand_scan
+import shot_storage
+from shot_storage import read_shot_metadata, update_shot_metadata, write_shot_metadata
+
+from conftest import make_image
+
+
+class InlinePool(ThreadPoolExecutor):
+    """代替检测进程池，在线程中执行替换后的 _scan_file"""
+    def __init__(self, max_workers, mp_context=None, initializer=None, initargs=()):
+        super().__init__(max_workers=max_workers)
+
+
+def fake_scan(monkeypatch, hands):
+    scanned = []
+
+    def scan_file(path):
+        name = path.rsplit("/", 1)[-1]
+        scanned.append(name)
+        return {"hand": name in hands, "bbox": [0, 0, 1, 1] if name in hands else None}
+
+    monkeypatch.setattr(hand_scan, "ProcessPoolExecutor", InlinePool)
+    monkeypatch.setattr(hand_scan, "_scan_file", scan_file)
+    return scanned
+
+
+def test_results_cached_until_file_changes(shots_dir, monkeypatch):
+    directory, _ = shots_dir
+    for value, name in enumerate(["a.png", "b.png", "c.png"]):
+        (directory / name).write_bytes(make_image(value * 40))
+    scanned = fake_scan(monkeypatch, hands={"b.png"})
+
+    report = hand_scan.scan_shots(["a.png", "b.png", "c.png", "d.mp4"], workers=2)
+    assert report["detected"] == 3
+    assert report["flagged"] == [{"page": 2, "filename": "b.png", "bbox": [0, 0, 1, 1]}]
+
+    scanned.clear()
+    (directory / "c.png").write_bytes(make_image(200))
+    report = hand_scan.scan_shots(["a.png", "b.png", "c.png"], workers=2)
+    assert scanned == ["c.png"]
+    assert (report["detected"], report["cached"]) == (1, 2)
+    assert [item["filename"] for item in report["flagged"]] == ["b.png"]
+
+
+def test_concurrent_metadata_updates_keep_every_field(shots_dir, monkeypatch):
+    directory, _ = shots_dir
+    (directory / "a.png").write_bytes(make_image())
+    write_shot_metadata("a.png", {"quality": 1})
+
+    # 读取后稍作停顿，放大读-改-写之间的窗口
+    read = shot_storage.read_shot_metadata
+    barrier = threading.Barrier(2, timeout=0.2)
+
+    def slow_read(filename):
+        metadata = read(filename)
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            pass
+        return metadata
+
+    monkeypatch.setattr(shot_storage, "read_shot_metadata", slow_read)
+    threads = [threading.Thread(target=update_shot_metadata, args=("a.png", {key: True}))
+               for key in ("hand_scan", "dhash")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert read_shot_metadata("a.png") == {"quality": 1, "hand_scan": True, "dhash": True}
+
+
+def test_update_skips_deleted_shot(shots_dir):
+    update_shot_metadata("gone.png", {"hand_scan": {"hand": False}})
+    assert read_shot_metadata("gone.png") == {}
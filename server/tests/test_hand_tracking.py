@@ -0,0 +1,51 @@
+import cv2
+import numpy as np
+
+from hand_detection import HandTracker, HybridHandDetector
+
+HAND = np.array([[80, 60], [160, 60], [160, 140], [80, 140]], np.float32)
+
+
+def textured(shift=0):
+    """有纹理的灰度画面，shift 为整体平移的像素数"""
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 256, (60, 80), dtype=np.uint8)
+    gray = cv2.resize(noise, (320, 240), interpolation=cv2.INTER_LINEAR)
+    return np.roll(gray, shift, axis=1)
+
+
+class CountingDetector:
+    def __init__(self, landmarks=HAND):
+        self.calls = 0
+        self.landmarks = landmarks
+
+    def detect_landmarks(self, image, region=None):
+        self.calls += 1
+        return self.landmarks
+
+
+def test_tracker_follows_motion_and_loses_blank_frame():
+    tracker = HandTracker()
+    tracker.start(textured(), HAND)
+    assert tracker.active
+    assert tracker.update(textured(shift=2))
+    assert tracker.update(textured(shift=4))
+    assert not tracker.update(np.zeros((240, 320), np.uint8))
+    assert not tracker.active
+
+
+def test_hybrid_redetects_every_interval():
+    detector = CountingDetector()
+    hybrid = HybridHandDetector(detector, redetect_interval=3)
+    results = [hybrid.detect(None, textured(shift)) for shift in range(0, 10, 2)]
+    # 检测 1 次后跟踪 3 帧，再重新检测
+    assert results == [(True, False), (True, True), (True, True), (True, True), (True, False)]
+    assert detector.calls == 2
+
+
+def test_hybrid_detects_every_frame_without_hand():
+    detector = CountingDetector(landmarks=None)
+    hybrid = HybridHandDetector(detector, redetect_interval=3)
+    assert [hybrid.detect(None, textured()) for _ in range(3)] == [(False, False)] * 3
+    assert detector.calls == 3
+    assert not hybrid.will_track
@@ -0,0 +1,61 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import image_processing
+
+from conftest import make_image
+
+
+@pytest.fixture
+def client(shots_dir):
+    directory, index = shots_dir
+    for n in range(1, 6):
+        (directory / f"{n}.png").write_bytes(make_image(n * 30))
+    index.names()
+    app = FastAPI()
+    app.include_router(image_processing.router)
+    return TestClient(app)
+
+
+def list_all(client, limit, **params):
+    items, cursor = [], None
+    while True:
+        body = client.get("/images/list", params={"limit": limit, "cursor": cursor, **params}).json()
+        items += body["items"]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return items
+
+
+def test_pages_follow_the_index(client):
+    items = list_all(client, 2, fields="page,width,height")
+    assert [item["name"] for item in items] == ["5.png", "4.png", "3.png", "2.png", "1.png"]
+    assert [item["page"] for item in items] == [1, 2, 3, 4, 5]
+    assert (items[0]["width"], items[0]["height"]) == (160, 120)
+
+
+def test_cursor_survives_deleting_its_page(client, shots_dir):
+    first = client.get("/images/list", params={"limit": 2}).json()
+    assert [item["name"] for item in first["items"]] == ["5.png", "4.png"]
+    assert client.delete("/images/4.png").status_code == 200
+
+    second = client.get("/images/list", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    assert [(item["name"], item["page"]) for item in second["items"]] == [("3.png", 2), ("2.png", 3)]
+    assert second["total"] == 4
+
+
+def test_since_token_reports_unchanged(client):
+    token = client.get("/images/list").json()["token"]
+    body = client.get("/images/list", params={"since": token}).json()
+    assert body["unchanged"] is True and body["items"] == []
+
+    client.post("/images/move/1", params={"to": 5})
+    body = client.get("/images/list", params={"since": token}).json()
+    assert body["unchanged"] is False
+    assert body["items"][-1]["name"] == "5.png"
+
+
+def test_rejects_bad_fields_and_cursor(client):
+    assert client.get("/images/list", params={"fields": "page,owner"}).status_code == 400
+    assert client.get("/images/list", params={"cursor": "not-a-cursor"}).status_code == 400
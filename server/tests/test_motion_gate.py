@@ -0,0 +1,71 @@
+import numpy as np
+
+import detector_pool
+from detector_pool import FramePipeline, MotionGate, MotionMeter
+from hand_detection import DEFAULT_PROFILE
+
+
+class CountingDetector:
+    """记录调用次数的检测器，has_hand 决定是否返回关键点"""
+    def __init__(self):
+        self.calls = 0
+        self.has_hand = True
+
+    def detect_landmarks(self, image, region=None):
+        self.calls += 1
+        if not self.has_hand:
+            return None
+        return np.array([[10, 10], [40, 10], [10, 40], [40, 40]], np.float32)
+
+    def reset(self):
+        pass
+
+
+def frame(value=100, box=None):
+    image = np.full((240, 320, 3), value, np.uint8)
+    if box is not None:
+        x, y = box
+        image[y:y + 60, x:x + 60] = 255
+    return image
+
+
+def test_meter_reports_mean_difference():
+    meter = MotionMeter()
+    assert meter.update(frame(100)) is None
+    assert meter.update(frame(100)) == 0.0
+    assert meter.update(frame(120)) == 20.0
+
+
+def test_gate_skips_static_scene_until_refresh():
+    gate = MotionGate(pixel_delta=15, changed_ratio=0.01, refresh_frames=3)
+    still = np.full((48, 64), 100, np.uint8)
+    assert [gate.should_detect(still) for _ in range(6)] == [True, False, False, False, True, False]
+
+    moved = still.copy()
+    moved[10:20, 10:20] = 200
+    assert gate.should_detect(moved)
+    # 低于像素阈值的噪声不算变化
+    assert not gate.should_detect(moved + 5)
+
+
+def test_gate_disabled_with_zero_refresh():
+    gate = MotionGate(refresh_frames=0)
+    still = np.zeros((48, 64), np.uint8)
+    assert all(gate.should_detect(still) for _ in range(3))
+
+
+def test_pipeline_reuses_result_on_static_frames(monkeypatch):
+    monkeypatch.setattr(detector_pool, "HAND_TRACKING", False)
+    monkeypatch.setattr(detector_pool, "HAND_ROI", False)
+    detector = CountingDetector()
+    pipeline = FramePipeline(detector, DEFAULT_PROFILE)
+
+    results = [pipeline.process_frame(frame(box=(100, 100))) for _ in range(3)]
+    assert detector.calls == 1
+    assert [result.gated for result in results] == [False, True, True]
+    assert all(result.has_hand for result in results)
+
+    detector.has_hand = False
+    result = pipeline.process_frame(frame(box=(200, 150)))
+    assert detector.calls == 2
+    assert not result.gated and not result.has_hand
@@ -0,0 +1,36 @@
+from page_manifest import PageManifest
+from shot_index import ShotIndex
+
+from conftest import make_image
+
+
+def write_shots(directory, *names):
+    for name in names:
+        (directory / name).write_bytes(make_image())
+
+
+def test_manifest_apply_and_load(tmp_path):
+    manifest = PageManifest(tmp_path / "manifest.sqlite3")
+    manifest.apply([("a.png", 1.0), ("b.png", 2.0)])
+    manifest.apply([("b.png", 0.5)], deletes=["a.png"])
+    assert manifest.load() == {"b.png": 0.5}
+    manifest.close()
+
+
+def test_order_persists_in_manifest(shots_dir):
+    directory, index = shots_dir
+    write_shots(directory, "a.png", "b.png", "c.png")
+    index.move(3, 1)
+    expected = list(index.names())
+
+    reopened = ShotIndex(directory, poll_interval=0, manifest=PageManifest(directory / ".manifest.sqlite3"))
+    assert reopened.names() == expected
+    reopened.manifest.close()
+
+
+def test_rename_keeps_page(shots_dir):
+    directory, index = shots_dir
+    write_shots(directory, "a.png", "b.png", "c.png")
+    (directory / "b.png").rename(directory / "b.jpg")
+    index.rename("b.png", "b.jpg")
+    assert index.names() == ["c.png", "b.jpg", "a.png"]
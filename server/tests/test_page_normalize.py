@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+import pytest
+
+from page_normalize import find_page_quad, normalize_page
+from shot_pipeline import prepare_shot
+
+CORNERS = np.array([[220, 120], [980, 160], [940, 840], [180, 800]], np.int32)
+
+
+def desk_photo():
+    """深色桌面上略微倾斜的一张白纸"""
+    image = np.full((960, 1280, 3), 40, np.uint8)
+    cv2.fillConvexPoly(image, CORNERS, (235, 235, 235))
+    cv2.putText(image, "PAGE", (400, 500), cv2.FONT_HERSHEY_SIMPLEX, 4, (20, 20, 20), 8)
+    return image
+
+
+def test_page_found_and_corrected():
+    quad = find_page_quad(desk_photo())
+    assert quad is not None
+    assert np.abs(quad - CORNERS).max() < 8
+
+    page = normalize_page(desk_photo())
+    height, width = page.image.shape[:2]
+    assert width == pytest.approx(761, abs=10) and height == pytest.approx(681, abs=10)
+    # 校正后四角都是纸面，不再有桌面
+    assert page.image[5, 5].min() > 200 and page.image[-5, -5].min() > 200
+
+
+def test_no_page_keeps_original():
+    assert normalize_page(np.full((480, 640, 3), 128, np.uint8)) is None
+    # 页面几乎占满画面时无需裁剪
+    full = np.full((480, 640, 3), 235, np.uint8)
+    cv2.rectangle(full, (2, 2), (637, 477), (40, 40, 40), 2)
+    assert normalize_page(full) is None
+
+
+def test_prepare_shot_keeps_original(shots_dir):
+    data = cv2.imencode(".jpg", desk_photo())[1].tobytes()
+    prepared = prepare_shot(data)
+    assert prepared.original == data
+    assert len(prepared.metadata["page_quad"]) == 4
+    assert prepared.metadata["width"] < 1000
@@ -0,0 +1,38 @@
+import asyncio
+
+import image_processing
+from image_processing import edit_lock, migrate_png_backlog, remove_shot
+
+from conftest import make_image
+
+
+def test_migration_keeps_page_order(shots_dir):
+    directory, index = shots_dir
+    for name in ["1.png", "2.png", "3.png"]:
+        (directory / name).write_bytes(make_image())
+    (directory / "4.png").touch()  # 占位文件不迁移
+    index.move(3, 1)
+
+    assert asyncio.run(migrate_png_backlog()) == 3
+    assert index.names() == ["1.jpg", "3.jpg", "2.jpg"]
+    assert not any(directory.glob("[123].png"))
+
+
+def test_page_deleted_during_migration_stays_deleted(shots_dir):
+    directory, index = shots_dir
+    for name in ["1.png", "2.png"]:
+        (directory / name).write_bytes(make_image())
+    index.names()
+
+    async def delete_while_migrating():
+        # 迁移等待编辑锁期间删除第 2 页（2.png）
+        async with edit_lock():
+            task = asyncio.ensure_future(migrate_png_backlog())
+            await asyncio.sleep(0.05)
+            await asyncio.get_running_loop().run_in_executor(None, remove_shot, "2.png")
+        return await task
+
+    assert asyncio.run(delete_while_migrating()) == 1
+    assert sorted(path.name for path in directory.iterdir() if path.is_file()
+                  and not path.name.startswith(".")) == ["1.jpg"]
+    assert index.names() == ["1.jpg"]
@@ -0,0 +1,46 @@
+import cv2
+import numpy as np
+import pytest
+
+from hand_detection import FramePreprocessor
+from ws_protocol import FrameHeader, pack_frame, MSG_DETECT, PIXEL_ENCODED, PIXEL_GRAY8, PIXEL_I420
+
+
+def jpeg(width, height, value=90):
+    image = np.full((height, width, 3), value, np.uint8)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+def framed(payload, pixel_format=PIXEL_ENCODED, width=0, height=0):
+    return pack_frame(FrameHeader(MSG_DETECT, 1, 0.0, pixel_format, width, height), payload)
+
+
+def test_large_jpeg_decoded_at_reduced_scale():
+    preprocessor = FramePreprocessor(target_size=320)
+    # 1280 长边可以在解码时缩小 4 倍，正好是目标尺寸
+    assert preprocessor._decode_flag(jpeg(1280, 960)) == cv2.IMREAD_REDUCED_COLOR_4
+    assert preprocessor.decode(jpeg(1280, 960)).shape == (240, 320, 3)
+    # 比目标尺寸小的帧不放大
+    assert preprocessor.decode(jpeg(200, 150)).shape == (150, 200, 3)
+    assert preprocessor.decode(b"garbage") is None
+
+
+def test_resize_buffer_is_reused():
+    preprocessor = FramePreprocessor(target_size=320)
+    first = preprocessor.decode(jpeg(1000, 750))
+    second = preprocessor.decode(jpeg(1000, 750, value=200))
+    assert first is second
+    assert int(second[0, 0, 0]) == pytest.approx(200, abs=2)
+
+
+def test_raw_frames_skip_imdecode():
+    preprocessor = FramePreprocessor(target_size=320)
+    gray = np.full((240, 320), 77, np.uint8)
+    frame = preprocessor.decode(framed(gray.tobytes(), PIXEL_GRAY8, 320, 240))
+    assert frame.shape == (240, 320, 3) and int(frame[0, 0, 0]) == 77
+
+    i420 = cv2.cvtColor(np.full((480, 640, 3), 128, np.uint8), cv2.COLOR_BGR2YUV_I420)
+    frame = preprocessor.decode(framed(i420.tobytes(), PIXEL_I420, 640, 480))
+    assert frame.shape == (240, 320, 3)
+
+    assert preprocessor.decode(framed(jpeg(640, 480))).shape == (240, 320, 3)
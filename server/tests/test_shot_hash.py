@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+
+from shot_hash import DUPLICATE_DISTANCE, dhash, hamming_distance
+from shot_pipeline import prepare_shot
+
+
+def page(seed: int, size=(480, 640)) -> np.ndarray:
+    """生成一张有明暗纹理的测试页面，不同 seed 的页面内容不同"""
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, (12, 16), dtype=np.uint8)
+    gray = cv2.resize(noise, (size[1], size[0]), interpolation=cv2.INTER_CUBIC)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+
+def encode(image, ext=".png", params=()) -> bytes:
+    return cv2.imencode(ext, image, list(params))[1].tobytes()
+
+
+def test_recompressed_and_resized_copy_is_near_duplicate():
+    image = page(1)
+    value = dhash(encode(image))
+    copy = cv2.resize(image, (320, 240), interpolation=cv2.INTER_AREA)
+    assert hamming_distance(value, dhash(encode(copy, ".jpg", [cv2.IMWRITE_JPEG_QUALITY, 60]))) <= DUPLICATE_DISTANCE
+    assert hamming_distance(value, dhash(encode(page(2)))) > DUPLICATE_DISTANCE
+    assert dhash(b"not an image") is None
+
+
+def test_prepare_shot_flags_duplicates(shots_dir):
+    directory, index = shots_dir
+    (directory / "1_old.png").write_bytes(encode(page(1)))
+    (directory / "2_new.png").write_bytes(encode(page(2)))
+    index.names()
+
+    # 上传与全部图片比较，截图只与最新一张（第 1 页）比较
+    assert prepare_shot(encode(page(1), ".jpg")).duplicate == "1_old.png"
+    assert prepare_shot(encode(page(1), ".jpg"), latest_only=True).duplicate is None
+    assert prepare_shot(encode(page(2)), latest_only=True).metadata["duplicate_of"] == "2_new.png"
+    # 替换时跳过被替换的图片本身
+    assert prepare_shot(encode(page(2)), ignore="2_new.png").duplicate is None
+    assert prepare_shot(encode(page(3))).duplicate is None
+
+
+def test_hash_backfilled_into_metadata(shots_dir):
+    from shot_hash import shot_hashes
+    from shot_storage import read_shot_metadata
+
+    directory, index = shots_dir
+    (directory / "a.png").write_bytes(encode(page(4)))
+    index.names()
+    assert shot_hashes.find_duplicate(dhash(encode(page(4)))) == "a.png"
+    assert int(read_shot_metadata("a.png")["dhash"], 16) == dhash(encode(page(4)))
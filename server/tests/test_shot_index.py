@@ -0,0 +1,97 @@
+from shot_index import ShotIndex
+
+from conftest import make_image
+
+
+def write_shots(directory, *names):
+    for name in names:
+        (directory / name).write_bytes(make_image())
+
+
+def test_untracked_files_sorted_newest_first(shots_dir):
+    directory, index = shots_dir
+    write_shots(directory, "100_shot.png", "300_shot.png", "200_shot.png", "notes.txt")
+    assert index.names() == ["300_shot.png", "200_shot.png", "100_shot.png"]
+    assert index.page_of("100_shot.png") == 3
+    assert index.name_at(1) == "300_shot.png"
+    assert index.name_at(4) is None
+
+
+def test_add_and_move(shots_dir):
+    directory, index = shots_dir
+    write_shots(directory, "1.png", "2.png")
+    assert index.names() == ["2.png", "1.png"]
+
+    write_shots(directory, "3.png", "4.png")
+    index.add("3.png")
+    index.add("4.png", after_page=2)
+    assert index.names() == ["3.png", "2.png", "4.png", "1.png"]
+
+    assert index.move(1, 4) == "3.png"
+    assert index.names() == ["2.png", "4.png", "1.png", "3.png"]
+    assert index.move(9, 1) is None
+
+
+def test_rescan_picks_up_external_changes(shots_dir):
+    directory, index = shots_dir
+    write_shots(directory, "a.png", "b.png")
+    index.move(2, 1)
+    token = index.token
+    assert index.rescan() is False
+    assert index.token == token
+
+    (directory / "b.png").unlink()
+    write_shots(directory, "c.png")
+    assert index.rescan() is True
+    assert index.names() == ["c.png", "a.png"]
+    assert index.token != token
+    assert set(index.manifest.load()) == {"a.png", "c.png"}
+
+
+def test_rescan_keeps_concurrent_add(shots_dir, monkeypatch):
+    directory, index = shots_dir
+    write_shots(directory, "a.png")
+    index.names()
+
+    # 在锁外扫描目录之后、加锁之前写入新文件，rescan 不应把它当作已删除
+    scan = index._scan
+
+    def scan_then_add():
+        entries = scan()
+        monkeypatch.setattr(index, "_scan", scan)
+        write_shots(directory, "b.png")
+        index.add("b.png")
+        return entries
+
+    monkeypatch.setattr(index, "_scan", scan_then_add)
+    index.rescan()
+    assert index.names() == ["b.png", "a.png"]
+
+
+def test_apply_batch_keeps_unmoved_positions(shots_dir):
+    directory, index = shots_dir
+    write_shots(directory, *(f"{n}.png" for n in range(6)))
+    names = list(index.names())
+    before = index.manifest.load()
+
+    # 删除第 1 页，并把最后一页移到最前面
+    (directory / names[0]).unlink()
+    new_order = [names[5]] + names[1:5]
+    assert index.apply_batch(new_order, deletes=[names[0]]) == new_order
+
+    after = index.manifest.load()
+    assert names[0] not in after
+    changed = [name for name in after if after[name] != before[name]]
+    assert changed == [names[5]]
+
+
+def test_apply_batch_renumbers_when_gaps_run_out(shots_dir):
+    directory, index = shots_dir
+    write_shots(directory, "a.png", "b.png", "c.png", "d.png")
+    index.manifest.apply([("a.png", 0.0), ("b.png", 5e-324), ("c.png", 1.0), ("d.png", 2.0)])
+    reopened = ShotIndex(directory, poll_interval=0, manifest=index.manifest)
+    # d 需要排在 a 和 b 之间，两者的位置值之间已没有可用的浮点数
+    order = ["a.png", "d.png", "b.png", "c.png"]
+    assert reopened.apply_batch(order) == order
+    positions = reopened.manifest.load()
+    assert sorted(positions, key=positions.get) == order
@@ -0,0 +1,69 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import shot_storage
+from shot_storage import save_shot_sync, read_shot_metadata, reserve_shot_path, release_shot_path
+
+from conftest import make_image
+
+
+def test_concurrent_saves_in_same_millisecond_get_distinct_names(shots_dir, monkeypatch):
+    directory, index = shots_dir
+    monkeypatch.setattr(time, "time", lambda: 1700000000.0)
+    # 拉长选名与写入之间的间隔，使各线程的选名必然交错
+    write_metadata = shot_storage.write_shot_metadata
+
+    def slow_write_metadata(filename, metadata):
+        time.sleep(0.05)
+        write_metadata(filename, metadata)
+
+    monkeypatch.setattr(shot_storage, "write_shot_metadata", slow_write_metadata)
+    images = [make_image(value * 20) for value in range(8)]
+    barrier = threading.Barrier(len(images))
+
+    def save(value):
+        barrier.wait()
+        return save_shot_sync(images[value], metadata={"value": value})
+
+    with ThreadPoolExecutor(len(images)) as pool:
+        paths = list(pool.map(save, range(len(images))))
+
+    assert len({path.name for path in paths}) == len(images)
+    for value, path in enumerate(paths):
+        assert path.name.startswith("1700000000")
+        assert path.read_bytes() == images[value]
+        assert read_shot_metadata(path.name)["value"] == value
+
+
+def test_saved_bytes_are_passed_through(shots_dir):
+    data = make_image(ext=".jpg")
+    path = save_shot_sync(data)
+    assert path.suffix == ".jpg"
+    assert path.read_bytes() == data
+
+
+def test_reserved_placeholder_is_not_listed(shots_dir):
+    directory, index = shots_dir
+    path = reserve_shot_path(lambda timestamp_ms: f"{timestamp_ms}_shot.png")
+    assert path.exists() and path.stat().st_size == 0
+    index.add(path.name)
+    assert index.names() == []
+    assert index.rescan() is False
+
+    release_shot_path(path)
+    assert not path.exists()
+
+
+def test_failed_save_releases_reservation(shots_dir, monkeypatch):
+    directory, index = shots_dir
+
+    def fail(path, data):
+        raise OSError("磁盘已满")
+
+    monkeypatch.setattr(shot_storage, "write_file_atomic", fail)
+    try:
+        save_shot_sync(make_image())
+    except OSError:
+        pass
+    assert [path for path in directory.iterdir() if path.is_file()] == []
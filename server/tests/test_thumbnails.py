@@ -0,0 +1,64 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import thumbnails
+from image_header import read_image_header
+from thumbnails import ThumbnailCache
+
+from conftest import make_image
+
+
+@pytest.fixture
+def client(shots_dir):
+    directory, index = shots_dir
+    (directory / "a.png").write_bytes(make_image(size=(900, 1200)))
+    index.names()
+    app = FastAPI()
+    app.include_router(thumbnails.router)
+    return TestClient(app)
+
+
+def test_thumbnail_revalidates_with_etag(client):
+    response = client.get("/thumbnails/thumb/a.png")
+    assert response.status_code == 200
+    header = read_image_header(response.content)
+    assert header.format == "jpeg" and (header.width, header.height) == (320, 240)
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "no-cache"
+
+    response = client.get("/thumbnails/thumb/a.png", headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.content == b""
+
+    # 带版本参数的地址可长期缓存，第二次请求命中磁盘缓存
+    response = client.get("/thumbnails/thumb/a.png", params={"v": etag.strip('"')})
+    assert "immutable" in response.headers["cache-control"]
+    assert thumbnails.thumbnail_cache.stats()["hits"] == 1
+
+
+def test_replaced_shot_gets_new_etag(client, shots_dir):
+    directory, index = shots_dir
+    etag = client.get("/thumbnails/preview/a.png").headers["etag"]
+    (directory / "a.png").write_bytes(make_image(value=30, size=(600, 800)))
+    index.rescan()
+
+    response = client.get("/thumbnails/preview/a.png", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_unknown_size_or_shot_is_404(client):
+    assert client.get("/thumbnails/huge/a.png").status_code == 404
+    assert client.get("/thumbnails/thumb/missing.png").status_code == 404
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ThumbnailCache(tmp_path, max_bytes=250)
+    cache.put("a.png", "1", b"a" * 100)
+    cache.put("b.png", "1", b"b" * 100)
+    assert cache.get("a.png", "1") is not None
+    cache.put("c.png", "1", b"c" * 100)
+    assert cache.get("b.png", "1") is None
+    assert cache.get("a.png", "1") is not None
+    cache.invalidate("a.png")
+    assert cache.stats()["entries"] == 1
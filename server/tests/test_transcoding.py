@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+
+from image_header import read_image_header
+from shot_pipeline import prepare_shot
+
+
+def plain(ext, size=(600, 800)):
+    """没有页面边缘的图片（不触发页面规整）"""
+    image = np.full((size[0], size[1], 3), 150, np.uint8)
+    return cv2.imencode(ext, image)[1].tobytes()
+
+
+def test_png_transcoded_to_configured_codec(shots_dir):
+    prepared = prepare_shot(plain(".png"), codec="webp", quality=80, max_edge=0)
+    assert prepared.ext == ".webp"
+    assert read_image_header(prepared.data).format == "webp"
+    assert prepared.metadata["codec"] == "webp"
+    assert prepared.original is None
+
+
+def test_matching_format_saved_unchanged(shots_dir):
+    data = plain(".jpg")
+    prepared = prepare_shot(data, codec="jpeg", max_edge=2560)
+    assert prepared.data == data and prepared.ext == ".jpg"
+    assert "codec" not in prepared.metadata
+
+
+def test_long_edge_capped_and_original_kept(shots_dir):
+    data = plain(".jpg", size=(1500, 2000))
+    prepared = prepare_shot(data, codec="jpeg", max_edge=1000, keep_original=True)
+    header = read_image_header(prepared.data)
+    assert (header.width, header.height) == (1000, 750)
+    assert (prepared.metadata["width"], prepared.metadata["height"]) == (1000, 750)
+    assert prepared.original == data
+
+
+def test_original_codec_keeps_source_format(shots_dir):
+    prepared = prepare_shot(plain(".png"), codec="original", max_edge=0)
+    assert prepared.ext == ".png"
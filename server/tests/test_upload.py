@@ -0,0 +1,89 @@
+import asyncio
+import hashlib
+import io
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import image_processing
+import upload_stream
+from shot_storage import read_shot_metadata
+from upload_stream import UploadTooLarge, stage_upload
+
+from conftest import make_image
+
+
+def make_app():
+    app = FastAPI()
+    app.include_router(image_processing.router)
+    return app
+
+
+def test_concurrent_uploads_with_same_name_do_not_clobber(shots_dir, monkeypatch):
+    directory, index = shots_dir
+    monkeypatch.setattr(time, "time", lambda: 1700000000.0)
+    # 拉长选名与写入之间的间隔，使两个请求的选名必然交错
+    write_sidecars = image_processing.write_upload_sidecars
+
+    def slow_write_sidecars(*args):
+        time.sleep(0.05)
+        write_sidecars(*args)
+
+    monkeypatch.setattr(image_processing, "write_upload_sidecars", slow_write_sidecars)
+    images = [make_image(40), make_image(200)]
+
+    async def upload_both():
+        transport = httpx.ASGITransport(app=make_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post("/upload", files=[("files", ("page.png", data, "image/png"))])
+                                          for data in images))
+
+    responses = asyncio.run(upload_both())
+    saved = [response.json()["results"][0]["saved_as"] for response in responses]
+    assert len(set(saved)) == 2
+    assert sorted(index.names()) == sorted(saved)
+    assert all((directory / name).stat().st_size > 0 for name in saved)
+
+
+def stage(data, max_bytes):
+    from starlette.datastructures import UploadFile
+
+    return asyncio.run(stage_upload(UploadFile(io.BytesIO(data), filename="page.png"), max_bytes, ".png"))
+
+
+def test_staged_in_chunks_with_checksum(shots_dir, monkeypatch):
+    monkeypatch.setattr(upload_stream, "UPLOAD_CHUNK_SIZE", 1000)
+    data = make_image()
+    staged = stage(data, len(data))
+    assert staged.size == len(data)
+    assert staged.sha1 == hashlib.sha1(data).hexdigest()
+    assert staged.path.read_bytes() == data
+
+
+def test_oversized_upload_stops_early(shots_dir, monkeypatch):
+    directory, _ = shots_dir
+    monkeypatch.setattr(upload_stream, "UPLOAD_CHUNK_SIZE", 1000)
+    with pytest.raises(UploadTooLarge):
+        stage(b"x" * 5000, 2500)
+    assert not any((directory / ".uploads").iterdir())
+
+
+def test_multi_file_upload_reports_each_file(shots_dir, monkeypatch):
+    directory, index = shots_dir
+    small, large = make_image(40), make_image(90, size=(600, 800))
+    limit = (len(small) + len(large)) // 2
+    monkeypatch.setattr(image_processing, "max_upload_bytes", lambda ext: limit)
+    files = [("files", ("a.png", small, "image/png")),
+             ("files", ("big.png", large, "image/png")),
+             ("files", ("notes.txt", b"text", "text/plain"))]
+
+    results = TestClient(make_app()).post("/upload", files=files).json()["results"]
+    assert [result["status"] for result in results] == ["success", "error", "error"]
+    assert "文件太大" in results[1]["message"]
+    saved = results[0]["saved_as"]
+    assert index.names() == [saved]
+    assert read_shot_metadata(saved)["upload_sha1"] == hashlib.sha1(small).hexdigest()
+    assert not any((directory / ".uploads").iterdir())
@@ -0,0 +1,42 @@
+import math
+
+import cv2
+import numpy as np
+
+import video_ingest
+from capture_trigger import CAPTURE_TIMEOUT
+from video_ingest import VideoSegment, plan_segments
+
+
+def test_short_or_unknown_length_is_one_segment():
+    assert plan_segments(900, 30.0, segment_seconds=60) == [VideoSegment(0, None, 0, None)]
+    assert plan_segments(0, 30.0, segment_seconds=60) == [VideoSegment(0, None, 0, None)]
+
+
+def test_segments_cover_video_with_warmup_and_tail():
+    fps = 30.0
+    segments = plan_segments(5000, fps, segment_seconds=60)
+    assert [(s.start, s.end) for s in segments] == [(0, 1800), (1800, 3600), (3600, None)]
+
+    warmup = int(video_ingest._SEGMENT_WARMUP * fps)
+    tail = int(math.ceil((CAPTURE_TIMEOUT + 1.0) * fps))
+    assert [s.first for s in segments] == [0, 1800 - warmup, 3600 - warmup]
+    assert [s.limit for s in segments] == [1800 + tail, 3600 + tail, None]
+
+
+def test_pages_saved_in_order_and_duplicates_rejected(shots_dir, monkeypatch):
+    directory, index = shots_dir
+    monkeypatch.setattr(video_ingest, "DUPLICATE_POLICY", "reject")
+
+    def page(seed):
+        rng = np.random.default_rng(seed)
+        noise = cv2.resize(rng.integers(0, 256, (12, 16), dtype=np.uint8), (640, 480))
+        return {"data": cv2.imencode(".png", noise)[1].tobytes(), "video_time": float(seed)}
+
+    pages = []
+    assert video_ingest._save_pages([page(1), page(2)], "book.mp4", pages) == 0
+    # 与上一页重复（手伸进来又离开但没有翻页）
+    assert video_ingest._save_pages([page(2), page(3)], "book.mp4", pages) == 1
+    assert len(pages) == 3
+    # 新截图排在第 1 页，最后提取的页面在最前
+    assert index.names() == pages[::-1]
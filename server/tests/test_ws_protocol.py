@@ -0,0 +1,59 @@
+import struct
+
+import pytest
+
+from ws_protocol import (FrameHeader, HEADER_SIZE, MAGIC, MSG_DETECT, MSG_HD, PIXEL_ENCODED, PIXEL_GRAY8,
+                         PIXEL_I420, pack_frame, parse_frame, hello_reply, raw_frame_size)
+
+
+def test_header_is_22_bytes():
+    assert HEADER_SIZE == 22
+
+
+def test_encoded_frame_round_trip():
+    header = FrameHeader(MSG_HD, 42, 1234.5)
+    parsed = parse_frame(pack_frame(header, b"\xff\xd8jpeg"))
+    assert parsed is not None
+    parsed_header, payload = parsed
+    assert parsed_header == header
+    assert bytes(payload) == b"\xff\xd8jpeg"
+
+
+def test_raw_frame_round_trip():
+    header = FrameHeader(MSG_DETECT, 7, 99.0, PIXEL_I420, 4, 2)
+    payload = bytes(range(raw_frame_size(header)))
+    parsed_header, parsed_payload = parse_frame(memoryview(pack_frame(header, payload)))
+    assert parsed_header == header
+    assert bytes(parsed_payload) == payload
+    assert raw_frame_size(FrameHeader(MSG_DETECT, 0, 0, PIXEL_GRAY8, 4, 2)) == 8
+
+
+@pytest.mark.parametrize("data", [b"", b"AC", b"\xff\xd8\xff\xe0" + bytes(40)])
+def test_unframed_data_is_not_parsed(data):
+    assert parse_frame(data) is None
+
+
+def test_unsupported_version():
+    data = struct.pack("<2sBBBxIdHH", MAGIC, 99, MSG_DETECT, PIXEL_ENCODED, 0, 0.0, 0, 0)
+    with pytest.raises(ValueError):
+        parse_frame(data)
+
+
+@pytest.mark.parametrize("header, payload_size", [
+    (FrameHeader(MSG_DETECT, 0, 0.0, 7, 0, 0), 0),              # 未知像素格式
+    (FrameHeader(MSG_DETECT, 0, 0.0, PIXEL_GRAY8, 0, 2), 0),    # 尺寸为 0
+    (FrameHeader(MSG_DETECT, 0, 0.0, PIXEL_I420, 3, 2), 9),     # I420 尺寸须为偶数
+    (FrameHeader(MSG_DETECT, 0, 0.0, PIXEL_GRAY8, 4, 2), 7),    # 长度不符
+])
+def test_invalid_raw_frames(header, payload_size):
+    with pytest.raises(ValueError):
+        parse_frame(pack_frame(header, bytes(payload_size)))
+
+
+def test_hello_reply_keeps_known_formats():
+    reply = hello_reply(["i420", "rgba", "jpeg"], hd_stream=True)
+    assert reply["type"] == "hello"
+    assert reply["formats"] == ["i420", "jpeg"]
+    assert reply["hd_stream"] is True
+    assert hello_reply(["jpeg"], detect_size=480)["detect_size"] == 480
+    assert hello_reply(["rgba"])["formats"] == ["jpeg"]
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+缩略图与预览图模块
+图片管理页面按需请求缩小后的截图，不再下载原图：
+首次请求时缩小解码并编码为 JPEG，写入磁盘缓存（总大小超过上限时淘汰最久未用的）；
+响应带强 ETag，未变化时返回 304。ETag 由文件名、大小和修改时间得出，
+截图被替换后旧的缩略图自然失效，替换和删除时也会主动清除。
+"""
+import os
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import cv2
+import numpy as np
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+from image_header import read_image_header
+from shot_index import shot_index
+from shot_storage import SHOTS_DIR, write_file_atomic
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# 缩略图缓存目录
+THUMB_CACHE_DIR = Path(os.getenv("THUMB_CACHE_DIR", str(Path(__file__).parent / "temp" / "thumbs")))
+# 缩略图缓存总大小上限（MB）
+THUMB_CACHE_MB = float(os.getenv("THUMB_CACHE_MB", "200"))
+# 缩略图 JPEG 质量
+THUMB_QUALITY = int(os.getenv("THUMB_QUALITY", "80"))
+
+# 尺寸档位：长边像素
+THUMB_SIZES = {
+    "thumb": 320,
+    "preview": 1280,
+}
+
+_REDUCED_COLOR_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+# 带版本参数的请求内容不会变化，可长期缓存；否则每次向服务器确认
+_IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+_REVALIDATE_CACHE = "no-cache"
+
+
+def thumbnail_etag(name: str, size: str) -> Optional[str]:
+    """截图当前版本的缩略图 ETag（不含引号），截图不存在时返回 None"""
+    info = shot_index.get(name)
+    if info is None:
+        return None
+    key = f"{name}:{info.size}:{info.mtime_ns}:{size}:{THUMB_SIZES[size]}:{THUMB_QUALITY}"
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def thumbnail_url(name: str, size: str = "thumb") -> Optional[str]:
+    """带版本参数的缩略图地址（可被浏览器长期缓存），截图不存在时返回 None"""
+    etag = thumbnail_etag(name, size)
+    if etag is None:
+        return None
+    return f"/api/thumbnails/{size}/{name}?v={etag}"
+
+
+def render_thumbnail(path: Path, max_edge: int) -> Optional[bytes]:
+    """
+    生成一张缩略图（同步，在线程池中调用）
+
+    参数:
+        path: 截图或视频路径（视频取第一帧）
+        max_edge: 长边像素
+
+    返回:
+        JPEG 字节，无法解码时返回 None
+    """
+    if path.suffix.lower() == ".mp4":
+        capture = cv2.VideoCapture(str(path))
+        ok, image = capture.read()
+        capture.release()
+        if not ok:
+            return None
+    else:
+        data = path.read_bytes()
+        flag = cv2.IMREAD_COLOR
+        header = read_image_header(data)
+        if header is not None:
+            long_edge = max(header.width, header.height)
+            for factor, reduced_flag in _REDUCED_COLOR_FLAGS:
+                if long_edge // factor >= max_edge:
+                    flag = reduced_flag
+                    break
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+        if image is None:
+            return None
+
+    height, width = image.shape[:2]
+    scale = max_edge / max(height, width)
+    if scale < 1:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, THUMB_QUALITY])
+    return encoded.tobytes() if ok else None
+
+
+class ThumbnailCache:
+    """
+    缩略图磁盘缓存（最近最少使用淘汰）
+
+    缓存文件名为 “截图文件名.ETag.jpg”，清除某张截图的缩略图只需按前缀删除。
+    """
+    def __init__(self, directory: Path = THUMB_CACHE_DIR, max_bytes: int = int(THUMB_CACHE_MB * 1024 * 1024)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # 缓存文件名 -> 大小，按最近使用排序
+        self._entries: Optional[OrderedDict] = None
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = [path for path in self.directory.iterdir() if path.is_file() and path.suffix == ".jpg"]
+        files.sort(key=lambda path: path.stat().st_mtime)
+        self._entries = OrderedDict((path.name, path.stat().st_size) for path in files)
+        self._total = sum(self._entries.values())
+
+    def path_for(self, name: str, etag: str) -> Path:
+        return self.directory / f"{name}.{etag}.jpg"
+
+    def get(self, name: str, etag: str) -> Optional[Path]:
+        """命中时返回缓存文件路径"""
+        with self._lock:
+            self._load()
+            path = self.path_for(name, etag)
+            if path.name not in self._entries:
+                self.misses += 1
+                return None
+            if not path.exists():
+                self._total -= self._entries.pop(path.name)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path.name)
+            self.hits += 1
+            return path
+
+    def put(self, name: str, etag: str, data: bytes):
+        path = self.path_for(name, etag)
+        write_file_atomic(path, data)
+        with self._lock:
+            self._load()
+            self._total -= self._entries.pop(path.name, 0)
+            self._entries[path.name] = len(data)
+            self._total += len(data)
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                evicted, size = self._entries.popitem(last=False)
+                self._total -= size
+                (self.directory / evicted).unlink(missing_ok=True)
+
+    def invalidate(self, name: str):
+        """清除某张截图的全部缩略图（替换或删除截图时调用）"""
+        prefix = f"{name}."
+        with self._lock:
+            self._load()
+            for cached in [cached for cached in self._entries if cached.startswith(prefix)]:
+                self._total -= self._entries.pop(cached)
+                (self.directory / cached).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._load()
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+thumbnail_cache = ThumbnailCache()
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return f'"{etag}"' in [tag.strip() for tag in header.split(",")]
+
+
+@router.get("/thumbnails/{size}/{filename}")
+async def get_thumbnail(size: str, filename: str, request: Request, v: Optional[str] = None):
+    """
+    获取截图的缩略图（thumb）或预览图（preview）
+    """
+    if size not in THUMB_SIZES:
+        raise HTTPException(status_code=404, detail=f"未知的尺寸: {size}")
+    etag = thumbnail_etag(filename, size)
+    if etag is None:
+        raise HTTPException(status_code=404, detail=f"文件不存在: {filename}")
+
+    headers = {
+        "ETag": f'"{etag}"',
+        "Cache-Control": _IMMUTABLE_CACHE if v == etag else _REVALIDATE_CACHE,
+    }
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    cached = thumbnail_cache.get(filename, etag)
+    if cached is not None:
+        return FileResponse(path=str(cached), media_type="image/jpeg", headers=headers)
+
+    loop = asyncio.get_running_loop()
+    data = await loop.run_in_executor(None, render_thumbnail, SHOTS_DIR / filename, THUMB_SIZES[size])
+    if data is None:
+        raise HTTPException(status_code=422, detail=f"无法生成缩略图: {filename}")
+    await loop.run_in_executor(None, thumbnail_cache.put, filename, etag, data)
+    return Response(content=data, media_type="image/jpeg", headers=headers)
+
+
+@router.get("/thumbnails/stats")
+async def get_thumbnail_stats():
+    """获取缩略图缓存统计"""
+    return thumbnail_cache.stats()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+上传文件流式暂存模块
+上传内容按固定大小分块写入 shots/.uploads 下的暂存文件，边写边计算 SHA-1 并检查大小上限，
+超限时立即中止；写盘和哈希在线程池中执行，不阻塞事件循环。
+暂存目录与 shots 在同一文件系统，处理完成后可直接原子重命名到 shots 目录。
+"""
+import os
+import uuid
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from typing import List, NamedTuple, Tuple
+
+from fastapi import UploadFile
+
+from shot_storage import SHOTS_DIR, release_shot_path
+
+logger = logging.getLogger(__name__)
+
+# 上传暂存目录
+UPLOAD_STAGING_DIR = SHOTS_DIR / ".uploads"
+# 分块大小（字节），即单个上传占用的内存上限
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+
+class UploadTooLarge(ValueError):
+    """上传内容超过大小上限"""
+
+
+class StagedUpload(NamedTuple):
+    path: Path
+    size: int
+    sha1: str
+
+
+def _write_chunk(f, hasher, chunk: bytes):
+    hasher.update(chunk)
+    f.write(chunk)
+
+
+async def stage_upload(file: UploadFile, max_bytes: int, suffix: str = "") -> StagedUpload:
+    """
+    把上传文件分块写入暂存文件
+
+    参数:
+        file: 上传文件
+        max_bytes: 大小上限（字节）
+        suffix: 暂存文件扩展名
+
+    返回:
+        StagedUpload；调用方负责提交（commit_staged）或删除暂存文件
+
+    异常:
+        UploadTooLarge: 超过大小上限（暂存文件已删除）
+    """
+    UPLOAD_STAGING_DIR.mkdir(exist_ok=True)
+    path = UPLOAD_STAGING_DIR / f"{uuid.uuid4().hex}{suffix}"
+    loop = asyncio.get_running_loop()
+    hasher = hashlib.sha1()
+    size = 0
+    f = await loop.run_in_executor(None, open, path, "wb")
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"文件太大，最大允许{max_bytes / 1024 / 1024:.0f}MB")
+            await loop.run_in_executor(None, _write_chunk, f, hasher, chunk)
+    except BaseException:
+        f.close()
+        path.unlink(missing_ok=True)
+        raise
+    await loop.run_in_executor(None, f.close)
+    return StagedUpload(path, size, hasher.hexdigest())
+
+
+async def commit_staged(staged: StagedUpload, dest: Path):
+    """把暂存文件原子重命名为目标文件"""
+    await asyncio.get_running_loop().run_in_executor(None, os.replace, staged.path, dest)
+
+
+def discard_staged(staged: StagedUpload):
+    staged.path.unlink(missing_ok=True)
+
+
+class FileTransaction:
+    """
+    shots 目录中一组文件的写入和删除（同步，在线程池中调用）
+
+    新内容事先写好在暂存目录中，提交时只做同一文件系统内的重命名；
+    被覆盖或删除的文件先移入暂存目录，中途失败时调用 rollback 按相反顺序恢复，
+    全部成功后调用 finish 才真正删除旧文件。
+    新文件名由调用方占位（shot_storage.reserve_shot_path）后用 reserved 登记，撤销时删除占位文件。
+    """
+    def __init__(self):
+        # 已完成的重命名 (原路径, 新路径)
+        self._moves: List[Tuple[Path, Path]] = []
+        self._trash: List[Path] = []
+        self._reserved: List[Path] = []
+
+    def reserved(self, path: Path) -> Path:
+        """登记本事务占位的新文件"""
+        self._reserved.append(path)
+        return path
+
+    def _move(self, src: Path, dest: Path):
+        os.replace(src, dest)
+        self._moves.append((src, dest))
+
+    def _discard(self, path: Path):
+        trash = UPLOAD_STAGING_DIR / f"{uuid.uuid4().hex}.trash"
+        self._move(path, trash)
+        self._trash.append(trash)
+
+    def put(self, staged_path: Path, dest: Path):
+        """用暂存文件替换（或新建）dest"""
+        if dest.exists() and dest not in self._reserved:
+            self._discard(dest)
+        self._move(staged_path, dest)
+
+    def remove(self, path: Path):
+        if path.exists():
+            self._discard(path)
+
+    def rollback(self):
+        """撤销已完成的重命名"""
+        for src, dest in reversed(self._moves):
+            try:
+                os.replace(dest, src)
+            except OSError as e:
+                logger.error(f"恢复文件 {src.name} 失败: {str(e)}")
+        for path in self._reserved:
+            release_shot_path(path)
+        self._moves.clear()
+        self._trash.clear()
+        self._reserved.clear()
+
+    def finish(self):
+        """提交成功后删除被覆盖和删除的旧文件"""
+        for trash in self._trash:
+            trash.unlink(missing_ok=True)
+        self._moves.clear()
+        self._trash.clear()
+        self._reserved.clear()
+
+
+def clear_upload_staging():
+    """删除上次运行中断时遗留的暂存文件（启动时调用）"""
+    if UPLOAD_STAGING_DIR.exists():
+        for path in UPLOAD_STAGING_DIR.iterdir():
+            path.unlink(missing_ok=True)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+视频导入模块
+把上传的翻页视频逐帧流式解码，用与 /ws 监控相同的检测流水线和截图触发状态机
+找出每次翻页后的静止画面，每次翻页保存一张截图到 shots 目录。
+
+长视频按时长切分为若干段，在多进程池中并行处理；每段向前多读一小段预热，
+使状态机在段首已处于正确状态，翻页归属于“手离开”发生的那一段，不会重复截图。
+工作进程只返回选中的页面；段按顺序提交，已提交未保存的段数不超过工作进程数的固定倍数，
+前面的段较慢时后面各段的结果不会全部堆积在内存中，内存占用与视频长度无关。
+
+命令行用法:
+    python video_ingest.py VIDEO [--workers N]
+"""
+import os
+import sys
+import math
+import time
+import logging
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import cv2
+
+from capture_trigger import CaptureTrigger, CAPTURE_TIMEOUT, EVENT_HAND_LEFT, EVENT_CAPTURE
+from capture_quality import measure_gray_quality, CAPTURE_CANDIDATES
+from hand_detection import DETECTOR_PROFILES, DEFAULT_PROFILE
+from shot_hash import shot_hashes, DUPLICATE_POLICY
+from shot_index import shot_index
+from shot_pipeline import prepare_shot, encode_image
+from shot_storage import save_shot_sync
+
+logger = logging.getLogger(__name__)
+
+# 上传 MP4 时是否提取翻页截图（关闭时视频原样保存到 shots 目录）
+VIDEO_INGEST = os.getenv("VIDEO_INGEST", "1") == "1"
+# 视频导入工作进程数，0 表示与 CPU 核数一致
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", "0")) or (os.cpu_count() or 1)
+# 每段视频的时长（秒），各段并行处理
+VIDEO_SEGMENT_SECONDS = float(os.getenv("VIDEO_SEGMENT_SECONDS", "60"))
+# 每秒检测的帧数（与监控时前端的发送帧率相当），其余帧只解码不检测
+VIDEO_SAMPLE_FPS = float(os.getenv("VIDEO_SAMPLE_FPS", "10"))
+# 视频检测使用的检测器配置档
+VIDEO_DETECTOR_PROFILE = os.getenv("VIDEO_DETECTOR_PROFILE", DEFAULT_PROFILE.name)
+
+# 每段向前预热的时长（秒），需覆盖迟滞窗口，使段首的手能被识别
+_SEGMENT_WARMUP = 2.0
+# 帧率无法读取时的默认值
+_DEFAULT_FPS = 30.0
+# 每个工作进程最多同时提交的段数（含已完成但尚未保存的段）
+_SEGMENTS_IN_FLIGHT_PER_WORKER = 2
+
+# 工作进程内的检测器（每个进程创建一次）
+_detector = None
+_profile = None
+
+
+class VideoSegment(NamedTuple):
+    # 本段负责的帧范围 [start, end)；end 为 None 表示读到视频结尾
+    start: int
+    end: Optional[int]
+    # 实际开始读取的帧（含预热）
+    first: int
+    # 最多读到该帧之前（等待本段最后一次翻页的截图），None 表示读到视频结尾
+    limit: Optional[int]
+
+
+def _init_worker(profile_name: str):
+    global _detector, _profile
+    from hand_detection import HandDetector
+    _profile = DETECTOR_PROFILES.get(profile_name, DEFAULT_PROFILE)
+    _detector = HandDetector.from_profile(_profile)
+
+
+def _select_page(candidates, video_time: float) -> dict:
+    """从手离开后的候选帧中选出最清晰的一张，无损编码后返回"""
+    qualities = [measure_gray_quality(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)) for frame in candidates]
+    best = max(range(len(candidates)), key=lambda index: qualities[index].score)
+    return {
+        "data": encode_image(candidates[best], "png"),
+        "video_time": round(video_time, 3),
+        "candidates": len(candidates),
+        **qualities[best].to_dict(),
+        "candidate_scores": [round(quality.score, 2) for quality in qualities],
+    }
+
+
+def _ingest_segment(path: str, segment: VideoSegment, fps: float, step: int) -> List[dict]:
+    """
+    工作进程：处理一段视频
+
+    返回:
+        本段翻页得到的页面（按时间顺序），见 _select_page
+    """
+    from detector_pool import FramePipeline
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"无法打开视频: {path}")
+    if segment.first > 0:
+        capture.set(cv2.CAP_PROP_POS_FRAMES, segment.first)
+
+    _detector.reset()
+    pipeline = FramePipeline(_detector, _profile)
+    trigger = CaptureTrigger()
+    candidates = deque(maxlen=max(1, CAPTURE_CANDIDATES))
+    # 最近一次“手离开”发生在本段范围内，其后的截图归本段
+    owned = False
+    pages = []
+
+    index = segment.first
+    try:
+        while segment.limit is None or index < segment.limit:
+            # 段末之后只为等待本段最后一次翻页的截图
+            if segment.end is not None and index >= segment.end and not owned:
+                break
+            if index % step:
+                if not capture.grab():
+                    break
+                index += 1
+                continue
+            ok, frame = capture.read()
+            if not ok:
+                break
+
+            result = pipeline.process_frame(pipeline.preprocessor.fit(frame))
+            now = index / fps
+            event = trigger.update(result.has_hand, result.motion, now)
+            if event == EVENT_HAND_LEFT:
+                owned = index >= segment.start and (segment.end is None or index < segment.end)
+                candidates.clear()
+            elif trigger.state == CaptureTrigger.HAND_ON:
+                owned = False
+
+            if trigger.state == CaptureTrigger.SETTLING or event == EVENT_CAPTURE:
+                candidates.append(frame)
+            if event == EVENT_CAPTURE:
+                if owned:
+                    pages.append(_select_page(list(candidates), now))
+                owned = False
+                candidates.clear()
+            index += 1
+    finally:
+        capture.release()
+    return pages
+
+
+def plan_segments(frame_count: int, fps: float, segment_seconds: float = VIDEO_SEGMENT_SECONDS) -> List[VideoSegment]:
+    """
+    把视频切分为若干段
+
+    参数:
+        frame_count: 视频总帧数，无法读取时为 0（此时不切分）
+        fps: 视频帧率
+        segment_seconds: 每段时长（秒）
+    """
+    segment_frames = int(segment_seconds * fps)
+    if frame_count <= 0 or segment_frames <= 0 or frame_count <= segment_frames:
+        return [VideoSegment(0, None, 0, None)]
+
+    warmup = int(_SEGMENT_WARMUP * fps)
+    # 段末之后最多再读这么多帧：手离开后最迟 CAPTURE_TIMEOUT 秒截图
+    tail = int(math.ceil((CAPTURE_TIMEOUT + 1.0) * fps))
+    segments = []
+    for start in range(0, frame_count, segment_frames):
+        end = start + segment_frames
+        if end >= frame_count:
+            segments.append(VideoSegment(start, None, max(0, start - warmup), None))
+            break
+        segments.append(VideoSegment(start, end, max(0, start - warmup), end + tail))
+    return segments
+
+
+def _save_pages(segment_pages: List[dict], source_name: str, pages: List[str]) -> int:
+    """
+    保存一段视频提取的页面，文件名追加到 pages
+
+    返回:
+        跳过的重复页数
+    """
+    duplicates = 0
+    for page in segment_pages:
+        data = page.pop("data")
+        prepared = prepare_shot(data, latest_only=True)
+        if prepared.duplicate is not None and DUPLICATE_POLICY == "reject":
+            duplicates += 1
+            continue
+        metadata = {"source": "video", "video": source_name, **page, **prepared.metadata}
+        shot_path = save_shot_sync(prepared.data, metadata=metadata, original=prepared.original)
+        shot_index.add(shot_path.name)
+        if prepared.shot_hash is not None:
+            shot_hashes.add(shot_path.name, prepared.shot_hash)
+        pages.append(shot_path.name)
+    return duplicates
+
+
+def ingest_video(path, source_name: Optional[str] = None, workers: int = VIDEO_WORKERS) -> dict:
+    """
+    从翻页视频中提取页面截图并保存到 shots 目录（同步，在线程池或命令行中调用）
+
+    参数:
+        path: 视频文件路径
+        source_name: 记录到截图元数据中的视频名称，默认使用文件名
+        workers: 工作进程数
+
+    返回:
+        {"pages": 保存的截图文件名（按翻页顺序）, "duplicates": 跳过的重复页数,
+         "duration": 视频时长（秒）, "elapsed": 耗时（秒）}
+
+    异常:
+        ValueError: 视频无法打开
+    """
+    started = time.monotonic()
+    path = str(path)
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError("无法打开视频")
+    fps = capture.get(cv2.CAP_PROP_FPS) or _DEFAULT_FPS
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+
+    step = max(1, round(fps / VIDEO_SAMPLE_FPS))
+    segments = plan_segments(frame_count, fps)
+    source_name = source_name or Path(path).name
+
+    pages, duplicates = [], 0
+    workers = max(1, min(workers, len(segments)))
+    window = workers * _SEGMENTS_IN_FLIGHT_PER_WORKER
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker,
+                             initargs=(VIDEO_DETECTOR_PROFILE,)) as pool:
+        # 按段的顺序保存，使截图文件名（时间戳）与翻页顺序一致；
+        # 最早的段保存完才提交新的段，限制在途结果占用的内存
+        in_flight = deque()
+        for segment in segments:
+            in_flight.append(pool.submit(_ingest_segment, path, segment, fps, step))
+            if len(in_flight) >= window:
+                duplicates += _save_pages(in_flight.popleft().result(), source_name, pages)
+        while in_flight:
+            duplicates += _save_pages(in_flight.popleft().result(), source_name, pages)
+
+    elapsed = time.monotonic() - started
+    duration = frame_count / fps if frame_count > 0 else 0.0
+    logger.info(f"视频 {source_name}：{duration:.1f}s，{len(segments)} 段，提取 {len(pages)} 页，"
+                f"跳过重复 {duplicates} 页，耗时 {elapsed:.1f}s")
+    return {
+        "pages": pages,
+        "duplicates": duplicates,
+        "duration": round(duration, 3),
+        "elapsed": round(elapsed, 3),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="从翻页视频中提取页面截图到 shots 目录")
+    parser.add_argument("video", help="视频文件路径")
+    parser.add_argument("--workers", type=int, default=VIDEO_WORKERS, help="工作进程数")
+    args = parser.parse_args(argv)
+
+    try:
+        report = ingest_video(args.video, workers=args.workers)
+    except ValueError as e:
+        print(f"导入失败：{str(e)}")
+        return 1
+    print(f"视频时长 {report['duration']:.1f}s，提取 {len(report['pages'])} 页"
+          f"（跳过重复 {report['duplicates']} 页），耗时 {report['elapsed']:.1f}s")
+    for name in report["pages"]:
+        print(name)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+/ws 帧协议
+二进制消息带固定长度的帧头（消息类型、序号、客户端采集时间戳、像素格式、尺寸），
+文本消息为 JSON 控制消息。前端连接后先发送 hello 协商版本，
+未协商的旧前端继续使用无帧头的 JPEG 和中文状态文本。
+
+帧头布局（小端，22 字节）:
+    magic       2s  b"AC"
+    version     B   协议版本
+    msg_type    B   MSG_DETECT / MSG_HD
+    pixel_fmt   B   PIXEL_ENCODED / PIXEL_GRAY8 / PIXEL_I420
+    reserved    B
+    seq         I   帧序号（每个连接单调递增）
+    timestamp   d   客户端采集时间（毫秒）
+    width       H   原始像素宽度（编码图像为 0）
+    height      H   原始像素高度（编码图像为 0）
+"""
+import struct
+from typing import NamedTuple, Optional, Tuple
+
+PROTOCOL_VERSION = 1
+MAGIC = b"AC"
+
+# 消息类型
+MSG_DETECT = 1
+MSG_HD = 2
+
+# 像素格式
+PIXEL_ENCODED = 0  # JPEG / PNG / WebP 编码图像
+PIXEL_GRAY8 = 1    # 8 位灰度，width * height 字节
+PIXEL_I420 = 2     # YUV 4:2:0 平面，width * height * 3 / 2 字节
+
+# hello 中使用的像素格式名称
+PIXEL_FORMAT_NAMES = {
+    "jpeg": PIXEL_ENCODED,
+    "gray8": PIXEL_GRAY8,
+    "i420": PIXEL_I420,
+}
+
+_HEADER = struct.Struct("<2sBBBxIdHH")
+HEADER_SIZE = _HEADER.size
+
+
+class FrameHeader(NamedTuple):
+    msg_type: int
+    seq: int
+    timestamp: float
+    pixel_format: int = PIXEL_ENCODED
+    width: int = 0
+    height: int = 0
+
+
+def raw_frame_size(header: FrameHeader) -> int:
+    """原始像素帧的数据长度，编码图像返回 0"""
+    if header.pixel_format == PIXEL_GRAY8:
+        return header.width * header.height
+    if header.pixel_format == PIXEL_I420:
+        return header.width * header.height * 3 // 2
+    return 0
+
+
+def pack_frame(header: FrameHeader, payload) -> bytes:
+    """打包一条带帧头的二进制消息"""
+    return _HEADER.pack(MAGIC, PROTOCOL_VERSION, header.msg_type, header.pixel_format,
+                        header.seq, header.timestamp, header.width, header.height) + bytes(payload)
+
+
+def parse_frame(data) -> Optional[Tuple[FrameHeader, memoryview]]:
+    """
+    解析带帧头的二进制消息
+
+    参数:
+        data: 消息字节（bytes / memoryview）
+
+    返回:
+        (帧头, 负载)，不是带帧头的消息（旧前端直接发送的图像）时返回 None
+
+    异常:
+        ValueError: 帧头版本不支持或负载长度与像素格式不符
+    """
+    if len(data) < HEADER_SIZE or bytes(data[:2]) != MAGIC:
+        return None
+    _, version, msg_type, pixel_format, seq, timestamp, width, height = _HEADER.unpack_from(data)
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"不支持的帧协议版本：{version}")
+
+    header = FrameHeader(msg_type, seq, timestamp, pixel_format, width, height)
+    payload = memoryview(data)[HEADER_SIZE:]
+    if pixel_format not in PIXEL_FORMAT_NAMES.values():
+        raise ValueError(f"未知的像素格式：{pixel_format}")
+    if pixel_format != PIXEL_ENCODED:
+        if width == 0 or height == 0 or (pixel_format == PIXEL_I420 and (width % 2 or height % 2)):
+            raise ValueError(f"原始帧尺寸无效：{width}x{height}")
+        if len(payload) != raw_frame_size(header):
+            raise ValueError(f"原始帧长度不符：{len(payload)} 字节，{width}x{height}")
+    return header, payload
+
+
+def control_message(message_type: str, **fields) -> dict:
+    """JSON 控制消息"""
+    return {"type": message_type, **fields}
+
+
+def hello_reply(formats, hd_stream: bool = False, detect_size: int = 0) -> dict:
+    """
+    对前端 hello 的应答：协议版本、服务器接受的像素格式、是否接收高清帧推流，
+    以及检测帧长边应有的像素数（检测器配置档的输入尺寸，0 表示由前端决定）
+    """
+    accepted = [name for name in formats if name in PIXEL_FORMAT_NAMES] or ["jpeg"]
+    return control_message("hello", version=PROTOCOL_VERSION, formats=accepted, hd_stream=hd_stream,
+                           detect_size=detect_size)
@@ -171,7 +171,7 @@ async def chat_with_image(request: ZhipuRequest):
                 continue
                 
             # 处理图片
-            if path.lower().endswith(('.jpg', '.jpeg', '.png')):
+            if path.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
                 try:
                     # 检查图片大小限制
                     file_size = Path(path).stat().st_size / (1024 * 1024)  # MB